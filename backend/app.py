@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import *
+import os
 
 app = create_app()
 
@@ -35,5 +36,11 @@ if __name__ == '__main__':
     with app.app_context():
         # 创建数据库表
         db.create_all()
+
+    # 启动定时质量检测调度器（QUALITY_SCHEDULER_ENABLED=0 时不启动）
+    # debug 模式下 Werkzeug 重载器的父进程只监控文件变化，调度器只在实际提供服务的子进程中启动
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.services.quality_schedule_service import QualityScheduleService
+        QualityScheduleService.start(app)
     
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -1,13 +1,19 @@
 from .rule_model import RuleLibrary, RuleVersion
 from .model_config import ModelConfig, ModelParameter
 from .data_source import DataSource, TableField
-from .quality_result import QualityResult, QualityReport
+from .quality_result import QualityResult, QualityReport, QualityFailedRecord, QualityResultFingerprint
 from .training_history import TrainingHistory
+from .quality_job import QualityJob
+from .quality_watermark import QualityWatermark
+from .quality_schedule import QualitySchedule
 
 __all__ = [
     'RuleLibrary', 'RuleVersion',
     'ModelConfig', 'ModelParameter', 
     'DataSource', 'TableField',
-    'QualityResult', 'QualityReport',
-    'TrainingHistory'
+    'QualityResult', 'QualityReport', 'QualityFailedRecord', 'QualityResultFingerprint',
+    'TrainingHistory',
+    'QualityJob',
+    'QualityWatermark',
+    'QualitySchedule'
 ] 
\ No newline at end of file
@@ -0,0 +1,70 @@
+from app import db
+from datetime import datetime
+import json
+
+class QualityJob(db.Model):
+    """质量检测后台任务"""
+    __tablename__ = 'quality_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # uuid
+    job_type = db.Column(db.String(20), nullable=False, default='check')  # check/batch
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/running/completed/failed/cancelled
+    phase = db.Column(db.String(20))  # read/validate/report/persist
+    progress = db.Column(db.Float, default=0)  # 0-100
+    current_table = db.Column(db.String(100))
+    rows_processed = db.Column(db.BigInteger, default=0)
+    rows_per_second = db.Column(db.Float)
+    params = db.Column(db.Text)  # JSON存储任务参数（密码已掩码）
+    result_ids = db.Column(db.Text)  # JSON存储生成的 QualityResult ID 列表
+    result_data = db.Column(db.Text)  # JSON存储检测结果摘要
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    owner = db.Column(db.String(100))  # 执行任务的进程（主机名:pid）
+    heartbeat_at = db.Column(db.DateTime)  # 执行进程最近一次心跳时间
+    created_by = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def set_params(self, params):
+        """设置任务参数"""
+        self.params = json.dumps(params, ensure_ascii=False, default=str)
+    
+    def get_params(self):
+        """获取任务参数"""
+        return json.loads(self.params) if self.params else {}
+    
+    def get_result_ids(self):
+        """获取生成的检测结果ID"""
+        return json.loads(self.result_ids) if self.result_ids else []
+    
+    def get_result_data(self):
+        """获取检测结果摘要"""
+        return json.loads(self.result_data) if self.result_data else None
+    
+    def to_dict(self):
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or datetime.utcnow()) - self.started_at).total_seconds()
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'phase': self.phase,
+            'progress': round(self.progress or 0, 1),
+            'current_table': self.current_table,
+            'rows_processed': self.rows_processed or 0,
+            'rows_per_second': round(self.rows_per_second, 1) if self.rows_per_second is not None else None,
+            'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+            'params': self.get_params(),
+            'result_ids': self.get_result_ids(),
+            'result': self.get_result_data(),
+            'error': self.error,
+            'cancel_requested': bool(self.cancel_requested),
+            'owner': self.owner,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-import json
+from app.utils import failure_codec
 
 class QualityResult(db.Model):
     """质量检测结果模型"""
@@ -52,18 +52,31 @@ class QualityReport(db.Model):
     field_name = db.Column(db.String(100), nullable=False)
     passed_count = db.Column(db.Integer, nullable=False)
     failed_count = db.Column(db.Integer, nullable=False)
-    error_details = db.Column(db.Text)  # JSON格式存储错误详情
+    error_details = db.Column(db.Text)  # 错误详情（JSON列表，明细较多时为紧凑编码，见 failure_codec）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_error_details(self, details):
-        """设置错误详情"""
-        self.error_details = json.dumps(details, ensure_ascii=False)
+        """设置错误详情（明细较多时按行号/取值数组 + 消息模板紧凑存储）"""
+        self.error_details = failure_codec.encode_details(details)
+        self._parsed_details = None
     
-    def get_error_details(self):
-        """获取错误详情"""
-        return json.loads(self.error_details) if self.error_details else []
+    def _parsed_error_details(self):
+        # 同一对象多次分页读取时只解析一次
+        parsed = getattr(self, '_parsed_details', None)
+        if parsed is None or parsed[0] is not self.error_details:
+            parsed = (self.error_details, failure_codec.parse(self.error_details))
+            self._parsed_details = parsed
+        return parsed[1]
     
-    def to_dict(self):
+    def get_error_details(self, offset=0, limit=None):
+        """获取错误详情（可分页，只展开请求的区间）"""
+        return failure_codec.expand_details(self._parsed_error_details(), offset, limit)
+    
+    def get_error_count(self):
+        """错误详情条数（不展开明细）"""
+        return failure_codec.detail_count(self._parsed_error_details())
+    
+    def to_dict(self, detail_limit=None):
         return {
             'id': self.id,
             'result_id': self.result_id,
@@ -72,6 +85,57 @@ class QualityReport(db.Model):
             'field_name': self.field_name,
             'passed_count': self.passed_count,
             'failed_count': self.failed_count,
-            'error_details': self.get_error_details(),
+            'error_details': self.get_error_details(limit=detail_limit),
+            'error_details_total': self.get_error_count(),
             'created_at': self.created_at.isoformat()
-        } 
\ No newline at end of file
+        }
+
+
+class QualityFailedRecord(db.Model):
+    """质量检测失败记录（逐行存储，供失败数据分页/筛选查询）"""
+    __tablename__ = 'quality_failed_records'
+    __table_args__ = (
+        db.Index('ix_failed_records_result_rule_row', 'result_id', 'rule_name', 'row_number'),
+        db.Index('ix_failed_records_result_row', 'result_id', 'row_number'),
+        db.Index('ix_failed_records_result_row_key', 'result_id', 'row_key'),
+        db.Index('ix_failed_records_result_field_value', 'result_id', 'field_name', 'value_num'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('quality_results.id', ondelete='CASCADE'), nullable=False)
+    report_id = db.Column(db.Integer, nullable=True)
+    rule_name = db.Column(db.String(100), nullable=False)
+    rule_type = db.Column(db.String(50))
+    field_name = db.Column(db.String(100))
+    row_number = db.Column(db.BigInteger)  # 整数行号/主键
+    row_key = db.Column(db.String(255))  # 非整数的行标识（文本/uuid 主键、记录编号等）
+    value_num = db.Column(db.Float)  # 数值型取值（用于范围筛选）
+    value_text = db.Column(db.String(255))  # 取值文本
+    depth = db.Column(db.Float)
+    message = db.Column(db.Text)
+    
+    def to_dict(self, check_date=None):
+        return {
+            'id': self.id,
+            'row': self.row_number if self.row_number is not None else self.row_key,
+            'row_key': self.row_key,
+            'field': self.field_name,
+            'value': self.value_num if self.value_num is not None else self.value_text,
+            'depth': self.depth,
+            'rule': self.rule_name,
+            'rule_type': self.rule_type,
+            'message': self.message,
+            'result': '不合格',
+            'timestamp': check_date
+        }
+
+
+class QualityResultFingerprint(db.Model):
+    """检测结果指纹（规则 + 字段 + 检测选项 + 源表新鲜度），用于复用近期相同检测的结果"""
+    __tablename__ = 'quality_result_fingerprints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(40), nullable=False, index=True)  # sha1
+    result_id = db.Column(db.Integer, db.ForeignKey('quality_results.id', ondelete='CASCADE'), nullable=False)
+    probe = db.Column(db.Text)  # JSON存储生成指纹时的新鲜度探测结果
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,87 @@
+from app import db
+from datetime import datetime
+import json
+
+class QualitySchedule(db.Model):
+    """定时质量检测计划（规则库 + 数据源表 + cron 表达式）"""
+    __tablename__ = 'quality_schedules'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    rule_library_id = db.Column(db.Integer, db.ForeignKey('rule_libraries.id'), nullable=False)
+    version_id = db.Column(db.Integer)  # 为空时使用最新规则
+    data_source_id = db.Column(db.Integer, db.ForeignKey('data_sources.id'), nullable=False)
+    schema_name = db.Column(db.String(100))  # 为空时使用数据源的 schema
+    table_name = db.Column(db.String(100), nullable=False)
+    fields = db.Column(db.Text)  # JSON存储检测字段，为空时检测全部字段
+
+    cron_expression = db.Column(db.String(100), nullable=False)  # 分 时 日 月 周（服务器本地时间）
+    window_start = db.Column(db.String(5))  # 允许执行的时间窗口 HH:MM，为空时不限制
+    window_end = db.Column(db.String(5))
+    jitter_seconds = db.Column(db.Integer, default=0)  # 触发时间随机延后的最大秒数
+    skip_if_unchanged = db.Column(db.Boolean, default=True)  # 源表自上次执行后没有变化时跳过
+    freshness_column = db.Column(db.String(100))  # 新鲜度探测使用的时间列
+    check_options = db.Column(db.Text)  # JSON存储传给 run_quality_check 的选项（pushdown/streaming/incremental 等）
+
+    enabled = db.Column(db.Boolean, default=True, index=True)
+    next_run_at = db.Column(db.DateTime, index=True)
+    last_run_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))  # running/completed/failed/skipped
+    last_result_id = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    last_probe = db.Column(db.Text)  # JSON存储上次执行时的新鲜度探测结果
+    run_owner = db.Column(db.String(100))  # 正在执行本计划的进程（主机名:pid）
+    run_heartbeat_at = db.Column(db.DateTime)  # 执行进程最近一次心跳时间
+    created_by = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_fields(self):
+        """获取检测字段"""
+        return json.loads(self.fields) if self.fields else None
+
+    def set_fields(self, fields):
+        """设置检测字段"""
+        self.fields = json.dumps(fields, ensure_ascii=False) if fields else None
+
+    def get_check_options(self):
+        """获取检测选项"""
+        return json.loads(self.check_options) if self.check_options else {}
+
+    def set_check_options(self, options):
+        """设置检测选项"""
+        self.check_options = json.dumps(options or {}, ensure_ascii=False)
+
+    def get_last_probe(self):
+        """获取上次新鲜度探测结果"""
+        return json.loads(self.last_probe) if self.last_probe else None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'rule_library_id': self.rule_library_id,
+            'version_id': self.version_id,
+            'data_source_id': self.data_source_id,
+            'schema': self.schema_name,
+            'table_name': self.table_name,
+            'fields': self.get_fields(),
+            'cron_expression': self.cron_expression,
+            'window_start': self.window_start,
+            'window_end': self.window_end,
+            'jitter_seconds': self.jitter_seconds or 0,
+            'skip_if_unchanged': bool(self.skip_if_unchanged),
+            'freshness_column': self.freshness_column,
+            'check_options': self.get_check_options(),
+            'enabled': bool(self.enabled),
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_status': self.last_status,
+            'last_result_id': self.last_result_id,
+            'last_error': self.last_error,
+            'run_owner': self.run_owner,
+            'run_heartbeat_at': self.run_heartbeat_at.isoformat() if self.run_heartbeat_at else None,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,61 @@
+from app import db
+from datetime import datetime
+import json
+
+class QualityWatermark(db.Model):
+    """增量质量检测水位线（每个 规则库/版本/数据源/表 一条）"""
+    __tablename__ = 'quality_watermarks'
+    __table_args__ = (
+        db.UniqueConstraint('rule_library_id', 'version_id', 'source_key', 'schema_name', 'table_name',
+                            name='uq_quality_watermark_target'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    rule_library_id = db.Column(db.Integer, nullable=False)
+    version_id = db.Column(db.Integer, nullable=False, default=0)  # 0 表示使用最新规则
+    source_key = db.Column(db.String(255), nullable=False)  # 数据源ID或连接标识
+    schema_name = db.Column(db.String(100), nullable=False, default='public')
+    table_name = db.Column(db.String(100), nullable=False)
+    watermark_column = db.Column(db.String(100), nullable=False)
+    watermark_value = db.Column(db.String(64))  # 已检测数据的水位线（文本形式，比较时由数据库转换类型）
+    
+    # 滚动汇总（自上次全量检测以来累计）
+    total_records = db.Column(db.BigInteger, default=0)
+    passed_records = db.Column(db.BigInteger, default=0)
+    failed_records = db.Column(db.BigInteger, default=0)
+    rule_summary = db.Column(db.Text)  # JSON存储各规则的通过/失败累计 {规则名: {'passed': n, 'failed': n}}
+    
+    incremental_runs = db.Column(db.Integer, default=0)  # 自上次全量检测以来的增量次数
+    last_result_id = db.Column(db.Integer)
+    last_full_check_at = db.Column(db.DateTime)
+    last_check_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_rule_summary(self):
+        """获取各规则累计结果"""
+        return json.loads(self.rule_summary) if self.rule_summary else {}
+    
+    def set_rule_summary(self, summary):
+        """设置各规则累计结果"""
+        self.rule_summary = json.dumps(summary, ensure_ascii=False)
+    
+    def to_dict(self):
+        total = self.total_records or 0
+        return {
+            'id': self.id,
+            'rule_library_id': self.rule_library_id,
+            'version_id': self.version_id or None,
+            'schema': self.schema_name,
+            'table_name': self.table_name,
+            'watermark_column': self.watermark_column,
+            'watermark_value': self.watermark_value,
+            'total_records': total,
+            'passed_records': self.passed_records or 0,
+            'failed_records': self.failed_records or 0,
+            'pass_rate': round((self.passed_records or 0) / total * 100, 2) if total > 0 else 0,
+            'rule_summary': self.get_rule_summary(),
+            'incremental_runs': self.incremental_runs or 0,
+            'last_result_id': self.last_result_id,
+            'last_full_check_at': self.last_full_check_at.isoformat() if self.last_full_check_at else None,
+            'last_check_at': self.last_check_at.isoformat() if self.last_check_at else None
+        }
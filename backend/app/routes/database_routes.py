@@ -57,6 +57,7 @@ def get_tables_by_source(source_id):
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -66,7 +67,7 @@ def get_tables_by_source(source_id):
             'password': source.password
         }
         
-        tables = DatabaseService.get_tables(db_config)
+        tables = DatabaseService.get_tables(db_config, refresh=request.args.get('refresh', 'false').lower() == 'true')
         
         return jsonify({
             'success': True,
@@ -97,6 +98,7 @@ def get_table_fields_by_source(source_id, table_name):
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -106,7 +108,7 @@ def get_table_fields_by_source(source_id, table_name):
             'password': source.password
         }
         
-        fields = DatabaseService.get_table_fields(db_config, table_name)
+        fields = DatabaseService.get_table_fields(db_config, table_name, refresh=request.args.get('refresh', 'false').lower() == 'true')
         
         return jsonify({
             'success': True,
@@ -145,6 +147,7 @@ def preview_data():
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -223,6 +226,7 @@ def get_tables_by_query_param():
             return jsonify({'success': False, 'error': '数据源不存在'}), 404
         
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -233,7 +237,7 @@ def get_tables_by_query_param():
             'password': source.password
         }
         
-        tables = DatabaseService.get_tables(db_config)
+        tables = DatabaseService.get_tables(db_config, refresh=request.args.get('refresh', 'false').lower() == 'true')
         return jsonify({'success': True, 'data': tables})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -303,6 +307,7 @@ def get_table_fields_by_query():
             return jsonify({'success': False, 'error': '数据源不存在'}), 404
         
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -313,7 +318,7 @@ def get_table_fields_by_query():
             'password': source.password
         }
         
-        fields = DatabaseService.get_table_fields(db_config, table_name)
+        fields = DatabaseService.get_table_fields(db_config, table_name, refresh=request.args.get('refresh', 'false').lower() == 'true')
         return jsonify({'success': True, 'data': fields})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -379,8 +384,12 @@ def get_data_statistics():
         if not success:
             return error_response
         
-        db_config = {k: v for k, v in data.items() if k not in ['table_name', 'fields']}
-        statistics = DatabaseService.get_data_statistics(db_config, data['table_name'], data['fields'])
+        db_config = {k: v for k, v in data.items() if k not in ['table_name', 'fields', 'percentiles', 'sample_size']}
+        statistics = DatabaseService.get_data_statistics(
+            db_config, data['table_name'], data['fields'],
+            percentiles=data.get('percentiles'),
+            sample_size=data.get('sample_size')
+        )
         
         return jsonify({
             'success': True,
@@ -600,6 +609,7 @@ def get_field_values():
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -610,16 +620,21 @@ def get_field_values():
             'password': source.password
         }
         
-        # 获取字段的不同值
+        # 获取字段的不同值（默认 auto：pg_stats 新鲜且完整时直接使用，否则走带缓存的精确查询）
+        values_info = {}
         distinct_values = DatabaseService.get_distinct_values(
             db_config, 
             table_name, 
-            field_name
+            field_name,
+            mode=request.args.get('mode', 'auto'),
+            use_cache=request.args.get('refresh', 'false').lower() != 'true',
+            info=values_info
         )
         
         return jsonify({
             'success': True,
-            'data': distinct_values
+            'data': distinct_values,
+            'meta': values_info
         })
     except Exception as e:
         return jsonify({
@@ -653,6 +668,7 @@ def get_distinct_values():
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -665,16 +681,21 @@ def get_distinct_values():
         
         print(f"获取不同值 - schema: {db_config['schema']}, 表: {data['table_name']}, 字段: {data['field_name']}")
         
-        # 获取字段的不同值
+        # 获取字段的不同值（默认 auto：pg_stats 新鲜且完整时直接使用，否则走带缓存的精确查询）
+        values_info = {}
         distinct_values = DatabaseService.get_distinct_values(
             db_config, 
             data['table_name'], 
-            data['field_name']
+            data['field_name'],
+            mode=data.get('mode', 'auto'),
+            use_cache=not data.get('refresh', False),
+            info=values_info
         )
         
         return jsonify({
             'success': True,
-            'data': distinct_values
+            'data': distinct_values,
+            'meta': values_info
         })
     except Exception as e:
         return jsonify({
@@ -706,6 +727,7 @@ def get_schemas():
         
         # 构建数据库配置
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
@@ -716,7 +738,7 @@ def get_schemas():
         }
         
         # 获取所有schema
-        schemas = DatabaseService.get_schemas(db_config)
+        schemas = DatabaseService.get_schemas(db_config, refresh=request.args.get('refresh', 'false').lower() == 'true')
         
         return jsonify({
             'success': True,
@@ -760,6 +782,37 @@ def get_schemas_by_config():
             'error': str(e)
         }), 500
 
+@bp.route('/metadata/refresh', methods=['POST'])
+@login_required
+def refresh_metadata():
+    """刷新数据源的元数据目录缓存（schema/表/字段），可选立即预取字段"""
+    try:
+        data = request.get_json() or {}
+        source = DataSource.query.get(data.get('data_source_id'))
+        if not source:
+            return jsonify({'success': False, 'error': '数据源不存在'}), 404
+        
+        db_config = {
+            'id': source.id,
+            'db_type': source.db_type,
+            'host': source.host,
+            'port': source.port,
+            'database': source.database,
+            'schema': data.get('schema') or getattr(source, 'schema', 'public'),
+            'username': source.username,
+            'password': source.password
+        }
+        
+        invalidated = DatabaseService.refresh_metadata(db_config, data.get('schema'))
+        result = {'invalidated': invalidated}
+        if data.get('prefetch'):
+            catalog = DatabaseService.prefetch_metadata(db_config)
+            result['prefetched_tables'] = len(catalog)
+        
+        return jsonify({'success': True, 'data': result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/tag-data', methods=['POST'])
 @login_required
 def get_tag_data():
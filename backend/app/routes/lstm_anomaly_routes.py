@@ -189,6 +189,7 @@ def detect_for_ui():
         
         # 2. 手动构建 db_config 字典
         db_config = {
+            'id': source.id,
             'db_type': source.db_type,
             'host': source.host,
             'port': source.port,
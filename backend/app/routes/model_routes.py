@@ -770,6 +770,7 @@ def train_model_realtime():
             
             # 构建数据库配置（不包含schema，因为schema是前端动态选择的）
             db_config = {
+                'id': source.id,
                 'db_type': source.db_type,
                 'host': source.host,
                 'port': source.port,
@@ -812,30 +813,50 @@ def train_model_realtime():
                 # 使用分批读取大数据集
                 logger.info(f"开始分批读取训练数据，最大样本数: {max_training_samples}")
                 
-                df_batches = []
-                total_rows = 0
+                if data.get('use_snapshot', True):
+                    # 优先使用本地数据快照（相同切片在源表未变化时不再重复拉取）
+                    df_snapshot, read_info = DatabaseService.read_table_snapshot(
+                        dict(db_config, schema=request_schema),
+                        table_name,
+                        all_columns,
+                        filters=filters,
+                        start_date=start_date,
+                        end_date=end_date,
+                        date_column=date_field,
+                        max_rows=max_training_samples,
+                        extractor=data.get('extractor', 'pandas'),
+                        parallel=int(data.get('read_parallel', 1))
+                    )
+                    logger.info(f"通过快照层读取 {len(df_snapshot)} 行数据（命中快照: {read_info.get('cache_hit')}）")
+                    df_batches = [df_snapshot] if not df_snapshot.empty else []
+                else:
+                    read_info = {'cache_hit': False}
+                    df_batches = []
+                    total_rows = 0
                 
-                # 使用生成器分批读取（包含业务字段）
-                for batch_df in DatabaseService.read_data_in_batches(
-                    db_config, 
-                    table_name, 
-                    all_columns,  # 使用包含业务字段的完整列列表
-                    batch_size=10000,
-                    max_rows=max_training_samples,
-                    schema=request_schema,  # 使用前端传来的schema
-                    filters=filters,
-                    start_date=start_date,  # 时间范围筛选
-                    end_date=end_date,
-                    date_column=date_field  # 使用用户选择的时间字段
-                ):
-                    df_batches.append(batch_df)
-                    total_rows += len(batch_df)
-                    logger.info(f"已读取 {total_rows} 行数据")
+                    # 使用生成器分批读取（包含业务字段）
+                    for batch_df in DatabaseService.read_data_in_batches(
+                        db_config, 
+                        table_name, 
+                        all_columns,  # 使用包含业务字段的完整列列表
+                        batch_size=10000,
+                        max_rows=max_training_samples,
+                        schema=request_schema,  # 使用前端传来的schema
+                        filters=filters,
+                        start_date=start_date,  # 时间范围筛选
+                        end_date=end_date,
+                        date_column=date_field,  # 使用用户选择的时间字段
+                        extractor=data.get('extractor', 'pandas'),  # 'copy' 使用 COPY 批量导出
+                        parallel=int(data.get('read_parallel', 1))  # >1 时按主键/ctid范围并行读取
+                    ):
+                        df_batches.append(batch_df)
+                        total_rows += len(batch_df)
+                        logger.info(f"已读取 {total_rows} 行数据")
                     
-                    # 防止内存溢出，如果达到限制就停止
-                    if total_rows >= max_training_samples:
-                        logger.info(f"达到最大样本数限制: {max_training_samples}")
-                        break
+                        # 防止内存溢出，如果达到限制就停止
+                        if total_rows >= max_training_samples:
+                            logger.info(f"达到最大样本数限制: {max_training_samples}")
+                            break
                 
                 # 合并所有批次
                 if not df_batches:
@@ -2170,7 +2191,8 @@ def train_model_realtime():
                     'total_outliers': viz_data.get('total_outliers', 0) if viz_data else 0,
                     'outlier_rate': viz_data.get('outlier_rate', 0) if viz_data else 0,
                     'detection_method': 'geographic_grid' if (viz_data and viz_data.get('grid_info')) else ('residual_3sigma' if model_type == 'regression' else 'geographic_grid')
-                }
+                },
+                'cache_hit': read_info.get('cache_hit', False)
             }
             
             return jsonify({
@@ -2628,6 +2650,7 @@ def train_model():
         
         # 构建数据库配置（不包含schema，因为schema是前端动态选择的）
         db_config = {
+            'id': data_source.id,
             'db_type': data_source.db_type,
             'host': data_source.host,
             'port': data_source.port,
@@ -2690,25 +2713,12 @@ def health():
 def stats():
     """获取系统统计数据"""
     try:
-        from app.models.model_config import ModelConfig
-        from app.models.data_source import DataSource
-        from app.models.rule_model import RuleLibrary
-        from app.models.quality_result import QualityResult
-        
-        # 获取实际统计数据
-        model_count = ModelConfig.query.filter_by(is_active=True).count()
-        db_count = DataSource.query.filter_by(is_active=True).count()  # 只统计活跃的数据源
-        rule_count = RuleLibrary.query.filter_by(is_active=True).count()
-        quality_count = QualityResult.query.count()
+        from app.services.dashboard_service import DashboardService
         
+        # 一条聚合查询获取各项数量（短时缓存，写入后失效）
         return jsonify({
             'success': True,
-            'data': {
-                'modelCount': model_count,
-                'dbCount': db_count,
-                'ruleCount': rule_count,
-                'qualityCount': quality_count
-            }
+            'data': DashboardService.get_counts()
         })
     except Exception as e:
         return jsonify({
@@ -2721,50 +2731,36 @@ def stats():
 def activities():
     """获取最近活动记录"""
     try:
-        from app.models.model_config import ModelConfig
-        from app.models.data_source import DataSource
-        from app.models.quality_result import QualityResult
-        from datetime import datetime, timedelta
+        from app.services.dashboard_service import DashboardService
         
         activities = []
+        recent = DashboardService.get_recent_activities(days=7)
         
-        # 获取最近的模型配置活动
-        recent_configs = ModelConfig.query.filter(
-            ModelConfig.created_at >= datetime.utcnow() - timedelta(days=7)
-        ).order_by(ModelConfig.created_at.desc()).limit(5).all()
-        
-        for config in recent_configs:
+        # 最近的模型配置活动
+        for config in recent['config'][:5]:
             activities.append({
-                'id': f'config_{config.id}',
-                'content': f'创建了模型配置: {config.name}',
-                'time': config.created_at.strftime('%Y-%m-%d %H:%M'),
+                'id': f'config_{config["id"]}',
+                'content': f'创建了模型配置: {config["name"]}',
+                'time': config['created_at'].strftime('%Y-%m-%d %H:%M'),
                 'type': 'success'
             })
         
-        # 获取最近的数据源活动
-        recent_sources = DataSource.query.filter(
-            DataSource.created_at >= datetime.utcnow() - timedelta(days=7)
-        ).order_by(DataSource.created_at.desc()).limit(3).all()
-        
-        for source in recent_sources:
+        # 最近的数据源活动
+        for source in recent['source'][:3]:
             activities.append({
-                'id': f'source_{source.id}',
-                'content': f'添加了数据源: {source.name}',
-                'time': source.created_at.strftime('%Y-%m-%d %H:%M'),
+                'id': f'source_{source["id"]}',
+                'content': f'添加了数据源: {source["name"]}',
+                'time': source['created_at'].strftime('%Y-%m-%d %H:%M'),
                 'type': 'info'
             })
         
-        # 获取最近的质量检测活动
-        recent_quality = QualityResult.query.filter(
-            QualityResult.created_at >= datetime.utcnow() - timedelta(days=7)
-        ).order_by(QualityResult.created_at.desc()).limit(3).all()
-        
-        for result in recent_quality:
+        # 最近的质量检测活动
+        for result in recent['quality'][:3]:
             activities.append({
-                'id': f'quality_{result.id}',
-                'content': f'完成了质量检测: {result.table_name}',
-                'time': result.created_at.strftime('%Y-%m-%d %H:%M'),
-                'type': 'warning' if result.pass_rate < 80 else 'success'
+                'id': f'quality_{result["id"]}',
+                'content': f'完成了质量检测: {result["name"]}',
+                'time': result['created_at'].strftime('%Y-%m-%d %H:%M'),
+                'type': 'warning' if result['pass_rate'] < 80 else 'success'
             })
         
         # 按时间排序并限制数量
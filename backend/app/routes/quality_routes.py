@@ -1,13 +1,24 @@
 from flask import Blueprint, request, jsonify
 from app.services.quality_service import QualityService
+from app.services.quality_job_service import QualityJobService
 from app.services.text_quality_service import TextQualityService
+from app.services.watermark_service import WatermarkService
+from app.services.quality_schedule_service import QualityScheduleService
 from app.models.quality_result import QualityResult
 from app.utils.auth_decorator import login_required
 from app.models.data_source import DataSource
+import os
 import traceback
 
 bp = Blueprint('quality', __name__)
 
+# 全量报告下载的 MIME 类型（按文件扩展名）
+REPORT_MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
 def handle_masked_password_in_config(db_config):
     """
     处理db_config中的密码掩码
@@ -71,16 +82,37 @@ def run_quality_check():
         
         print(f"质量检测 - 使用schema: {db_config.get('schema', 'public')}, 表: {data['table_name']}")
         
-        result = QualityService.run_quality_check(
+        params = dict(
             rule_library_id=data['rule_library_id'],
             version_id=data.get('version_id'),
             db_config=db_config,
             table_name=data['table_name'],
             fields=data.get('fields'),
             created_by=data.get('created_by', ''),
-            limit=data.get('limit')  # 传递 limit 参数
+            limit=data.get('limit'),  # 传递 limit 参数
+            streaming=bool(data.get('streaming', False)),  # 大表使用服务端游标流式检测
+            chunk_size=data.get('chunk_size'),
+            use_snapshot=bool(data.get('use_snapshot', False)),  # 复用本地数据快照
+            pushdown=bool(data.get('pushdown', False)),  # 规则编译为SQL在数据库端执行
+            report_format=data.get('report_format', 'xlsx'),  # 全量报告格式 xlsx/csv/parquet
+            report_failed_only=bool(data.get('report_failed_only', False)),  # 全量报告只包含失败行
+            incremental=bool(data.get('incremental', False)),  # 按水位线列只检测新增/变更数据
+            watermark_column=data.get('watermark_column'),
+            full_recheck_days=data.get('full_recheck_days'),
+            force_full=bool(data.get('force_full', False)),
+            reuse_recent=bool(data.get('reuse_recent', True))  # 数据与规则未变化时复用近期的检测结果
         )
         
+        # async=true 时提交后台任务，立即返回任务信息，通过 /jobs/<job_id> 查询进度
+        if data.get('async'):
+            job = QualityJobService.submit('check', params, created_by=data.get('created_by', ''))
+            return jsonify({
+                'success': True,
+                'data': job
+            }), 202
+        
+        result = QualityService.run_quality_check(**params)
+        
         return jsonify({
             'success': True,
             'data': result
@@ -117,7 +149,11 @@ def get_quality_results():
 def get_quality_report(result_id):
     """获取质量检测详细报告"""
     try:
-        report = QualityService.get_quality_report(result_id)
+        report = QualityService.get_quality_report(
+            result_id,
+            detail_offset=request.args.get('detail_offset', 0, type=int),
+            detail_limit=request.args.get('detail_limit', type=int)
+        )
         
         return jsonify({
             'success': True,
@@ -207,7 +243,7 @@ def batch_quality_check():
         
         print(f"批量质量检测 - 使用schema: {db_config.get('schema', 'public')}")
         
-        results = QualityService.batch_quality_check(
+        params = dict(
             rule_library_id=data['rule_library_id'],
             version_id=data.get('version_id'),
             db_config=db_config,
@@ -216,6 +252,15 @@ def batch_quality_check():
             created_by=data.get('created_by', '')
         )
         
+        if data.get('async'):
+            job = QualityJobService.submit('batch', params, created_by=data.get('created_by', ''))
+            return jsonify({
+                'success': True,
+                'data': job
+            }), 202
+        
+        results = QualityService.batch_quality_check(**params)
+        
         return jsonify({
             'success': True,
             'data': results
@@ -226,12 +271,253 @@ def batch_quality_check():
             'error': str(e)
         }), 500
 
+@bp.route('/jobs', methods=['GET'])
+@login_required
+def list_quality_jobs():
+    """获取质量检测任务列表"""
+    try:
+        jobs = QualityJobService.list_jobs(
+            status=request.args.get('status') or None,
+            limit=request.args.get('limit', 50, type=int)
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': jobs
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_quality_job(job_id):
+    """获取质量检测任务状态与进度"""
+    try:
+        job = QualityJobService.get_job(job_id)
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_quality_job(job_id):
+    """取消质量检测任务"""
+    try:
+        job = QualityJobService.cancel(job_id)
+        
+        return jsonify({
+            'success': True,
+            'data': job
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/watermarks', methods=['GET'])
+@login_required
+def list_quality_watermarks():
+    """获取增量检测水位线与滚动汇总"""
+    try:
+        watermarks = WatermarkService.list_watermarks(
+            rule_library_id=request.args.get('rule_library_id', type=int),
+            table_name=request.args.get('table_name') or None
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': watermarks
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/watermarks/<int:watermark_id>/reset', methods=['POST'])
+@login_required
+def reset_quality_watermark(watermark_id):
+    """重置水位线，下一次增量检测执行全量检测"""
+    try:
+        if not WatermarkService.reset(watermark_id):
+            return jsonify({
+                'success': False,
+                'error': '水位线不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'message': '水位线已重置'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules', methods=['GET'])
+@login_required
+def list_quality_schedules():
+    """获取定时检测计划列表"""
+    try:
+        enabled = request.args.get('enabled')
+        schedules = QualityScheduleService.list_schedules(
+            rule_library_id=request.args.get('rule_library_id', type=int),
+            enabled=None if enabled in (None, '') else enabled.lower() in ('1', 'true')
+        )
+        
+        return jsonify({
+            'success': True,
+            'data': schedules
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules', methods=['POST'])
+@login_required
+def create_quality_schedule():
+    """创建定时检测计划"""
+    try:
+        data = request.get_json() or {}
+        schedule = QualityScheduleService.create_schedule(data, created_by=data.get('created_by', ''))
+        
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules/<int:schedule_id>', methods=['GET'])
+@login_required
+def get_quality_schedule(schedule_id):
+    """获取定时检测计划"""
+    try:
+        schedule = QualityScheduleService.get_schedule(schedule_id)
+        
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404 if str(e) == '定时计划不存在' else 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules/<int:schedule_id>/update', methods=['POST'])
+@login_required
+def update_quality_schedule(schedule_id):
+    """更新定时检测计划"""
+    try:
+        schedule = QualityScheduleService.update_schedule(schedule_id, request.get_json() or {})
+        
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404 if str(e) == '定时计划不存在' else 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules/<int:schedule_id>/delete', methods=['POST'])
+@login_required
+def delete_quality_schedule(schedule_id):
+    """删除定时检测计划"""
+    try:
+        QualityScheduleService.delete_schedule(schedule_id)
+        
+        return jsonify({
+            'success': True,
+            'message': '定时计划已删除'
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404 if str(e) == '定时计划不存在' else 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/schedules/<int:schedule_id>/run', methods=['POST'])
+@login_required
+def run_quality_schedule(schedule_id):
+    """立即触发定时检测计划"""
+    try:
+        schedule = QualityScheduleService.run_now(schedule_id)
+        
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404 if str(e) == '定时计划不存在' else 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/results/<int:result_id>/failed-records', methods=['GET'])
 @login_required
 def get_failed_records(result_id):
     """获取质量检测失败记录的详细数据"""
     try:
-        failed_records = QualityService.get_failed_records(result_id)
+        failed_records = QualityService.get_failed_records(
+            result_id,
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', type=int)
+        )
         
         return jsonify({
             'success': True,
@@ -286,7 +572,7 @@ def get_anomaly_data():
 @bp.route('/results/<int:result_id>/export-all', methods=['GET'])
 @login_required
 def export_all_quality_results(result_id):
-    """导出所有质检结果（直接下载预生成的Excel）"""
+    """导出所有质检结果（直接下载预生成的报告文件）"""
     try:
         from flask import send_file
         from datetime import datetime
@@ -295,13 +581,15 @@ def export_all_quality_results(result_id):
         # schema 参数其实不再需要了，因为直接读文件，为了兼容接口保留
         file_path = QualityService.export_all_quality_data(result_id)
         
-        # 生成下载文件名
+        # 生成下载文件名（扩展名与 MIME 类型取自报告文件本身：xlsx / csv / parquet）
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        download_name = f"quality_full_report_{result_id}_{timestamp}.xlsx"
+        extension = os.path.splitext(file_path)[1].lstrip('.').lower() or 'xlsx'
+        mimetype = REPORT_MIMETYPES.get(extension, 'application/octet-stream')
+        download_name = f"quality_full_report_{result_id}_{timestamp}.{extension}"
         
         return send_file(
             file_path,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=mimetype,
             as_attachment=True,
             download_name=download_name
         )
@@ -350,7 +638,11 @@ def export_all_quality_results(result_id):
 def get_quality_result_detail(result_id):
     """获取质量检测结果详情"""
     try:
-        detail = QualityService.get_quality_report(result_id)
+        detail = QualityService.get_quality_report(
+            result_id,
+            detail_offset=request.args.get('detail_offset', 0, type=int),
+            detail_limit=request.args.get('detail_limit', type=int)
+        )
         
         return jsonify({
             'success': True,
@@ -611,31 +903,20 @@ def get_failed_data(result_id):
         if page_size < 1 or page_size > 100:
             page_size = 10
         
-        # 由于文本质检的结果可能不在数据库中，我们需要从质检服务获取
-        # 这里我们返回一个模拟的不合格数据结构，实际使用时需要根据具体情况调整
-        
-        # 模拟不合格数据（实际应该从质检结果中获取）
-        failed_data = [
-            {
-                'id': f'failed_{i}',
-                'row': i + 1,
-                'field': '井名',
-                'value': f'ABC{i+1}',
-                'rule': '井名格式验证',
-                'message': '井名格式不符合规范',
-                'result': '不合格',
-                'timestamp': '2024-01-01 10:00:00'
-            }
-            for i in range(25)  # 模拟25条不合格数据
-        ]
-        
-        # 计算分页
-        total = len(failed_data)
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
+        # 筛选条件：规则、字段、数值取值范围
+        page_data = QualityService.query_failed_records(
+            result_id,
+            page=page,
+            page_size=page_size,
+            rule_name=request.args.get('rule') or None,
+            field_name=request.args.get('field') or None,
+            value_min=request.args.get('valueMin', type=float),
+            value_max=request.args.get('valueMax', type=float)
+        )
         
-        # 分页数据
-        paginated_data = failed_data[start_idx:end_idx]
+        total = page_data['total']
+        end_idx = page * page_size
+        paginated_data = page_data['records']
         
         return jsonify({
             'success': True,
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from app.services.rule_service import RuleService
+from app.services.rule_engine import RuleEngine
 from app.services.database_service import DatabaseService
 from app.services.field_mapping_service import FieldMappingService
 from app.utils.auth_decorator import login_required
@@ -11,6 +12,9 @@ bp = Blueprint('rules', __name__)
 # 创建字段映射服务实例
 field_mapping_service = FieldMappingService()
 
+# 批量验证时每条规则返回的错误样例条数
+VALIDATE_BATCH_ERROR_SAMPLES = 20
+
 def handle_masked_password_in_config(db_config):
     """
     处理db_config中的密码掩码
@@ -365,6 +369,7 @@ def generate_statistical_rules():
         print(f"规则生成 - 使用schema: {db_config.get('schema', 'public')}, 表: {data['table_name']}")
         
         # 生成统计分析规则
+        read_info = {}
         rules = RuleService.generate_rules_from_data(
             db_config=db_config,
             table_name=data['table_name'],
@@ -376,7 +381,9 @@ def generate_statistical_rules():
             outlier_params=outlier_params,
             group_by_field=data.get('group_by_field'),
             cluster_features=data.get('cluster_features'),
-            manual_ranges=manual_ranges
+            manual_ranges=manual_ranges,
+            use_snapshot=data.get('use_snapshot', True),
+            read_info=read_info
         )
         
         # 详细统计分析结果
@@ -429,7 +436,8 @@ def generate_statistical_rules():
                         'cluster_params': cluster_params,
                         'outlier_params': outlier_params
                     }
-                }
+                },
+                'cache_hit': read_info.get('cache_hit', False)
             }
         })
     except Exception as e:
@@ -630,36 +638,19 @@ def validate_rules_batch():
         
         # 获取数据进行验证
         try:
-            connection_string = DatabaseService.get_connection_string(data['db_config'], 'utf8')
-            engine = DatabaseService.create_engine(connection_string)
-            
-            # 获取所有需要的字段
-            fields = list(set([rule['field'] for rule in rules]))
-            
-            # 导入DatabaseService以使用quote_identifier方法
-            from app.services.database_service import DatabaseService
-            
-            # 使用引号包装表名和字段名
-            quoted_table_name = DatabaseService.quote_identifier(data['table_name'])
-            
-            # 构建完整的表名（包含schema）
-            schema = data['db_config'].get('schema', 'public')
-            if schema and schema != 'public':
-                quoted_schema = DatabaseService.quote_identifier(schema)
-                full_table_name = f"{quoted_schema}.{quoted_table_name}"
-            else:
-                full_table_name = quoted_table_name
-            
-            quoted_fields = [DatabaseService.quote_identifier(field) for field in fields]
-            field_list = ', '.join(quoted_fields)
-            query = f"SELECT {field_list} FROM {full_table_name}"
+            # 获取所有需要的字段（排序保证相同规则集命中同一快照）
+            fields = sorted(set([rule['field'] for rule in rules]))
             
             # 支持数据采样以提高性能
             sample_size = data.get('sample_size', 10000)
-            if sample_size > 0:
-                query += f" LIMIT {sample_size}"
             
-            df = pd.read_sql(query, engine)
+            df, read_info = DatabaseService.read_table_snapshot(
+                data['db_config'],
+                data['table_name'],
+                fields,
+                max_rows=sample_size if sample_size > 0 else None,
+                use_cache=data.get('use_snapshot', True)
+            )
             
         except Exception as e:
             return jsonify({
@@ -709,8 +700,19 @@ def validate_rules_batch():
                     summary_stats['error_rules'] += 1
                     continue
                 
-                # 执行规则验证
-                is_valid, message, validation_stats = RuleService.validate_rule_detailed(rule, df)
+                # 执行规则验证（错误详情只构建前端展示的前若干条）
+                evaluation = RuleEngine.evaluate(rule, df)
+                is_valid = evaluation.failed_count == 0
+                message = '通过' if is_valid else f'{evaluation.failed_count} 条记录未通过验证'
+                validation_stats = {
+                    'passed_count': evaluation.passed_count,
+                    'failed_count': evaluation.failed_count,
+                    'pass_rate': round(evaluation.passed_count / evaluation.total_count * 100, 2) if evaluation.total_count else 100.0,
+                    'error_samples': [
+                        {key: (value.item() if hasattr(value, 'item') else value) for key, value in detail.items()}
+                        for detail in evaluation.details(limit=VALIDATE_BATCH_ERROR_SAMPLES)
+                    ]
+                }
                 
                 validation_results.append({
                     'rule_index': i,
@@ -773,7 +775,8 @@ def validate_rules_batch():
             'success': True,
             'data': {
                 'validation_results': validation_results,
-                'summary': summary_stats
+                'summary': summary_stats,
+                'cache_hit': read_info.get('cache_hit', False)
             }
         })
         
@@ -1,11 +1,8 @@
 from flask import Blueprint, jsonify, request, session
-from datetime import datetime, timedelta
-from app.models.model_config import ModelConfig
-from app.models.data_source import DataSource
-from app.models.rule_model import RuleLibrary
-from app.models.quality_result import QualityResult
+from datetime import datetime
 from app import db
 from app.services.sso_service import sso_service
+from app.services.dashboard_service import DashboardService
 from app.utils.auth_decorator import login_required, admin_required
 import pandas as pd
 import os
@@ -116,22 +113,14 @@ def health():
 def stats():
     try:
         print("=== system_routes 统计API被调用 ===")
-        # 从数据库查询真实统计数据
-        model_count = ModelConfig.query.filter_by(is_active=True).count()
-        db_count = DataSource.query.filter_by(is_active=True).count()  # 只统计活跃的数据源
-        rule_count = RuleLibrary.query.filter_by(is_active=True).count()
-        quality_count = QualityResult.query.count()
+        # 一条聚合查询获取各项数量（短时缓存，写入后失效）
+        counts = DashboardService.get_counts()
         
-        print(f"system_routes - 模型配置: {model_count}, 数据源: {db_count}, 规则库: {rule_count}, 质检任务: {quality_count}")
+        print(f"system_routes - 模型配置: {counts['modelCount']}, 数据源: {counts['dbCount']}, 规则库: {counts['ruleCount']}, 质检任务: {counts['qualityCount']}")
         
         return jsonify({
             'success': True, 
-            'data': {
-                'modelCount': model_count,
-                'dbCount': db_count,
-                'ruleCount': rule_count,
-                'qualityCount': quality_count
-            }
+            'data': counts
         })
     except Exception as e:
         print(f"system_routes 统计API异常: {str(e)}")
@@ -147,48 +136,37 @@ def activities():
         activities_list = []
         activity_id = 1
         
-        # 获取最近7天的活动记录
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        
-        # 查询最近的模型配置活动
-        recent_models = ModelConfig.query.filter(
-            ModelConfig.created_at >= seven_days_ago
-        ).order_by(ModelConfig.created_at.desc()).limit(5).all()
+        # 获取最近7天的活动记录（一条查询，短时缓存）
+        recent = DashboardService.get_recent_activities(days=7)
         
-        for model in recent_models:
+        # 最近的模型配置活动
+        for model in recent['config'][:5]:
             activities_list.append({
                 'id': activity_id,
-                'content': f'创建了模型配置: {model.name}',
-                'time': model.created_at.strftime('%Y-%m-%d %H:%M'),
+                'content': f'创建了模型配置: {model["name"]}',
+                'time': model['created_at'].strftime('%Y-%m-%d %H:%M'),
                 'type': 'success'
             })
             activity_id += 1
         
-        # 查询最近的数据源活动
-        recent_datasources = DataSource.query.filter(
-            DataSource.created_at >= seven_days_ago
-        ).order_by(DataSource.created_at.desc()).limit(3).all()
-        
-        for ds in recent_datasources:
+        # 最近的数据源活动
+        for ds in recent['source'][:3]:
             activities_list.append({
                 'id': activity_id,
-                'content': f'添加了数据源: {ds.name}',
-                'time': ds.created_at.strftime('%Y-%m-%d %H:%M'),
+                'content': f'添加了数据源: {ds["name"]}',
+                'time': ds['created_at'].strftime('%Y-%m-%d %H:%M'),
                 'type': 'info'
             })
             activity_id += 1
         
-        # 查询最近的质量检测活动
-        recent_quality = QualityResult.query.filter(
-            QualityResult.created_at >= seven_days_ago
-        ).order_by(QualityResult.created_at.desc()).limit(5).all()
-        
-        for quality in recent_quality:
-            activity_type = 'success' if quality.pass_rate >= 0.8 else 'warning' if quality.pass_rate >= 0.6 else 'error'
+        # 最近的质量检测活动
+        for quality in recent['quality'][:5]:
+            pass_rate = quality['pass_rate']
+            activity_type = 'success' if pass_rate >= 0.8 else 'warning' if pass_rate >= 0.6 else 'error'
             activities_list.append({
                 'id': activity_id,
-                'content': f'完成质量检测，通过率: {quality.pass_rate:.1%}',
-                'time': quality.created_at.strftime('%Y-%m-%d %H:%M'),
+                'content': f'完成质量检测，通过率: {pass_rate:.1%}',
+                'time': quality['created_at'].strftime('%Y-%m-%d %H:%M'),
                 'type': activity_type
             })
             activity_id += 1
@@ -0,0 +1,140 @@
+"""
+首页统计与质量检测统计
+
+每个统计用一条聚合 SQL 计算，结果放入短 TTL 缓存；
+模型配置、数据源、规则库、质量检测结果通过 ORM 提交写入后立即失效缓存。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.data_source import DataSource
+from app.models.model_config import ModelConfig
+from app.models.quality_result import QualityResult
+from app.models.rule_model import RuleLibrary
+from app.services.refreshing_cache import RefreshingCache
+
+
+class DashboardService:
+    """首页统计服务"""
+
+    # 缓存有效期（秒），过期后同步重新计算
+    CACHE_TTL = 30
+    # 写入后需要失效缓存的模型
+    TRACKED_MODELS = (ModelConfig, DataSource, RuleLibrary, QualityResult)
+    # 最近活动每类最多返回的条数
+    ACTIVITY_LIMITS = {'config': 5, 'source': 3, 'quality': 5}
+
+    _cache = RefreshingCache('dashboard-stats', ttl=CACHE_TTL, max_stale=CACHE_TTL, max_entries=200)
+
+    @staticmethod
+    def invalidate():
+        DashboardService._cache.invalidate()
+
+    @staticmethod
+    def _on_flush(session, flush_context):
+        """记录本事务是否写入了统计相关的表"""
+        changed = (session.new, session.dirty, session.deleted)
+        if any(isinstance(obj, DashboardService.TRACKED_MODELS) for objects in changed for obj in objects):
+            session.info['dashboard_dirty'] = True
+
+    @staticmethod
+    def _on_commit(session):
+        if session.info.pop('dashboard_dirty', False):
+            DashboardService.invalidate()
+
+    @staticmethod
+    def _on_rollback(session):
+        session.info.pop('dashboard_dirty', None)
+
+    @staticmethod
+    def get_counts():
+        """模型配置 / 数据源 / 规则库（启用的）与质量检测结果数量"""
+        def load():
+            row = db.session.execute(text(f"""
+                SELECT
+                    (SELECT COUNT(*) FROM {ModelConfig.__tablename__} WHERE is_active = :active) AS model_count,
+                    (SELECT COUNT(*) FROM {DataSource.__tablename__} WHERE is_active = :active) AS db_count,
+                    (SELECT COUNT(*) FROM {RuleLibrary.__tablename__} WHERE is_active = :active) AS rule_count,
+                    (SELECT COUNT(*) FROM {QualityResult.__tablename__}) AS quality_count
+            """), {'active': True}).fetchone()
+            return {
+                'modelCount': int(row[0] or 0),
+                'dbCount': int(row[1] or 0),
+                'ruleCount': int(row[2] or 0),
+                'qualityCount': int(row[3] or 0)
+            }
+
+        return dict(DashboardService._cache.get(('counts',), load))
+
+    @staticmethod
+    def get_recent_activities(days=7):
+        """
+        最近创建的模型配置、数据源与质量检测结果（一条 UNION ALL 查询）
+
+        各类按主键倒序取前 N 条（主键与创建时间同序），不需要 created_at 索引。
+
+        Returns:
+            dict: {'config': [...], 'source': [...], 'quality': [...]}，每项含 id / name / pass_rate / created_at
+        """
+        def load():
+            since = datetime.utcnow() - timedelta(days=days)
+            limits = DashboardService.ACTIVITY_LIMITS
+            rows = db.session.execute(text(f"""
+                (SELECT 'config' AS kind, id, name, NULL AS pass_rate, created_at
+                   FROM {ModelConfig.__tablename__} WHERE created_at >= :since
+                  ORDER BY id DESC LIMIT {int(limits['config'])})
+                UNION ALL
+                (SELECT 'source' AS kind, id, name, NULL AS pass_rate, created_at
+                   FROM {DataSource.__tablename__} WHERE created_at >= :since
+                  ORDER BY id DESC LIMIT {int(limits['source'])})
+                UNION ALL
+                (SELECT 'quality' AS kind, id, table_name AS name, pass_rate, created_at
+                   FROM {QualityResult.__tablename__} WHERE created_at >= :since
+                  ORDER BY id DESC LIMIT {int(limits['quality'])})
+            """), {'since': since}).fetchall()
+
+            activities = {kind: [] for kind in limits}
+            for kind, item_id, name, pass_rate, created_at in rows:
+                activities[kind].append({
+                    'id': item_id,
+                    'name': name,
+                    'pass_rate': float(pass_rate) if pass_rate is not None else None,
+                    'created_at': created_at
+                })
+            for items in activities.values():
+                items.sort(key=lambda item: item['created_at'] or datetime.min, reverse=True)
+            return activities
+
+        cached = DashboardService._cache.get(('activities', int(days)), load)
+        return {kind: list(items) for kind, items in cached.items()}
+
+    @staticmethod
+    def get_quality_statistics(rule_library_id=None, days=30):
+        """质量检测统计（检测次数、平均通过率、平均耗时、检测总行数）"""
+        def load():
+            conditions = "created_at >= :start_date"
+            params = {'start_date': datetime.utcnow() - timedelta(days=days)}
+            if rule_library_id:
+                conditions += " AND rule_library_id = :rule_library_id"
+                params['rule_library_id'] = rule_library_id
+            row = db.session.execute(text(f"""
+                SELECT COUNT(*), AVG(pass_rate), AVG(execution_time), SUM(total_records)
+                FROM {QualityResult.__tablename__}
+                WHERE {conditions}
+            """), params).fetchone()
+            return {
+                'total_checks': int(row[0] or 0),
+                'avg_pass_rate': float(row[1] or 0),
+                'avg_execution_time': float(row[2] or 0),
+                'total_records_checked': int(row[3] or 0)
+            }
+
+        return dict(DashboardService._cache.get(('quality', rule_library_id, days), load))
+
+
+event.listen(Session, 'after_flush', DashboardService._on_flush)
+event.listen(Session, 'after_commit', DashboardService._on_commit)
+event.listen(Session, 'after_rollback', DashboardService._on_rollback)
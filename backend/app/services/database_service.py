@@ -9,6 +9,20 @@ import pandas as pd
 from sqlalchemy import create_engine
 import re
 from pathlib import Path
+from app.services.engine_registry import EngineRegistry, EncodingCache, register_data_source_listeners, add_source_invalidation_hook
+from app.services.refreshing_cache import RefreshingCache
+from app.services.snapshot_cache import SnapshotCache
+
+# 数据源更新/删除时自动失效池化引擎
+register_data_source_listeners(DataSource)
+
+# 字段不同值缓存（下拉框取值），过期后返回旧值并后台刷新
+_distinct_values_cache = RefreshingCache('distinct-values', ttl=600, max_stale=3600)
+add_source_invalidation_hook(_distinct_values_cache.invalidate_source)
+
+# 元数据目录缓存（schema/表/字段），过期后返回旧值并后台刷新
+_metadata_cache = RefreshingCache('metadata-catalog', ttl=900, max_stale=86400)
+add_source_invalidation_hook(_metadata_cache.invalidate_source)
 
 def read_sql_auto_encoding(query, engine):
     """自动处理编码的SQL读取函数"""
@@ -94,8 +108,49 @@ class DatabaseService:
         return create_engine(connection_string, **default_args)
     
     @staticmethod
-    def test_connection(db_config):
-        """测试数据库连接"""
+    def get_engine(db_config, encoding='utf8', schema=None):
+        """从引擎注册表获取池化引擎（按数据源+编码复用连接，schema 不影响复用）"""
+        return EngineRegistry.get_engine(db_config, encoding, schema)
+
+    @staticmethod
+    def invalidate_engines(source_id=None, db_config=None):
+        """失效数据源对应的池化引擎"""
+        identities = [EngineRegistry.connection_identity(db_config)] if db_config else None
+        return EngineRegistry.invalidate(source_id, identities)
+
+    @staticmethod
+    def encoding_candidates(db_config, encodings, schema=None):
+        """候选编码列表：已记录的可用编码优先，解码失败后才回退到其余编码"""
+        return EncodingCache.candidates(db_config, encodings, schema)
+
+    @staticmethod
+    def remember_encoding(db_config, encoding, schema=None):
+        """记录数据源可用的客户端编码"""
+        EncodingCache.remember(db_config, encoding, schema)
+
+    @staticmethod
+    def forget_encoding(db_config, schema=None):
+        """清除数据源编码记录"""
+        EncodingCache.forget(db_config, schema)
+
+    @staticmethod
+    def test_connection(db_config, pooled=False):
+        """
+        测试数据库连接
+
+        Args:
+            db_config: 数据库配置
+            pooled: 为True时借用池化连接（业务读取前的预检），
+                    为False时新建直连（用于校验新录入的连接参数）
+        """
+        if pooled:
+            try:
+                with DatabaseService.get_engine(db_config).connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                print(f"数据库连接测试失败: {str(e)}")
+                return False
         try:
             conn = psycopg2.connect(
                 host=db_config['host'],
@@ -111,182 +166,222 @@ class DatabaseService:
             print(f"数据库连接测试失败: {str(e)}")
             return False
     
+    # 元数据查询时依次尝试的客户端编码
+    METADATA_ENCODINGS = ['utf8', 'gbk', 'latin1']
+
     @staticmethod
-    def get_schemas(db_config):
-        """获取数据库所有schema列表"""
+    def _metadata_key(db_config, kind, schema=None):
+        """元数据缓存键"""
+        return (RefreshingCache.source_key(db_config), kind, schema)
+
+    @staticmethod
+    def _run_metadata_query(db_config, description, query_func):
+        """
+        按候选编码执行元数据查询
+
+        已记录的可用编码优先，失败后依次回退；query_func(conn) 返回查询结果。
+        """
+        last_error = None
+        for enc in DatabaseService.encoding_candidates(db_config, DatabaseService.METADATA_ENCODINGS):
+            try:
+                engine = DatabaseService.get_engine(db_config, enc)
+                with engine.connect() as conn:
+                    try:
+                        conn.execute(text(f"SET client_encoding = '{enc}'"))
+                    except Exception as enc_error:
+                        print(f"设置编码 {enc} 失败，使用默认编码: {str(enc_error)}")
+
+                    result = query_func(conn)
+                    print(f"成功使用编码 {enc} {description}")
+                    DatabaseService.remember_encoding(db_config, enc)
+                    return result
+            except Exception as e:
+                print(f"编码 {enc} {description}失败: {str(e)}")
+                last_error = e
+                continue
+        raise Exception(f"所有编码尝试失败，最后错误: {last_error}")
+
+    @staticmethod
+    def _query_schemas(db_config):
+        """查询所有schema"""
+        def query_func(conn):
+            query = """
+            SELECT schema_name
+            FROM information_schema.schemata
+            WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+            ORDER BY schema_name
+            """
+            return [row[0] for row in conn.execute(text(query)).fetchall()]
+
+        return DatabaseService._run_metadata_query(db_config, "获取schema列表", query_func)
+
+    @staticmethod
+    def _query_tables(db_config, schema):
+        """查询schema下的表名和描述"""
+        def query_func(conn):
+            query = """
+            SELECT 
+                c.relname as table_name,
+                COALESCE(d.description, '') as table_description
+            FROM pg_class c
+            LEFT JOIN pg_description d ON c.oid = d.objoid AND d.objsubid = 0
+            WHERE c.relkind = 'r' 
+            AND c.relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = :schema)
+            ORDER BY c.relname
+            """
+            result = conn.execute(text(query), {'schema': schema})
+            return [
+                {
+                    'name': row[0],
+                    'description': row[1] if row[1] else row[0]  # 如果没有描述，使用表名
+                }
+                for row in result.fetchall()
+            ]
+
+        return DatabaseService._run_metadata_query(db_config, f"从schema '{schema}' 获取表列表", query_func)
+
+    @staticmethod
+    def _field_from_row(row):
+        return {
+            'name': row[0],
+            'type': row[1],
+            'nullable': not row[2],
+            'description': row[3] if row[3] else row[0],  # 如果没有描述，使用字段名
+            'primary_key': False,
+            'default': None
+        }
+
+    @staticmethod
+    def _query_schema_columns(db_config, schema):
+        """一次查询schema下所有表/视图的字段，返回 {表名: 字段列表}"""
+        def query_func(conn):
+            query = """
+            SELECT 
+                c.relname as table_name,
+                a.attname as column_name,
+                pg_catalog.format_type(a.atttypid, a.atttypmod) as data_type,
+                a.attnotnull as not_null,
+                COALESCE(pg_catalog.col_description(c.oid, a.attnum), '') as column_description
+            FROM pg_catalog.pg_attribute a
+            JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+            JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+            WHERE n.nspname = :schema
+            AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+            AND a.attnum > 0
+            AND NOT a.attisdropped
+            ORDER BY c.relname, a.attnum
+            """
+            columns = {}
+            for row in conn.execute(text(query), {'schema': schema}).fetchall():
+                columns.setdefault(row[0], []).append(DatabaseService._field_from_row(row[1:]))
+            return columns
+
+        return DatabaseService._run_metadata_query(db_config, f"预取schema '{schema}' 的全部字段", query_func)
+
+    @staticmethod
+    def _query_table_fields(db_config, table_name, schema):
+        """查询单个表的字段（目录缓存中没有该表时使用）"""
+        def query_func(conn):
+            query = """
+            SELECT 
+                a.attname as column_name,
+                pg_catalog.format_type(a.atttypid, a.atttypmod) as data_type,
+                a.attnotnull as not_null,
+                COALESCE(pg_catalog.col_description(c.oid, a.attnum), '') as column_description
+            FROM pg_catalog.pg_attribute a
+            JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+            JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
+            WHERE c.relname = :table_name
+            AND n.nspname = :schema
+            AND a.attnum > 0
+            AND NOT a.attisdropped
+            ORDER BY a.attnum
+            """
+            result = conn.execute(text(query), {'table_name': table_name, 'schema': schema})
+            return [DatabaseService._field_from_row(row) for row in result.fetchall()]
+
+        return DatabaseService._run_metadata_query(db_config, f"从schema '{schema}' 获取表 {table_name} 的字段", query_func)
+
+    @staticmethod
+    def get_schemas(db_config, refresh=False):
+        """获取数据库所有schema列表（元数据目录缓存）"""
         try:
-            encodings = ['utf8', 'gbk', 'latin1']
-            last_error = None
-            
-            for enc in encodings:
-                try:
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    engine = create_engine(
-                        connection_string, 
-                        connect_args={'client_encoding': enc},
-                        pool_pre_ping=True,
-                        echo=False
-                    )
-                    
-                    with engine.connect() as conn:
-                        try:
-                            conn.execute(text(f"SET client_encoding = '{enc}'"))
-                        except Exception as enc_error:
-                            print(f"设置编码 {enc} 失败，使用默认编码: {str(enc_error)}")
-                        
-                        # 查询所有schema
-                        query = """
-                        SELECT schema_name
-                        FROM information_schema.schemata
-                        WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
-                        ORDER BY schema_name
-                        """
-                        
-                        result = conn.execute(text(query))
-                        schemas = [row[0] for row in result.fetchall()]
-                        
-                        print(f"成功使用编码 {enc} 获取到 {len(schemas)} 个schema")
-                        return schemas
-                        
-                except Exception as e:
-                    print(f"编码 {enc} 失败: {str(e)}")
-                    last_error = e
-                    continue
-            
-            # 如果所有编码都失败，返回默认的public schema
-            print(f"所有编码尝试失败，返回默认schema。最后错误: {last_error}")
-            return ['public']
-            
+            key = DatabaseService._metadata_key(db_config, 'schemas')
+            if refresh:
+                _metadata_cache.invalidate(lambda k: k == key)
+            return _metadata_cache.get(key, lambda: DatabaseService._query_schemas(db_config))
         except Exception as e:
             print(f"获取schema列表失败: {str(e)}")
             # 返回默认schema而不是抛出异常
             return ['public']
     
     @staticmethod
-    def get_tables(db_config):
-        """获取数据库表列表（包含描述），自动尝试多种编码"""
+    def get_tables(db_config, refresh=False):
+        """获取数据库表列表（包含描述，元数据目录缓存）"""
         try:
-            encodings = ['utf8', 'gbk', 'latin1']
-            last_error = None
-            
             # 获取schema，默认为public
             schema = db_config.get('schema', 'public')
-            
-            for enc in encodings:
-                try:
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    engine = create_engine(
-                        connection_string, 
-                        connect_args={'client_encoding': enc},
-                        pool_pre_ping=True,
-                        echo=False
-                    )
-                    
-                    with engine.connect() as conn:
-                        try:
-                            conn.execute(text(f"SET client_encoding = '{enc}'"))
-                        except Exception as enc_error:
-                            print(f"设置编码 {enc} 失败，使用默认编码: {str(enc_error)}")
-                        
-                        # 查询表名和描述，使用动态schema
-                        query = """
-                        SELECT 
-                            c.relname as table_name,
-                            COALESCE(d.description, '') as table_description
-                        FROM pg_class c
-                        LEFT JOIN pg_description d ON c.oid = d.objoid AND d.objsubid = 0
-                        WHERE c.relkind = 'r' 
-                        AND c.relnamespace = (SELECT oid FROM pg_namespace WHERE nspname = :schema)
-                        ORDER BY c.relname
-                        """
-                        
-                        result = conn.execute(text(query), {'schema': schema})
-                        tables = []
-                        for row in result.fetchall():
-                            tables.append({
-                                'name': row[0],
-                                'description': row[1] if row[1] else row[0]  # 如果没有描述，使用表名
-                            })
-                        
-                        print(f"成功使用编码 {enc} 从schema '{schema}' 获取到 {len(tables)} 个表（含描述）")
-                        return tables
-                        
-                except Exception as e:
-                    print(f"编码 {enc} 失败: {str(e)}")
-                    last_error = e
-                    continue
-            
-            raise Exception(f"所有编码尝试失败，最后错误: {last_error}")
-            
+            key = DatabaseService._metadata_key(db_config, 'tables', schema)
+            if refresh:
+                DatabaseService.refresh_metadata(db_config, schema)
+            tables = _metadata_cache.get(key, lambda: DatabaseService._query_tables(db_config, schema))
+            print(f"从schema '{schema}' 获取到 {len(tables)} 个表（含描述）")
+            return tables
         except Exception as e:
             print(f"获取表列表失败: {str(e)}")
             raise e
     
     @staticmethod
-    def get_table_fields(db_config, table_name):
-        """获取表字段信息（包含描述）"""
+    def get_table_fields(db_config, table_name, refresh=False):
+        """
+        获取表字段信息（包含描述）
+
+        首次访问某个schema时一次性预取该schema下所有表的字段并缓存，
+        之后同一schema内的表字段查询直接命中缓存。
+        """
         try:
-            # 尝试多种编码获取字段信息
-            encodings = ['utf8', 'gbk', 'latin1']
-            last_error = None
-            
             # 获取schema，默认为public
             schema = db_config.get('schema', 'public')
-            
-            for enc in encodings:
-                try:
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    engine = create_engine(connection_string, connect_args={'client_encoding': enc})
-                    
-                    with engine.connect() as conn:
-                        conn.execute(text(f"SET client_encoding = '{enc}'"))
-                        
-                        # 查询字段名、类型和描述，使用动态schema
-                        query = """
-                        SELECT 
-                            a.attname as column_name,
-                            pg_catalog.format_type(a.atttypid, a.atttypmod) as data_type,
-                            a.attnotnull as not_null,
-                            COALESCE(pg_catalog.col_description(c.oid, a.attnum), '') as column_description
-                        FROM pg_catalog.pg_attribute a
-                        JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
-                        JOIN pg_catalog.pg_namespace n ON c.relnamespace = n.oid
-                        WHERE c.relname = :table_name
-                        AND n.nspname = :schema
-                        AND a.attnum > 0
-                        AND NOT a.attisdropped
-                        ORDER BY a.attnum
-                        """
-                        
-                        result = conn.execute(text(query), {'table_name': table_name, 'schema': schema})
-                        
-                        fields = []
-                        for row in result.fetchall():
-                            field = {
-                                'name': row[0],
-                                'type': row[1],
-                                'nullable': not row[2],
-                                'description': row[3] if row[3] else row[0],  # 如果没有描述，使用字段名
-                                'primary_key': False,
-                                'default': None
-                            }
-                            fields.append(field)
-                        
-                        print(f"成功使用编码 {enc} 从schema '{schema}' 获取到 {len(fields)} 个字段（含描述）")
-                        return fields
-                        
-                except Exception as e:
-                    last_error = e
-                    print(f"使用编码 {enc} 获取字段失败: {str(e)}")
-                    continue
-            
-            raise last_error
+            if refresh:
+                DatabaseService.refresh_metadata(db_config, schema)
+
+            catalog = DatabaseService.prefetch_metadata(db_config, schema)
+            if table_name in catalog:
+                return [dict(field) for field in catalog[table_name]]
+
+            # 目录中没有该表（例如缓存之后新建的表）时单独查询
+            fields = DatabaseService._query_table_fields(db_config, table_name, schema)
+            if fields:
+                DatabaseService.refresh_metadata(db_config, schema)
+            return fields
             
         except Exception as e:
             raise Exception(f"获取表字段失败: {str(e)}")
+
+    @staticmethod
+    def prefetch_metadata(db_config, schema=None):
+        """预取schema下所有表的字段（每个schema一条查询），返回 {表名: 字段列表}"""
+        schema = schema or db_config.get('schema') or 'public'
+        key = DatabaseService._metadata_key(db_config, 'columns', schema)
+        return _metadata_cache.get(key, lambda: DatabaseService._query_schema_columns(db_config, schema))
+
+    @staticmethod
+    def refresh_metadata(db_config, schema=None):
+        """
+        失效数据源的元数据目录缓存
+
+        Args:
+            schema: 只失效指定schema的表和字段；不指定时失效该数据源全部元数据
+        """
+        source_key = RefreshingCache.source_key(db_config)
+        count = _metadata_cache.invalidate(
+            lambda key: key[0] == source_key and (schema is None or key[2] in (None, schema))
+        )
+        print(f"已失效元数据缓存 {count} 项: schema={schema or '全部'}")
+        return count
     
     @staticmethod
-    def read_data_in_batches(db_config, table_name, fields=None, batch_size=10000, max_rows=None, schema='public', filters=None, start_date=None, end_date=None, date_column='update_date'):
+    def read_data_in_batches(db_config, table_name, fields=None, batch_size=10000, max_rows=None, schema='public', filters=None, start_date=None, end_date=None, date_column='update_date', pagination='auto', extractor='pandas', parallel=1, ordered=True):
         """
         分批读取大数据集，避免内存溢出
         
@@ -301,6 +396,20 @@ class DatabaseService:
             start_date: 开始日期（格式：YYYY-MM-DD），筛选date_column >= start_date
             end_date: 结束日期（格式：YYYY-MM-DD），筛选date_column <= end_date
             date_column: 用于时间范围筛选的列名，默认为'update_date'
+            pagination: 分页方式
+                'auto'   - 自动选择：单列主键 → keyset；PostgreSQL 14+ → ctid；否则服务端游标
+                'keyset' - 按主键 WHERE pk > 上一批最大值 ORDER BY pk 分页
+                'ctid'   - 按物理块 ctid 范围分页（依赖 PostgreSQL 14+ 的 TID Range Scan）
+                'cursor' - 单个服务端命名游标 + fetchmany
+                'offset' - 旧的 LIMIT/OFFSET 方式（越往后越慢）
+            extractor: 数据提取方式
+                'pandas' - pd.read_sql 逐行元组转换（默认）
+                'copy'   - COPY (SELECT ...) TO STDOUT 导出CSV，按字段元数据直接解析为列式数组
+                           （安装了 pyarrow 时使用 Arrow CSV 解析器），适合大批量读取；
+                           该方式下 pagination 参数不生效
+            parallel: 并行读取的连接数（>1 时按整数主键 min/max 或 ctid 块范围切分为 N 个分区，
+                      在线程池中并发读取，使用本次读取专用的短期引擎（不占用共享连接池）；最多 PARALLEL_MAX_WORKERS）
+            ordered: 并行读取时是否按分区顺序返回批次（False 表示哪个分区先读到先返回）
             
         Returns:
             generator: 返回DataFrame批次的生成器
@@ -312,38 +421,34 @@ class DatabaseService:
         encodings = ['utf8', 'gbk']
         last_error = None
         
-        for encoding in encodings:
+        for encoding in DatabaseService.encoding_candidates(db_config, encodings, schema):
             try:
                 logger.info(f"尝试使用编码 {encoding} 分批读取数据: 表={table_name}, 批次大小={batch_size}, 最大行数={max_rows}")
                 
-                connection_string = DatabaseService.get_connection_string(db_config, encoding)
-                engine = DatabaseService.create_engine(connection_string)
-                
-                # 设置数据库客户端编码
-                try:
-                    with engine.connect() as test_conn:
-                        if encoding == 'utf8':
-                            test_conn.execute(text("SET client_encoding = 'UTF8'"))
-                        elif encoding == 'gbk':
-                            test_conn.execute(text("SET client_encoding = 'GBK'"))
-                        logger.info(f"成功设置数据库客户端编码为 {encoding}")
-                except Exception as enc_error:
-                    logger.warning(f"设置编码 {encoding} 失败，使用默认编码: {str(enc_error)}")
+                # 客户端编码已通过连接串指定，直接复用池化引擎
+                engine = DatabaseService.get_engine(db_config, encoding, schema)
                 
                 # 尝试读取第一批数据验证编码是否正确
                 # 创建生成器并尝试获取第一个批次
                 gen = DatabaseService._read_data_in_batches_with_engine(
-                    engine, table_name, fields, batch_size, max_rows, schema, logger, filters, start_date, end_date, date_column
+                    engine, table_name, fields, batch_size, max_rows, schema, logger, filters, start_date, end_date, date_column, pagination, extractor, parallel, ordered
                 )
                 
                 # 测试第一个批次，验证编码
                 try:
                     first_batch = next(gen)
+                    DatabaseService.remember_encoding(db_config, encoding, schema)
                     # 如果成功，先yield第一个批次，然后yield剩余的
                     def yield_all():
                         yield first_batch
-                        for batch in gen:
-                            yield batch
+                        try:
+                            for batch in gen:
+                                yield batch
+                        except Exception as batch_error:
+                            # 后续批次解码失败：清除编码记录，下次请求重新探测
+                            if 'decode' in str(batch_error).lower() or 'codec' in str(batch_error).lower():
+                                DatabaseService.forget_encoding(db_config, schema)
+                            raise
                     return yield_all()
                 except StopIteration:
                     # 如果没有数据，返回空生成器
@@ -352,28 +457,132 @@ class DatabaseService:
             except UnicodeDecodeError as e:
                 last_error = f"'{encoding}' codec can't decode: {str(e)}"
                 logger.warning(f"编码 {encoding} 失败: {last_error}")
-                try:
-                    engine.dispose()
-                except:
-                    pass
+                DatabaseService.forget_encoding(db_config, schema)
                 continue
             except Exception as e:
                 last_error = str(e)
                 logger.error(f"使用编码 {encoding} 读取数据失败: {last_error}")
-                try:
-                    engine.dispose()
-                except:
-                    pass
                 # 如果不是编码问题，直接抛出异常
                 if 'decode' not in str(e).lower() and 'codec' not in str(e).lower():
                     raise
+                DatabaseService.forget_encoding(db_config, schema)
                 continue
         
         # 所有编码都失败
         raise Exception(f"所有编码尝试失败，最后错误: {last_error}")
     
     @staticmethod
-    def _read_data_in_batches_with_engine(engine, table_name, fields=None, batch_size=10000, max_rows=None, schema='public', logger=None, filters=None, start_date=None, end_date=None, date_column='update_date'):
+    def read_table_snapshot(db_config, table_name, fields=None, filters=None, start_date=None, end_date=None, date_column='update_date', max_rows=None, use_cache=True, **read_options):
+        """
+        读取表数据切片，优先使用本地 Parquet 快照
+
+        相同 (数据源, schema, 表, 字段, 过滤条件) 的切片在有效期内且源表未变化时
+        直接内存映射本地快照文件；否则通过 read_data_in_batches 拉取并写入快照。
+
+        Args:
+            use_cache: 是否使用快照缓存
+            read_options: 透传给 read_data_in_batches 的参数（batch_size/pagination/extractor/parallel）
+
+        Returns:
+            tuple: (DataFrame, 读取信息 {'cache_hit': 是否命中快照, 'rows': 行数, ...})
+        """
+        schema = db_config.get('schema') or 'public'
+        
+        def load():
+            batches = list(DatabaseService.read_data_in_batches(
+                db_config, table_name, fields,
+                max_rows=max_rows, schema=schema, filters=filters,
+                start_date=start_date, end_date=end_date, date_column=date_column,
+                **read_options
+            ))
+            if not batches:
+                return pd.DataFrame(columns=fields or [])
+            return pd.concat(batches, ignore_index=True)
+        
+        if not use_cache or not SnapshotCache.is_available():
+            df = load()
+            return df, {'cache_hit': False, 'snapshot': False, 'rows': len(df)}
+        
+        key, descriptor = SnapshotCache.make_key(
+            db_config, table_name, fields, filters, start_date, end_date, date_column, max_rows
+        )
+        quoted_table_name = DatabaseService.quote_identifier(table_name)
+        full_table_name = f"{DatabaseService.quote_identifier(schema)}.{quoted_table_name}" if schema != 'public' else quoted_table_name
+        
+        try:
+            encoding = DatabaseService.encoding_candidates(db_config, ['utf8', 'gbk'], schema)[0]
+            probe = SnapshotCache.probe_freshness(
+                DatabaseService.get_engine(db_config, encoding, schema), full_table_name, date_column
+            )
+        except Exception as e:
+            print(f"快照新鲜度探测失败，直接读取: {str(e)}")
+            df = load()
+            return df, {'cache_hit': False, 'snapshot': False, 'rows': len(df)}
+        
+        df, meta = SnapshotCache.get(key, probe)
+        if df is not None:
+            print(f"命中数据快照: 表={table_name}, 行数={len(df)}")
+            return df, {
+                'cache_hit': True,
+                'snapshot': True,
+                'rows': len(df),
+                'snapshot_created_at': meta['created_at']
+            }
+        
+        df = load()
+        meta = SnapshotCache.put(key, descriptor, probe, df)
+        return df, {'cache_hit': False, 'snapshot': meta is not None, 'rows': len(df)}
+
+    @staticmethod
+    def _get_primary_key(conn, full_table_name):
+        """获取表的单列主键名，复合主键或无主键时返回None"""
+        query = """
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = CAST(:rel AS regclass)
+        AND i.indisprimary
+        """
+        rows = conn.execute(text(query), {'rel': full_table_name}).fetchall()
+        if len(rows) == 1:
+            return rows[0][0]
+        return None
+
+    @staticmethod
+    def _resolve_pagination(engine, full_table_name, pagination, logger):
+        """
+        确定分页方式
+
+        Returns:
+            tuple: (分页方式, 主键列名)
+        """
+        if pagination == 'offset':
+            return 'offset', None
+
+        with engine.connect() as conn:
+            if pagination in ('auto', 'keyset'):
+                try:
+                    primary_key = DatabaseService._get_primary_key(conn, full_table_name)
+                except Exception as pk_error:
+                    logger.warning(f"查询主键失败: {str(pk_error)}")
+                    primary_key = None
+                if primary_key:
+                    return 'keyset', primary_key
+                if pagination == 'keyset':
+                    logger.warning(f"表 {full_table_name} 无单列主键，keyset分页回退为自动选择")
+
+            if pagination in ('auto', 'keyset', 'ctid'):
+                # ctid 范围扫描需要 PostgreSQL 14+ 的 TID Range Scan，否则每批都会全表扫描
+                server_version = conn.execute(text("SHOW server_version_num")).scalar()
+                if int(server_version) >= 140000:
+                    return 'ctid', None
+                if pagination == 'ctid':
+                    logger.warning("PostgreSQL 版本低于14，不支持 TID Range Scan，ctid分页回退为服务端游标")
+
+        return 'cursor', None
+
+    @staticmethod
+    def _read_data_in_batches_with_engine(engine, table_name, fields=None, batch_size=10000, max_rows=None, schema='public', logger=None, filters=None, start_date=None, end_date=None, date_column='update_date', pagination='auto', extractor='pandas', parallel=1, ordered=True):
         """使用指定的engine分批读取数据"""
         if logger is None:
             import logging
@@ -390,7 +599,6 @@ class DatabaseService:
                 full_table_name = quoted_table_name
             
             # --- 构建过滤条件 ---
-            where_clause = ""
             conditions = []
             
             # 处理字段过滤条件
@@ -415,63 +623,526 @@ class DatabaseService:
                     safe_end_date = str(end_date).replace("'", "''")
                     conditions.append(f"{quoted_date_column} <= '{safe_end_date}'")
                     logger.info(f"添加结束日期过滤: {quoted_date_column} <= '{safe_end_date}'")
-            
-            if conditions:
-                where_clause = "WHERE " + " AND ".join(conditions)
             # -------------------
 
             # [优化] 移除 SELECT COUNT(*) 查询，直接按需读取
             # 旧逻辑：先Count再采样(Sampling)，会导致大表卡死且不符合"限制数据量"的直觉
-            # 新逻辑：直接 LIMIT 方式分批读取前 N 条 (Sequential Reading)
+            # 新逻辑：按 keyset/ctid/服务端游标顺序读取前 N 条，每批耗时不随读取深度增长
             
             if fields:
                 quoted_fields = [DatabaseService.quote_identifier(field) for field in fields]
                 field_list = ', '.join(quoted_fields)
-                base_query = f"SELECT {field_list} FROM {full_table_name} {where_clause}"
             else:
-                base_query = f"SELECT * FROM {full_table_name} {where_clause}"
+                field_list = '*'
+            
+            partitions = None
+            if parallel and int(parallel) > 1 and extractor != 'copy':
+                partitions = DatabaseService._plan_partitions(engine, full_table_name, conditions, int(parallel), logger)
+            
+            if partitions:
+                mode, key_column = 'parallel', None
+                logger.info(f"分批读取方式: 并行 {len(partitions)} 个分区（{'有序' if ordered else '无序'}）")
+            elif extractor == 'copy':
+                mode, key_column = 'copy', None
+                logger.info("分批读取提取方式: COPY TO STDOUT")
+            else:
+                mode, key_column = DatabaseService._resolve_pagination(engine, full_table_name, pagination, logger)
+                logger.info(f"分批读取分页方式: {mode}" + (f"（主键 {key_column}）" if key_column else ""))
             
-            offset = 0
-            total_yielded = 0
+            if mode == 'parallel':
+                batches = DatabaseService._iter_parallel_batches(
+                    engine, full_table_name, fields, field_list, conditions, partitions, batch_size, max_rows, ordered
+                )
+            elif mode == 'copy':
+                batches = DatabaseService._iter_copy_batches(
+                    engine, full_table_name, field_list, conditions, batch_size, max_rows
+                )
+            elif mode == 'keyset':
+                batches = DatabaseService._iter_keyset_batches(
+                    engine, full_table_name, fields, field_list, conditions, key_column, batch_size, max_rows
+                )
+            elif mode == 'ctid':
+                batches = DatabaseService._iter_ctid_batches(
+                    engine, full_table_name, field_list, conditions, batch_size, max_rows
+                )
+            elif mode == 'cursor':
+                batches = DatabaseService._iter_cursor_batches(
+                    engine, full_table_name, field_list, conditions, batch_size, max_rows
+                )
+            else:
+                batches = DatabaseService._iter_offset_batches(
+                    engine, full_table_name, field_list, conditions, batch_size, max_rows
+                )
             
-            # 循环读取直到达到 max_rows 或数据读完
-            while max_rows is None or total_yielded < max_rows:
-                try:
-                    # 计算当前批次需要读取的条数
-                    current_limit = batch_size
-                    if max_rows is not None:
-                        remaining = max_rows - total_yielded
-                        if remaining < batch_size:
-                            current_limit = remaining
-                    
-                    # 直接使用 LIMIT OFFSET 进行分批读取
-                    query = f"{base_query} LIMIT {current_limit} OFFSET {offset}"
-                    
-                    df_batch = pd.read_sql(query, engine)
-                    
-                    if df_batch.empty:
-                        break
-                    
-                    rows_fetched = len(df_batch)
-                    total_yielded += rows_fetched
-                    offset += rows_fetched
-                    
-                    yield df_batch
-                    
-                    # 如果读取到的数据少于请求的限制，说明数据已经读完了
-                    if rows_fetched < current_limit:
-                        break
-                        
-                except Exception as batch_error:
-                    logger.error(f"读取批次失败: {str(batch_error)}")
-                    raise
+            total_yielded = 0
+            for df_batch in batches:
+                total_yielded += len(df_batch)
+                yield df_batch
             
             logger.info(f"分批读取完成，共读取 {total_yielded} 行")
-            engine.dispose()
             
         except Exception as e:
             logger.error(f"分批读取数据失败: {str(e)}")
             raise Exception(f"分批读取数据失败: {str(e)}")
+
+    # 并行读取的最大分区数（即专用引擎的连接数）
+    PARALLEL_MAX_WORKERS = 8
+
+    @staticmethod
+    def _plan_partitions(engine, full_table_name, conditions, parallel, logger):
+        """
+        规划并行读取分区
+
+        优先使用整数单列主键的 min/max 等分；否则在 PostgreSQL 14+ 上按 ctid 块范围等分。
+        无法安全切分时返回 None（回退为串行读取）。
+
+        Returns:
+            list: 分区描述 [{'type': 'key', 'key': 主键, 'lower': 下界, 'upper': 上界} |
+                           {'type': 'ctid', 'start_block': 起始块, 'end_block': 结束块或None}]
+        """
+        parallel = min(parallel, DatabaseService.PARALLEL_MAX_WORKERS)
+        with engine.connect() as conn:
+            try:
+                primary_key = DatabaseService._get_primary_key(conn, full_table_name)
+                column_types = DatabaseService._get_column_types(conn, full_table_name) if primary_key else {}
+            except Exception as meta_error:
+                logger.warning(f"查询主键失败: {str(meta_error)}")
+                primary_key, column_types = None, {}
+            
+            if primary_key and DatabaseService._classify_pg_type(column_types.get(primary_key)) == 'int':
+                quoted_key = DatabaseService.quote_identifier(primary_key)
+                where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                bounds = conn.execute(text(
+                    f"SELECT MIN({quoted_key}), MAX({quoted_key}) FROM {full_table_name} {where_clause}"
+                )).fetchone()
+                if bounds[0] is None:
+                    return None
+                low, high = int(bounds[0]), int(bounds[1]) + 1
+                step = max(1, -(-(high - low) // parallel))
+                return [
+                    {'type': 'key', 'key': primary_key, 'lower': lower, 'upper': min(lower + step, high)}
+                    for lower in range(low, high, step)
+                ]
+            
+            server_version = conn.execute(text("SHOW server_version_num")).scalar()
+            if int(server_version) < 140000:
+                logger.warning("无整数主键且 PostgreSQL 版本低于14，无法按范围并行读取，回退为串行")
+                return None
+            total_blocks, _ = DatabaseService._get_block_stats(conn, full_table_name)
+        
+        if total_blocks <= 0:
+            return None
+        step = max(1, -(-total_blocks // parallel))
+        starts = list(range(0, total_blocks, step))
+        return [
+            {'type': 'ctid', 'start_block': start, 'end_block': None if i == len(starts) - 1 else start + step}
+            for i, start in enumerate(starts)
+        ]
+
+    @staticmethod
+    def _iter_partition_batches(engine, full_table_name, fields, field_list, conditions, partition, batch_size, max_rows):
+        """读取单个分区"""
+        if partition['type'] == 'key':
+            quoted_key = DatabaseService.quote_identifier(partition['key'])
+            range_conditions = list(conditions) + [
+                f"{quoted_key} >= {int(partition['lower'])}",
+                f"{quoted_key} < {int(partition['upper'])}"
+            ]
+            return DatabaseService._iter_keyset_batches(
+                engine, full_table_name, fields, field_list, range_conditions, partition['key'], batch_size, max_rows
+            )
+        return DatabaseService._iter_ctid_batches(
+            engine, full_table_name, field_list, conditions, batch_size, max_rows,
+            start_block=partition['start_block'], end_block=partition['end_block']
+        )
+
+    @staticmethod
+    def _iter_parallel_batches(engine, full_table_name, fields, field_list, conditions, partitions, batch_size, max_rows, ordered=True):
+        """
+        线程池并发读取各分区
+
+        每个分区一个有界队列（最多缓存2批），内存占用约为 分区数 × 2 × batch_size；
+        消费端达到 max_rows 或提前退出时通知各线程停止。
+        各分区使用本次读取专用的引擎（连接数 = 分区数），所有线程退出后释放。
+        """
+        import queue
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        
+        done = object()
+        stop_event = threading.Event()
+        if ordered:
+            queues = [queue.Queue(maxsize=2) for _ in partitions]
+        else:
+            shared_queue = queue.Queue(maxsize=2 * len(partitions))
+            queues = [shared_queue] * len(partitions)
+        
+        def put(q, item):
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def worker(index, partition):
+            q = queues[index]
+            try:
+                for df_batch in DatabaseService._iter_partition_batches(
+                    partition_engine, full_table_name, fields, field_list, conditions, partition, batch_size, max_rows
+                ):
+                    if not put(q, (index, df_batch)):
+                        return
+                put(q, (index, done))
+            except Exception as e:
+                put(q, (index, e))
+        
+        partition_engine = EngineRegistry.create_dedicated_engine(engine, len(partitions))
+        executor = ThreadPoolExecutor(max_workers=len(partitions), thread_name_prefix='db-partition')
+        try:
+            for index, partition in enumerate(partitions):
+                executor.submit(worker, index, partition)
+            
+            total_yielded = 0
+            finished = 0
+            current = 0
+            while finished < len(partitions):
+                q = queues[current] if ordered else queues[0]
+                _, item = q.get()
+                if item is done:
+                    finished += 1
+                    current += 1
+                    continue
+                if isinstance(item, Exception):
+                    raise item
+                if max_rows is not None:
+                    item = item.iloc[:max_rows - total_yielded]
+                total_yielded += len(item)
+                yield item
+                if max_rows is not None and total_yielded >= max_rows:
+                    break
+        finally:
+            stop_event.set()
+            
+            def release():
+                # 等待仍在执行查询的线程退出后再释放专用引擎，不阻塞消费端
+                executor.shutdown(wait=True)
+                partition_engine.dispose()
+            
+            threading.Thread(target=release, name='db-partition-release', daemon=True).start()
+
+    @staticmethod
+    def _batch_limit(batch_size, max_rows, total_yielded):
+        """计算当前批次需要读取的条数"""
+        if max_rows is not None:
+            return min(batch_size, max_rows - total_yielded)
+        return batch_size
+
+    @staticmethod
+    def _iter_keyset_batches(engine, full_table_name, fields, field_list, conditions, key_column, batch_size, max_rows):
+        """按主键 keyset 分页：WHERE pk > :last_key ORDER BY pk LIMIT n"""
+        quoted_key = DatabaseService.quote_identifier(key_column)
+        # 主键不在查询字段中时临时带上，用于记录分页位置
+        extra_key = bool(fields) and key_column not in fields
+        select_list = f"{field_list}, {quoted_key} AS __keyset_key" if extra_key else field_list
+        key_label = '__keyset_key' if extra_key else key_column
+        
+        last_key = None
+        total_yielded = 0
+        while max_rows is None or total_yielded < max_rows:
+            current_limit = DatabaseService._batch_limit(batch_size, max_rows, total_yielded)
+            batch_conditions = list(conditions)
+            params = {}
+            if last_key is not None:
+                batch_conditions.append(f"{quoted_key} > :last_key")
+                params['last_key'] = last_key
+            where_clause = f"WHERE {' AND '.join(batch_conditions)}" if batch_conditions else ""
+            query = f"SELECT {select_list} FROM {full_table_name} {where_clause} ORDER BY {quoted_key} LIMIT {current_limit}"
+            
+            with engine.connect() as conn:
+                df_batch = pd.read_sql(text(query), conn, params=params)
+            
+            if df_batch.empty:
+                break
+            
+            last_key = df_batch[key_label].iloc[-1]
+            if hasattr(last_key, 'item'):
+                last_key = last_key.item()
+            if extra_key:
+                df_batch = df_batch.drop(columns=['__keyset_key'])
+            
+            total_yielded += len(df_batch)
+            yield df_batch
+            
+            if len(df_batch) < current_limit:
+                break
+
+    @staticmethod
+    def _get_block_stats(conn, full_table_name):
+        """
+        获取表的物理块统计
+
+        Returns:
+            tuple: (总块数, 每块平均行数)
+        """
+        size_row = conn.execute(text("""
+            SELECT pg_relation_size(CAST(:rel AS regclass)) / current_setting('block_size')::bigint,
+                   c.reltuples, c.relpages
+            FROM pg_class c WHERE c.oid = CAST(:rel AS regclass)
+        """), {'rel': full_table_name}).fetchone()
+        total_blocks = int(size_row[0] or 0)
+        reltuples, relpages = float(size_row[1] or 0), int(size_row[2] or 0)
+        rows_per_block = reltuples / relpages if relpages > 0 and reltuples > 0 else 50
+        return total_blocks, rows_per_block
+
+    @staticmethod
+    def _iter_ctid_batches(engine, full_table_name, field_list, conditions, batch_size, max_rows, start_block=0, end_block=None):
+        """
+        按物理块 ctid 范围分页：WHERE ctid >= '(b0,0)' AND ctid < '(b1,0)'
+
+        每批只扫描对应的数据块（TID Range Scan），不排序，按 batch_size 重新切分后输出。
+        start_block/end_block 用于并行读取时限定分区范围，end_block 为 None 表示读到表尾。
+        """
+        with engine.connect() as conn:
+            total_blocks, rows_per_block = DatabaseService._get_block_stats(conn, full_table_name)
+        blocks_per_batch = max(1, int(batch_size / max(rows_per_block, 1)))
+        last_block = end_block if end_block is not None else total_blocks
+        
+        pending = None
+        total_yielded = 0
+        block = start_block
+        while max_rows is None or total_yielded < max_rows:
+            batch_conditions = list(conditions) + [f"ctid >= '({block},0)'::tid"]
+            next_block = min(block + blocks_per_batch, last_block)
+            is_last_window = next_block >= last_block
+            if not is_last_window or end_block is not None:
+                # 读到表尾时最后一个窗口不设上界，包含统计后新追加的数据块
+                batch_conditions.append(f"ctid < '({next_block},0)'::tid")
+            query = f"SELECT {field_list} FROM {full_table_name} WHERE {' AND '.join(batch_conditions)}"
+            
+            with engine.connect() as conn:
+                df_window = pd.read_sql(text(query), conn)
+            
+            if not df_window.empty:
+                pending = df_window if pending is None else pd.concat([pending, df_window], ignore_index=True)
+            
+            while pending is not None and len(pending) >= batch_size and (max_rows is None or total_yielded < max_rows):
+                current_limit = DatabaseService._batch_limit(batch_size, max_rows, total_yielded)
+                df_batch = pending.iloc[:current_limit].reset_index(drop=True)
+                pending = pending.iloc[current_limit:].reset_index(drop=True)
+                total_yielded += len(df_batch)
+                yield df_batch
+            
+            if is_last_window:
+                break
+            block = next_block
+        
+        if pending is not None and not pending.empty and (max_rows is None or total_yielded < max_rows):
+            current_limit = DatabaseService._batch_limit(len(pending), max_rows, total_yielded)
+            yield pending.iloc[:current_limit].reset_index(drop=True)
+
+    @staticmethod
+    def _iter_cursor_batches(engine, full_table_name, field_list, conditions, batch_size, max_rows):
+        """单个服务端命名游标 + fetchmany，整个读取过程只执行一次查询"""
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT {field_list} FROM {full_table_name} {where_clause}"
+        if max_rows is not None:
+            query += f" LIMIT {int(max_rows)}"
+        
+        with engine.connect() as conn:
+            # stream_results 使 psycopg2 使用命名游标，数据按批从服务端拉取
+            result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(text(query))
+            columns = list(result.keys())
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+                if len(rows) < batch_size:
+                    break
+
+    @staticmethod
+    def _get_column_types(conn, full_table_name):
+        """获取表字段类型 {字段名: format_type}"""
+        query = """
+        SELECT a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod)
+        FROM pg_catalog.pg_attribute a
+        WHERE a.attrelid = CAST(:rel AS regclass)
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """
+        return {row[0]: row[1] for row in conn.execute(text(query), {'rel': full_table_name}).fetchall()}
+
+    @staticmethod
+    def _classify_pg_type(pg_type):
+        """将 PostgreSQL 类型归类为 int/float/bool/datetime/string"""
+        t = (pg_type or '').lower()
+        if t in ('smallint', 'integer', 'bigint'):
+            return 'int'
+        if t.startswith('numeric') or t in ('real', 'double precision'):
+            return 'float'
+        if t == 'boolean':
+            return 'bool'
+        if t.startswith('timestamp') or t == 'date':
+            return 'datetime'
+        return 'string'
+
+    @staticmethod
+    def _iter_copy_batches(engine, full_table_name, field_list, conditions, batch_size, max_rows):
+        """
+        COPY (SELECT ...) TO STDOUT 批量导出，再按列类型解析为DataFrame批次
+
+        服务端一次性输出CSV文本，省去逐行构造Python元组的开销；
+        导出内容先落到临时文件（小于64MB时在内存中），再分块解析。
+        """
+        import tempfile
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        select_query = f"SELECT {field_list} FROM {full_table_name} {where_clause}"
+        if max_rows is not None:
+            select_query += f" LIMIT {int(max_rows)}"
+        copy_sql = f"COPY ({select_query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+        
+        client_encoding = str(engine.url.query.get('client_encoding', 'UTF8')).upper()
+        py_encoding = {'UTF8': 'utf-8', 'GBK': 'gbk', 'LATIN1': 'latin-1'}.get(client_encoding, 'utf-8')
+        
+        with engine.connect() as conn:
+            column_types = DatabaseService._get_column_types(conn, full_table_name)
+        
+        buffer = tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, mode='w+b')
+        try:
+            raw_conn = engine.raw_connection()
+            try:
+                cursor = raw_conn.cursor()
+                cursor.copy_expert(copy_sql, buffer)
+                cursor.close()
+            finally:
+                raw_conn.close()
+            buffer.seek(0)
+            
+            for df_batch in DatabaseService._parse_copy_csv(buffer, column_types, batch_size, py_encoding):
+                yield df_batch
+        finally:
+            buffer.close()
+
+    # COPY 输出的时间特殊值，转换为 NaT
+    COPY_INFINITY_VALUES = ('infinity', '-infinity')
+
+    @staticmethod
+    def _convert_copy_datetimes(df, datetime_columns):
+        """
+        把按文本读取的时间列转换为 datetime
+
+        timestamptz 以带偏移的文本输出（如 2024-01-01 10:00:00+08），统一转换为 UTC；
+        infinity / -infinity 及超出 pandas 范围的值（如公元前日期）转换为 NaT。
+        """
+        for col, with_tz in datetime_columns.items():
+            if col not in df.columns:
+                continue
+            values = df[col]
+            if values.dtype == object:
+                values = values.mask(values.isin(DatabaseService.COPY_INFINITY_VALUES))
+            df[col] = pd.to_datetime(values, utc=with_tz, format='ISO8601', errors='coerce')
+        return df
+
+    @staticmethod
+    def _parse_copy_csv(buffer, column_types, batch_size, py_encoding):
+        """
+        解析 COPY 导出的CSV，优先使用 pyarrow，未安装时回退到 pandas C 解析器
+
+        时间列先按文本读取，再由 _convert_copy_datetimes 转换（兼容时区偏移与 infinity）。
+        """
+        header_line = buffer.readline()
+        buffer.seek(0)
+        if not header_line.strip():
+            return
+        import csv
+        columns = next(csv.reader([header_line.decode(py_encoding)]))
+        kinds = {col: DatabaseService._classify_pg_type(column_types.get(col)) for col in columns}
+        datetime_columns = {
+            col: 'with time zone' in (column_types.get(col) or '').lower()
+            for col, kind in kinds.items() if kind == 'datetime'
+        }
+        
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+        except ImportError:
+            pa = None
+        
+        if pa is not None:
+            arrow_types = {
+                'float': pa.float64(),
+                'bool': pa.bool_(),
+                'datetime': pa.string(),
+                'string': pa.string()
+            }
+            reader = pa_csv.open_csv(
+                buffer,
+                read_options=pa_csv.ReadOptions(encoding=py_encoding),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={col: arrow_types[kind] for col, kind in kinds.items() if kind in arrow_types},
+                    true_values=['t'],
+                    false_values=['f'],
+                    strings_can_be_null=True,
+                    quoted_strings_can_be_null=False
+                )
+            )
+            pending = None
+            for record_batch in reader:
+                df_block = record_batch.to_pandas()
+                pending = df_block if pending is None else pd.concat([pending, df_block], ignore_index=True)
+                while len(pending) >= batch_size:
+                    yield DatabaseService._convert_copy_datetimes(
+                        pending.iloc[:batch_size].reset_index(drop=True), datetime_columns
+                    )
+                    pending = pending.iloc[batch_size:].reset_index(drop=True)
+            if pending is not None and not pending.empty:
+                yield DatabaseService._convert_copy_datetimes(pending, datetime_columns)
+            return
+        
+        dtypes = {col: 'float64' for col, kind in kinds.items() if kind == 'float'}
+        dtypes.update({col: object for col, kind in kinds.items() if kind in ('string', 'datetime')})
+        reader = pd.read_csv(
+            buffer,
+            encoding=py_encoding,
+            chunksize=batch_size,
+            dtype=dtypes,
+            true_values=['t'],
+            false_values=['f'],
+            keep_default_na=False,
+            na_values=['']
+        )
+        for df_batch in reader:
+            yield DatabaseService._convert_copy_datetimes(df_batch.reset_index(drop=True), datetime_columns)
+
+    @staticmethod
+    def _iter_offset_batches(engine, full_table_name, field_list, conditions, batch_size, max_rows):
+        """旧的 LIMIT/OFFSET 分页（保留用于兼容）"""
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        base_query = f"SELECT {field_list} FROM {full_table_name} {where_clause}"
+        
+        offset = 0
+        total_yielded = 0
+        while max_rows is None or total_yielded < max_rows:
+            current_limit = DatabaseService._batch_limit(batch_size, max_rows, total_yielded)
+            query = f"{base_query} LIMIT {current_limit} OFFSET {offset}"
+            df_batch = pd.read_sql(query, engine)
+            
+            if df_batch.empty:
+                break
+            
+            rows_fetched = len(df_batch)
+            total_yielded += rows_fetched
+            offset += rows_fetched
+            
+            yield df_batch
+            
+            # 如果读取到的数据少于请求的限制，说明数据已经读完了
+            if rows_fetched < current_limit:
+                break
     
     @staticmethod
     def preview_data(db_config, table_name, fields=None, limit=100):
@@ -479,7 +1150,7 @@ class DatabaseService:
         # 保证try/except结构正确
         try:
             print("测试基本数据库连接...")
-            if not DatabaseService.test_connection(db_config):
+            if not DatabaseService.test_connection(db_config, pooled=True):
                 raise Exception("无法连接到数据库，请检查数据库配置")
             print("基本数据库连接正常")
             
@@ -487,17 +1158,10 @@ class DatabaseService:
             encodings = ['utf8', 'gbk']
             last_error = None
             
-            for enc in encodings:
+            for enc in DatabaseService.encoding_candidates(db_config, encodings):
                 try:
                     print(f"尝试使用编码 {enc} 预览数据...")
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    
-                    # 简化连接参数，避免编码冲突
-                    engine = create_engine(
-                        connection_string, 
-                        pool_pre_ping=True,
-                        echo=False
-                    )
+                    engine = DatabaseService.get_engine(db_config, enc)
                     
                     with engine.connect() as conn:
                         # 设置数据库客户端编码
@@ -557,6 +1221,7 @@ class DatabaseService:
                         
                         # 直接使用pandas读取，不传递encoding参数
                         df = pd.read_sql(query, engine)
+                        DatabaseService.remember_encoding(db_config, enc)
                         
                         if df is not None and len(df) > 0:
                             print(f"成功获取 {len(df)} 行数据")
@@ -591,31 +1256,51 @@ class DatabaseService:
         except Exception as e:
             raise Exception(f"预览数据失败: {str(e)}")
 
+    # 非数值字段抽样统计的样本行数
+    STATISTICS_SAMPLE_SIZE = 10000
+
     @staticmethod
-    def get_data_statistics(db_config, table_name, fields):
-        """获取数据统计信息"""
+    def _empty_statistics():
+        return {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None}
+
+    @staticmethod
+    def _to_float(value):
+        return float(value) if value is not None else None
+
+    @staticmethod
+    def get_data_statistics(db_config, table_name, fields, percentiles=None, sample_size=None):
+        """
+        获取数据统计信息
+
+        数值字段的 count/avg/stddev_samp/min/max（以及可选的 percentile_cont）
+        在数据库端用一条聚合语句计算，只返回聚合结果；
+        非数值字段只在数据库端计数，均值等指标仅在抽样数据可全部转换为数值时给出近似值。
+
+        Args:
+            percentiles: 需要计算的分位数列表，如 [0.25, 0.5, 0.75]
+            sample_size: 非数值字段的抽样行数
+        """
         try:
             print("测试基本数据库连接...")
-            if not DatabaseService.test_connection(db_config):
+            if not DatabaseService.test_connection(db_config, pooled=True):
                 raise Exception("无法连接到数据库，请检查数据库配置")
             print("基本数据库连接正常")
-            
+
+            percentiles = sorted({float(p) for p in (percentiles or [])})
+            for p in percentiles:
+                if p < 0 or p > 1:
+                    raise Exception(f"分位数必须在 0 到 1 之间: {p}")
+            sample_size = int(sample_size or DatabaseService.STATISTICS_SAMPLE_SIZE)
+
             # 只使用支持中文的编码，移除latin-1
             encodings = ['utf8', 'gbk']
             last_error = None
-            
-            for enc in encodings:
+
+            for enc in DatabaseService.encoding_candidates(db_config, encodings):
                 try:
                     print(f"尝试使用编码 {enc} 获取统计信息...")
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    
-                    # 简化连接参数，避免编码冲突
-                    engine = create_engine(
-                        connection_string, 
-                        pool_pre_ping=True,
-                        echo=False
-                    )
-                    
+                    engine = DatabaseService.get_engine(db_config, enc)
+
                     with engine.connect() as conn:
                         # 设置数据库客户端编码
                         try:
@@ -625,10 +1310,10 @@ class DatabaseService:
                                 conn.execute(text("SET client_encoding = 'GBK'"))
                         except Exception as enc_error:
                             print(f"设置编码 {enc} 失败，使用默认编码: {str(enc_error)}")
-                        
+
                         # 使用引号包装表名和字段名
                         quoted_table_name = DatabaseService.quote_identifier(table_name)
-                        
+
                         # 构建完整的表名（包含schema）
                         schema = db_config.get('schema', 'public')
                         if schema and schema != 'public':
@@ -636,66 +1321,126 @@ class DatabaseService:
                             full_table_name = f"{quoted_schema}.{quoted_table_name}"
                         else:
                             full_table_name = quoted_table_name
-                        
-                        quoted_fields = [DatabaseService.quote_identifier(field) for field in fields]
-                        field_list = ', '.join(quoted_fields)
-                        query = f"SELECT {field_list} FROM {full_table_name}"
-                        print(f"执行统计查询: {query}")
-                        
-                        # 直接使用pandas读取，不传递encoding参数
-                        df = pd.read_sql(query, engine)
-                        
-                        if df is not None and len(df) > 0:
-                            print(f"成功获取 {len(df)} 行数据用于统计")
-                            
-                            # 改进中文字符处理
-                            for col in df.select_dtypes(include=['object']).columns:
-                                df[col] = df[col].astype(str).apply(
-                                    lambda x: x if x == 'nan' else (
-                                        x.encode('utf-8', errors='replace').decode('utf-8') 
-                                        if isinstance(x, str) else str(x)
-                                    )
-                                )
-                            
-                            statistics = {}
-                            for field in fields:
-                                if field in df.columns:
-                                    statistics[field] = {
-                                        'count': int(df[field].count()),
-                                        'mean': float(df[field].mean()) if pd.api.types.is_numeric_dtype(df[field]) else None,
-                                        'std': float(df[field].std()) if pd.api.types.is_numeric_dtype(df[field]) else None,
-                                        'min': float(df[field].min()) if pd.api.types.is_numeric_dtype(df[field]) else None,
-                                        'max': float(df[field].max()) if pd.api.types.is_numeric_dtype(df[field]) else None
-                                    }
-                                else:
-                                    statistics[field] = {
-                                        'count': 0,
-                                        'mean': None,
-                                        'std': None,
-                                        'min': None,
-                                        'max': None
-                                    }
-                            return statistics
-                        elif df is not None:
-                            print("查询结果为空，返回空统计信息")
-                            return {field: {'count': 0, 'mean': None, 'std': None, 'min': None, 'max': None} for field in fields}
-                        else:
-                            print(f"编码 {enc} 读取失败，尝试下一个编码")
-                            continue
-                            
+
+                        column_types = DatabaseService._get_column_types(conn, full_table_name)
+                        statistics = DatabaseService._aggregate_statistics(
+                            conn, full_table_name, fields, column_types, percentiles
+                        )
+                        DatabaseService._sample_statistics(
+                            conn, full_table_name, statistics, column_types, sample_size
+                        )
+                        DatabaseService.remember_encoding(db_config, enc)
+                        return statistics
+
                 except Exception as e:
                     print(f"编码 {enc} 获取统计信息失败: {str(e)}")
                     last_error = e
                     continue
-            
+
             if last_error:
                 raise Exception(f"所有编码尝试都失败了，最后错误: {str(last_error)}")
             else:
                 raise Exception("所有编码尝试都失败了，但没有捕获到具体错误")
-                
+
         except Exception as e:
             raise Exception(f"获取统计信息失败: {str(e)}")
-    
+
+    @staticmethod
+    def _aggregate_statistics(conn, full_table_name, fields, column_types, percentiles):
+        """在数据库端一次性计算所有字段的聚合统计"""
+        statistics = {}
+        select_parts = []
+        layout = []  # (字段, 指标, 结果列序号)
+
+        for field in fields:
+            statistics[field] = DatabaseService._empty_statistics()
+            if field not in column_types:
+                continue
+            quoted = DatabaseService.quote_identifier(field)
+            kind = DatabaseService._classify_pg_type(column_types[field])
+
+            layout.append((field, 'count', len(select_parts)))
+            select_parts.append(f"COUNT({quoted})")
+            if kind not in ('int', 'float', 'bool'):
+                continue
+
+            # 布尔字段按 0/1 统计，与 pandas 对布尔列的处理一致
+            expr = f"{quoted}::int" if kind == 'bool' else quoted
+            for metric, aggregate in [
+                ('mean', f"AVG({expr})::float8"),
+                ('std', f"STDDEV_SAMP({expr})::float8"),
+                ('min', f"MIN({expr})::float8"),
+                ('max', f"MAX({expr})::float8")
+            ]:
+                layout.append((field, metric, len(select_parts)))
+                select_parts.append(aggregate)
+            if percentiles:
+                layout.append((field, 'percentiles', len(select_parts)))
+                select_parts.append(
+                    f"percentile_cont(CAST(:percentiles AS float8[])) WITHIN GROUP (ORDER BY {expr})"
+                )
+
+        if not select_parts:
+            return statistics
+
+        query = f"SELECT {', '.join(select_parts)} FROM {full_table_name}"
+        print(f"执行统计聚合查询: {query}")
+        params = {'percentiles': percentiles} if percentiles else {}
+        row = conn.execute(text(query), params).fetchone()
+
+        for field, metric, index in layout:
+            value = row[index]
+            if metric == 'count':
+                statistics[field]['count'] = int(value or 0)
+            elif metric == 'percentiles':
+                values = list(value) if value is not None else [None] * len(percentiles)
+                statistics[field]['percentiles'] = {
+                    str(p): DatabaseService._to_float(v) for p, v in zip(percentiles, values)
+                }
+            else:
+                statistics[field][metric] = DatabaseService._to_float(value)
+        return statistics
+
+    @staticmethod
+    def _sample_statistics(conn, full_table_name, statistics, column_types, sample_size):
+        """
+        非数值字段抽样统计
+
+        文本字段中存放数值的情况较常见，抽样数据能全部转换为数值时给出近似的均值/标准差/极值，
+        并标记 sampled=True；计数始终为数据库端的精确值。
+        """
+        sample_fields = [
+            field for field, stats in statistics.items()
+            if field in column_types
+            and stats['count'] > 0
+            and DatabaseService._classify_pg_type(column_types[field]) == 'string'
+        ]
+        if not sample_fields:
+            return
+
+        field_list = ', '.join(DatabaseService.quote_identifier(field) for field in sample_fields)
+        query = f"SELECT {field_list} FROM {full_table_name} LIMIT {sample_size}"
+        print(f"非数值字段抽样统计: {query}")
+        result = conn.execute(text(query))
+        df = pd.DataFrame(result.fetchall(), columns=sample_fields)
+
+        for field in sample_fields:
+            values = df[field].dropna()
+            if values.empty:
+                continue
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.isna().any():
+                continue
+            std = numeric.std()
+            statistics[field].update({
+                'mean': float(numeric.mean()),
+                'std': float(std) if pd.notna(std) else None,
+                'min': float(numeric.min()),
+                'max': float(numeric.max()),
+                'sampled': True,
+                'sample_rows': int(len(values))
+            })
+
     @staticmethod
     def save_data_source(name, db_type, host, port, database, username, password, status=False):
         data_source = DataSource(
@@ -763,30 +1508,153 @@ class DatabaseService:
         except Exception as e:
             raise Exception(f"加载CNOOC配置失败: {str(e)}")
     
+    # pg_stats 视为新鲜的阈值：自上次 ANALYZE 以来的变更行数占比
+    PG_STATS_MAX_MODIFIED_RATIO = 0.1
+
+    @staticmethod
+    def get_distinct_values(db_config, table_name, field_name, limit=1000, mode='exact', use_cache=True, info=None):
+        """
+        获取指定字段的不同值
+
+        Args:
+            mode: exact - 精确查询（结果按数据源/schema/表/字段缓存，过期后后台刷新）
+                  approximate - 优先使用 pg_stats.most_common_vals，无统计信息时回退精确查询
+                  auto - pg_stats 新鲜且覆盖全部取值时使用，否则走精确查询
+            use_cache: 为 False 时强制重新查询并刷新缓存
+            info: 可选 dict，写入取值来源等信息
+        """
+        info = info if info is not None else {}
+        if mode not in ('exact', 'approximate', 'auto'):
+            raise Exception(f"不支持的取值模式: {mode}")
+
+        if mode in ('approximate', 'auto'):
+            try:
+                approx = DatabaseService._approximate_distinct_values(db_config, table_name, field_name, limit)
+            except Exception as e:
+                print(f"读取 pg_stats 失败，回退精确查询: {str(e)}")
+                approx = None
+            if approx is not None:
+                values, stats_info = approx
+                if mode == 'approximate' or (stats_info['fresh'] and stats_info['complete']):
+                    info.update(stats_info)
+                    info.update({'source': 'pg_stats', 'approximate': not stats_info['complete']})
+                    return values
+
+        def load():
+            return DatabaseService._query_distinct_values(db_config, table_name, field_name, limit)
+
+        schema = db_config.get('schema') or 'public'
+        key = (RefreshingCache.source_key(db_config), schema, table_name, field_name, int(limit))
+
+        if not use_cache:
+            # 强制刷新：重新查询并更新缓存
+            values = load()
+            _distinct_values_cache.put(key, values)
+            info.update({'source': 'query', 'approximate': False, 'cache_hit': False})
+            return values
+
+        values = _distinct_values_cache.get(key, load, info)
+        info.update({'source': 'cache' if info.get('cache_hit') else 'query', 'approximate': False})
+        return values
+
+    @staticmethod
+    def invalidate_distinct_values(db_config=None, table_name=None):
+        """失效不同值缓存（可按数据源、表过滤）"""
+        source_key = RefreshingCache.source_key(db_config) if db_config else None
+        return _distinct_values_cache.invalidate(
+            lambda key: (source_key is None or key[0] == source_key)
+            and (table_name is None or key[2] == table_name)
+        )
+
     @staticmethod
-    def get_distinct_values(db_config, table_name, field_name, limit=1000):
-        """获取指定字段的不同值"""
+    def _approximate_distinct_values(db_config, table_name, field_name, limit=1000):
+        """
+        从 pg_stats 读取字段高频值
+
+        Returns:
+            (values, info) 或 None（没有统计信息时）。
+            info.complete 表示高频值覆盖了全部非空行；
+            info.fresh 表示自上次 ANALYZE 以来变更行数占比低于阈值。
+        """
+        schema = db_config.get('schema') or 'public'
+        enc = DatabaseService.encoding_candidates(db_config, ['utf8', 'gbk'])[0]
+        engine = DatabaseService.get_engine(db_config, enc)
+
+        quoted_table_name = DatabaseService.quote_identifier(table_name)
+        if schema != 'public':
+            full_table_name = f"{DatabaseService.quote_identifier(schema)}.{quoted_table_name}"
+        else:
+            full_table_name = quoted_table_name
+
+        with engine.connect() as conn:
+            stats = conn.execute(text("""
+                SELECT null_frac, n_distinct, most_common_freqs, inherited
+                FROM pg_stats
+                WHERE schemaname = :schema AND tablename = :table AND attname = :field
+                ORDER BY inherited
+                LIMIT 1
+            """), {'schema': schema, 'table': table_name, 'field': field_name}).fetchone()
+            if stats is None:
+                return None
+
+            activity = conn.execute(text("""
+                SELECT n_live_tup, n_mod_since_analyze, COALESCE(last_analyze, last_autoanalyze)
+                FROM pg_stat_user_tables
+                WHERE relid = CAST(:rel AS regclass)
+            """), {'rel': full_table_name}).fetchone()
+
+            column_type = DatabaseService._get_column_types(conn, full_table_name).get(field_name)
+            if not column_type:
+                return None
+
+            # most_common_vals 为 anyarray，转回字段类型后在数据库端排序
+            rows = conn.execute(text(f"""
+                SELECT v
+                FROM pg_stats s, unnest(CAST(s.most_common_vals::text AS {column_type}[])) AS v
+                WHERE s.schemaname = :schema AND s.tablename = :table AND s.attname = :field
+                AND s.inherited = :inherited
+                ORDER BY v
+                LIMIT :limit
+            """), {
+                'schema': schema, 'table': table_name, 'field': field_name,
+                'inherited': stats[3], 'limit': int(limit)
+            }).fetchall()
+
+        values = [row[0] for row in rows]
+
+        null_frac = float(stats[0] or 0)
+        n_distinct = float(stats[1] or 0)
+        covered = null_frac + sum(float(f) for f in (stats[2] or []))
+        n_live = int(activity[0] or 0) if activity else 0
+        modified = int(activity[1] or 0) if activity else 0
+        analyzed = activity is not None and activity[2] is not None
+        fresh = analyzed and modified <= max(n_live, 1) * DatabaseService.PG_STATS_MAX_MODIFIED_RATIO
+
+        return values, {
+            'n_distinct': n_distinct if n_distinct >= 0 else int(round(-n_distinct * n_live)),
+            'complete': covered >= 0.999 and len(values) < limit,
+            'fresh': fresh,
+            'last_analyze': str(activity[2]) if analyzed else None
+        }
+
+    @staticmethod
+    def _query_distinct_values(db_config, table_name, field_name, limit=1000):
+        """精确查询字段不同值（SELECT DISTINCT）"""
         try:
             print(f"获取字段 {field_name} 在表 {table_name} 中的不同值...")
             
             # 测试数据库连接
-            if not DatabaseService.test_connection(db_config):
+            if not DatabaseService.test_connection(db_config, pooled=True):
                 raise Exception("无法连接到数据库，请检查数据库配置")
             
             # 支持中文的编码
             encodings = ['utf8', 'gbk']
             last_error = None
             
-            for enc in encodings:
+            for enc in DatabaseService.encoding_candidates(db_config, encodings):
                 try:
                     print(f"尝试使用编码 {enc} 获取不同值...")
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    
-                    engine = create_engine(
-                        connection_string, 
-                        pool_pre_ping=True,
-                        echo=False
-                    )
+                    engine = DatabaseService.get_engine(db_config, enc)
                     
                     with engine.connect() as conn:
                         # 设置数据库客户端编码
@@ -820,6 +1688,7 @@ class DatabaseService:
                         distinct_values = [row[0] for row in result.fetchall()]
                         
                         print(f"成功获取 {len(distinct_values)} 个不同值，使用编码: {enc}")
+                        DatabaseService.remember_encoding(db_config, enc)
                         return distinct_values
                         
                 except Exception as e:
@@ -841,23 +1710,17 @@ class DatabaseService:
             print(f"预览数据: 表={table_name}, 字段={fields}, 分公司字段={company_field}, 分公司值={company_value}")
             
             # 测试数据库连接
-            if not DatabaseService.test_connection(db_config):
+            if not DatabaseService.test_connection(db_config, pooled=True):
                 raise Exception("无法连接到数据库，请检查数据库配置")
             
             # 支持中文的编码
             encodings = ['utf8', 'gbk']
             last_error = None
             
-            for enc in encodings:
+            for enc in DatabaseService.encoding_candidates(db_config, encodings):
                 try:
                     print(f"尝试使用编码 {enc} 预览数据...")
-                    connection_string = DatabaseService.get_connection_string(db_config, enc)
-                    
-                    engine = create_engine(
-                        connection_string, 
-                        pool_pre_ping=True,
-                        echo=False
-                    )
+                    engine = DatabaseService.get_engine(db_config, enc)
                     
                     with engine.connect() as conn:
                         # 设置数据库客户端编码
@@ -907,6 +1770,7 @@ class DatabaseService:
                         df = pd.read_sql(query, conn)
                         
                         print(f"成功获取 {len(df)} 行数据，使用编码: {enc}")
+                        DatabaseService.remember_encoding(db_config, enc)
                         return df.to_dict('records')
                         
                 except Exception as e:
@@ -951,8 +1815,7 @@ class DatabaseService:
             print(f"🔒 查询TAG数据: {tag_field_name}={tag_code}, limit={limit}")
             
             # 获取数据库连接
-            connection_string = DatabaseService.get_connection_string(db_config, 'utf8')
-            engine = DatabaseService.create_engine(connection_string)
+            engine = DatabaseService.get_engine(db_config, 'utf8')
             
             # 构建表名
             schema = db_config.get('schema', 'public')
@@ -1214,8 +2077,7 @@ class DatabaseService:
             print(f"🔒 查询井参数序列: well_id={well_id}, parameter={parameter}, limit={limit}")
             
             # 获取数据库连接
-            connection_string = DatabaseService.get_connection_string(db_config, 'utf8')
-            engine = DatabaseService.create_engine(connection_string)
+            engine = DatabaseService.get_engine(db_config, 'utf8')
             
             # 构建表名
             schema = db_config.get('schema', 'public')
@@ -1240,30 +2102,21 @@ class DatabaseService:
                 time_field_candidates = ['date_time_index', 'datetime', 'timestamp', 'time', 'date', 'update_date']
                 time_field = None
                 
-                # 查询表结构找时间字段
-                with engine.connect() as conn:
-                    # 先检查表中有哪些字段
-                    inspect_query = f"""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = '{table_name}'
-                        AND table_schema = '{schema}'
-                    """
-                    df_columns = pd.read_sql(text(inspect_query), conn)
-                    available_columns = df_columns['column_name'].tolist()
-                    
-                    # 找到第一个匹配的时间字段
-                    for candidate in time_field_candidates:
-                        if candidate in available_columns:
-                            time_field = candidate
+                # 从元数据目录缓存中获取表字段
+                available_columns = [field['name'] for field in DatabaseService.get_table_fields(db_config, table_name)]
+                
+                # 找到第一个匹配的时间字段
+                for candidate in time_field_candidates:
+                    if candidate in available_columns:
+                        time_field = candidate
+                        break
+                
+                if not time_field:
+                    # 如果找不到时间字段，使用第一个看起来像日期的字段
+                    for col in available_columns:
+                        if any(keyword in col.lower() for keyword in ['date', 'time']):
+                            time_field = col
                             break
-                    
-                    if not time_field:
-                        # 如果找不到时间字段，使用第一个看起来像日期的字段
-                        for col in available_columns:
-                            if any(keyword in col.lower() for keyword in ['date', 'time']):
-                                time_field = col
-                                break
                 
                 if not time_field:
                     time_field = 'date_time_index'  # 默认字段名
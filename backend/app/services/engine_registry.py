@@ -0,0 +1,317 @@
+"""
+数据源连接引擎注册表
+
+进程级缓存：按 (数据源ID/连接标识, 编码) 复用 SQLAlchemy 引擎（连接串与 schema 无关，同库不同 schema 共用连接池），
+每个引擎使用有界连接池，避免每次请求都重新进行 TCP + 认证握手；
+同时记住每个数据源可用的客户端编码，避免每次请求重复试探。
+"""
+import hashlib
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+
+class EngineRegistry:
+    """业务数据源引擎注册表（线程安全）"""
+
+    # 连接池参数：保持较小规模，防止压垮生产库
+    POOL_SIZE = 2
+    MAX_OVERFLOW = 3
+    POOL_TIMEOUT = 30
+    POOL_RECYCLE = 1800  # 秒，定期回收长连接
+
+    # 引擎空闲多久后被淘汰（秒）
+    IDLE_TIMEOUT = 600
+    # 最多缓存的引擎数量，超过时淘汰最久未使用的
+    MAX_ENGINES = 32
+
+    _engines = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def normalize_encoding(encoding):
+        """将常用编码名称映射为 PostgreSQL 标准名称"""
+        if not encoding:
+            return 'UTF8'
+        lowered = encoding.lower()
+        if lowered in ['utf-8', 'utf8']:
+            return 'UTF8'
+        if lowered in ['gbk', 'gb18030']:
+            return 'GBK'
+        if lowered in ['latin1', 'latin-1']:
+            return 'LATIN1'
+        return encoding.upper()
+
+    @staticmethod
+    def connection_identity(db_config):
+        """连接标识：主机/端口/库名/用户名"""
+        return (
+            str(db_config.get('host', '')),
+            str(db_config.get('port', '')),
+            str(db_config.get('database', '')),
+            str(db_config.get('username', ''))
+        )
+
+    @staticmethod
+    def make_key(db_config, encoding='utf8'):
+        """
+        生成注册表键
+
+        包含密码摘要，保证修改密码后不会复用旧凭据建立的连接。
+        不包含 schema：连接串不设置 search_path，查询均使用 schema 限定的表名。
+        """
+        source_id = db_config.get('id') or db_config.get('data_source_id')
+        password_digest = hashlib.sha1(str(db_config.get('password', '')).encode('utf-8')).hexdigest()
+        return (
+            str(source_id) if source_id else None,
+            EngineRegistry.connection_identity(db_config),
+            password_digest,
+            EngineRegistry.normalize_encoding(encoding)
+        )
+
+    @classmethod
+    def get_engine(cls, db_config, encoding='utf8', schema=None):
+        """
+        获取（或创建）指定数据源/编码对应的池化引擎
+
+        schema 参数保留以兼容调用方，不参与引擎复用（同一数据库的各 schema 共用连接池）。
+        """
+        from app.services.database_service import DatabaseService
+
+        key = cls.make_key(db_config, encoding)
+        now = time.time()
+
+        with cls._lock:
+            cls._evict_idle(now)
+
+            entry = cls._engines.get(key)
+            if entry is not None:
+                entry['last_used'] = now
+                return entry['engine']
+
+            connection_string = DatabaseService.get_connection_string(db_config, encoding)
+            engine = create_engine(
+                connection_string,
+                poolclass=QueuePool,
+                pool_size=cls.POOL_SIZE,
+                max_overflow=cls.MAX_OVERFLOW,
+                pool_timeout=cls.POOL_TIMEOUT,
+                pool_recycle=cls.POOL_RECYCLE,
+                pool_pre_ping=True,  # 借出连接前做健康检查，自动剔除失效连接
+                echo=False
+            )
+            cls._engines[key] = {
+                'engine': engine,
+                'created_at': now,
+                'last_used': now
+            }
+            cls._evict_overflow()
+            print(f"创建池化引擎: 数据源={key[0] or key[1][0]}, 库={key[1][2]}, 编码={key[3]}")
+            return engine
+
+    @classmethod
+    def create_dedicated_engine(cls, engine, size):
+        """
+        为并行分区读取创建独立的短期引擎（连接数固定为 size，不占用共享连接池）
+
+        调用方负责在读取结束后 dispose()。
+        """
+        return create_engine(
+            engine.url,
+            poolclass=QueuePool,
+            pool_size=size,
+            max_overflow=0,
+            pool_timeout=cls.POOL_TIMEOUT,
+            pool_pre_ping=True,
+            echo=False
+        )
+
+    @classmethod
+    def _evict_idle(cls, now):
+        """淘汰长时间未使用的引擎（调用方持有锁）"""
+        expired = [k for k, v in cls._engines.items() if now - v['last_used'] > cls.IDLE_TIMEOUT]
+        for key in expired:
+            cls._dispose(key)
+
+    @classmethod
+    def _evict_overflow(cls):
+        """超过容量时按LRU淘汰（调用方持有锁）"""
+        if len(cls._engines) <= cls.MAX_ENGINES:
+            return
+        ordered = sorted(cls._engines.items(), key=lambda item: item[1]['last_used'])
+        for key, _ in ordered[:len(cls._engines) - cls.MAX_ENGINES]:
+            cls._dispose(key)
+
+    @classmethod
+    def _dispose(cls, key):
+        entry = cls._engines.pop(key, None)
+        if entry is None:
+            return
+        try:
+            entry['engine'].dispose()
+        except Exception as e:
+            print(f"释放引擎失败: {str(e)}")
+
+    @classmethod
+    def invalidate(cls, source_id=None, identities=None):
+        """
+        失效指定数据源的所有引擎
+
+        Args:
+            source_id: 数据源ID
+            identities: 连接标识列表（host, port, database, username），
+                        用于匹配未携带ID的db_config创建的引擎
+        """
+        identities = set(identities or [])
+        with cls._lock:
+            targets = [
+                key for key in cls._engines
+                if (source_id is not None and key[0] == str(source_id)) or key[1] in identities
+            ]
+            for key in targets:
+                cls._dispose(key)
+        if targets:
+            print(f"已失效数据源 {source_id} 的 {len(targets)} 个池化引擎")
+        return len(targets)
+
+    @classmethod
+    def clear(cls):
+        """释放全部引擎"""
+        with cls._lock:
+            for key in list(cls._engines.keys()):
+                cls._dispose(key)
+
+    @classmethod
+    def stats(cls):
+        """注册表状态（用于排查连接数）"""
+        with cls._lock:
+            return [
+                {
+                    'data_source_id': key[0],
+                    'host': key[1][0],
+                    'database': key[1][2],
+                    'encoding': key[3],
+                    'pool_status': entry['engine'].pool.status(),
+                    'idle_seconds': round(time.time() - entry['last_used'], 1)
+                }
+                for key, entry in cls._engines.items()
+            ]
+
+
+class EncodingCache:
+    """
+    数据源客户端编码缓存
+
+    按 (数据源, schema) 记住上一次成功读取所用的编码，后续请求优先使用该编码，
+    只有真正解码失败时才会回退遍历候选编码列表。
+    """
+
+    _encodings = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def make_key(db_config, schema=None):
+        source_id = db_config.get('id') or db_config.get('data_source_id')
+        if schema is None:
+            schema = db_config.get('schema') or 'public'
+        return (
+            str(source_id) if source_id else None,
+            EngineRegistry.connection_identity(db_config),
+            schema
+        )
+
+    @classmethod
+    def get(cls, db_config, schema=None):
+        """获取已确认可用的编码，未知时返回None"""
+        with cls._lock:
+            return cls._encodings.get(cls.make_key(db_config, schema))
+
+    @classmethod
+    def remember(cls, db_config, encoding, schema=None):
+        """记录可用编码"""
+        key = cls.make_key(db_config, schema)
+        with cls._lock:
+            previous = cls._encodings.get(key)
+            cls._encodings[key] = encoding
+        if previous != encoding:
+            print(f"记录数据源编码: 数据源={key[0] or key[1][0]}, schema={key[2]}, 编码={encoding}")
+
+    @classmethod
+    def forget(cls, db_config, schema=None):
+        """清除编码记录（解码失败时调用）"""
+        with cls._lock:
+            cls._encodings.pop(cls.make_key(db_config, schema), None)
+
+    @classmethod
+    def candidates(cls, db_config, encodings, schema=None):
+        """返回候选编码列表，已知可用的编码排在最前"""
+        known = cls.get(db_config, schema)
+        if known and known in encodings:
+            return [known] + [enc for enc in encodings if enc != known]
+        return list(encodings)
+
+    @classmethod
+    def invalidate(cls, source_id=None, identities=None):
+        """失效指定数据源的编码记录"""
+        identities = set(identities or [])
+        with cls._lock:
+            targets = [
+                key for key in cls._encodings
+                if (source_id is not None and key[0] == str(source_id)) or key[1] in identities
+            ]
+            for key in targets:
+                cls._encodings.pop(key, None)
+
+
+# 数据源变更时需要一并失效的其他缓存（回调签名: hook(source_id, identities)）
+_source_invalidation_hooks = []
+
+
+def add_source_invalidation_hook(hook):
+    """注册数据源更新/删除时的缓存失效回调"""
+    if hook not in _source_invalidation_hooks:
+        _source_invalidation_hooks.append(hook)
+
+
+def _invalidate_source(source_id, identities):
+    EngineRegistry.invalidate(source_id, identities)
+    EncodingCache.invalidate(source_id, identities)
+    for hook in _source_invalidation_hooks:
+        try:
+            hook(source_id, identities)
+        except Exception as e:
+            print(f"数据源缓存失效回调执行失败: {str(e)}")
+
+
+def _source_identities(target):
+    """收集数据源变更前后的连接标识"""
+    from sqlalchemy import inspect as sa_inspect
+
+    identities = {EngineRegistry.connection_identity({
+        'host': target.host,
+        'port': target.port,
+        'database': target.database,
+        'username': target.username
+    })}
+
+    state = sa_inspect(target)
+    old_values = {}
+    for attr in ['host', 'port', 'database', 'username']:
+        history = state.attrs[attr].history
+        old_values[attr] = history.deleted[0] if history.deleted else getattr(target, attr)
+    identities.add(EngineRegistry.connection_identity(old_values))
+    return identities
+
+
+def register_data_source_listeners(model):
+    """数据源更新/删除时自动失效相关引擎"""
+
+    @event.listens_for(model, 'after_update')
+    def _on_data_source_update(mapper, connection, target):
+        _invalidate_source(target.id, _source_identities(target))
+
+    @event.listens_for(model, 'after_delete')
+    def _on_data_source_delete(mapper, connection, target):
+        _invalidate_source(target.id, _source_identities(target))
@@ -0,0 +1,382 @@
+"""
+质量检测后台任务
+
+检测请求提交后立即返回任务ID，由本地线程池执行；
+任务状态、阶段进度（read / validate / report / persist）与吞吐量（行/秒）持久化在 quality_jobs 表，
+检测结果仍写入 QualityResult。
+执行进程（owner）定期写入心跳，只有心跳超时的任务才会被其他进程判定为中断。
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models.quality_job import QualityJob
+from app.services.quality_service import QualityService
+
+
+class QualityJobCancelled(Exception):
+    """任务已被取消"""
+
+
+class QualityJobService:
+    """质量检测任务服务"""
+
+    # 后台并发执行的任务数
+    MAX_WORKERS = 2
+    # 进度写库的最小间隔（秒）
+    PROGRESS_INTERVAL = 1.0
+    # 各阶段在单表进度中的起止百分比
+    PHASE_RANGES = {
+        'read': (0, 40),
+        'validate': (40, 80),
+        'report': (80, 90),
+        'persist': (90, 100)
+    }
+
+    # 执行进程写入心跳的间隔（秒）
+    HEARTBEAT_INTERVAL = 30
+    # 心跳超过该时间未更新的未结束任务视为中断（秒）
+    HEARTBEAT_TIMEOUT = 120
+    # 运行中任务读取取消标记的最小间隔（秒）；进入新阶段时总会读取一次
+    CANCEL_POLL_INTERVAL = 2.0
+
+    _executor = None
+    _futures = {}
+    _cancelled = set()
+    _lock = threading.Lock()
+    _heartbeat_thread = None
+    _last_recovery = 0.0
+
+    @staticmethod
+    def owner_id():
+        """当前进程标识（主机名:pid）"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _get_executor():
+        with QualityJobService._lock:
+            if QualityJobService._executor is None:
+                QualityJobService._executor = ThreadPoolExecutor(
+                    max_workers=QualityJobService.MAX_WORKERS, thread_name_prefix='quality-job'
+                )
+            return QualityJobService._executor
+
+    @staticmethod
+    def _recover_interrupted():
+        """
+        把执行进程已不存在的未结束任务标记为失败
+
+        只处理心跳超时（HEARTBEAT_TIMEOUT）的任务，或属于本进程但已不在执行队列中的任务
+        （如进程号被复用）；其他进程仍在执行的任务会持续更新心跳，不受影响。
+        每隔 HEARTBEAT_INTERVAL 最多检查一次。
+        """
+        now = time.time()
+        with QualityJobService._lock:
+            if now - QualityJobService._last_recovery < QualityJobService.HEARTBEAT_INTERVAL:
+                return
+            QualityJobService._last_recovery = now
+            local_jobs = set(QualityJobService._futures)
+
+        owner = QualityJobService.owner_id()
+        cutoff = datetime.utcnow() - timedelta(seconds=QualityJobService.HEARTBEAT_TIMEOUT)
+        candidates = QualityJob.query.filter(QualityJob.status.in_(['pending', 'running'])).all()
+        interrupted = []
+        for job in candidates:
+            last_seen = job.heartbeat_at or job.started_at or job.created_at
+            stale = last_seen is None or last_seen < cutoff
+            orphaned = job.owner == owner and job.id not in local_jobs
+            if stale or orphaned:
+                job.status = 'failed'
+                job.error = '执行进程已退出，任务已中断'
+                job.finished_at = datetime.utcnow()
+                interrupted.append(job)
+        if interrupted:
+            db.session.commit()
+            print(f"质量检测任务：{len(interrupted)} 个未完成任务已标记为中断")
+
+    @staticmethod
+    def _ensure_heartbeat(app):
+        """启动心跳线程：定期刷新本进程持有的任务的 heartbeat_at"""
+        with QualityJobService._lock:
+            if QualityJobService._heartbeat_thread is not None:
+                return
+            thread = threading.Thread(
+                target=QualityJobService._heartbeat_loop, args=(app,), name='quality-job-heartbeat', daemon=True
+            )
+            QualityJobService._heartbeat_thread = thread
+        thread.start()
+
+    @staticmethod
+    def _heartbeat_loop(app):
+        while True:
+            time.sleep(QualityJobService.HEARTBEAT_INTERVAL)
+            with QualityJobService._lock:
+                job_ids = list(QualityJobService._futures)
+            if not job_ids:
+                continue
+            try:
+                with app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(
+                            QualityJob.__table__.update()
+                            .where(QualityJob.__table__.c.id.in_(job_ids))
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+            except Exception as e:
+                print(f"质量检测任务心跳写入失败: {str(e)}")
+
+    @staticmethod
+    def submit(job_type, params, created_by=''):
+        """
+        提交检测任务
+
+        Args:
+            job_type: check（单表）/ batch（批量）
+            params: 与 QualityService.run_quality_check / batch_quality_check 对应的参数
+
+        Returns:
+            dict: 任务信息
+        """
+        if job_type not in ('check', 'batch'):
+            raise ValueError(f"不支持的任务类型: {job_type}")
+
+        QualityJobService._recover_interrupted()
+
+        # 持久化的参数中不保存明文密码；执行时使用内存中的原始参数
+        stored_params = dict(params)
+        if stored_params.get('db_config'):
+            stored_params['db_config'] = dict(stored_params['db_config'], password='******')
+
+        job = QualityJob(
+            id=uuid.uuid4().hex,
+            job_type=job_type,
+            status='pending',
+            progress=0,
+            rows_processed=0,
+            owner=QualityJobService.owner_id(),
+            heartbeat_at=datetime.utcnow(),
+            created_by=created_by
+        )
+        job.set_params(stored_params)
+        with QualityJobService._lock:
+            # 先占位，避免本进程的中断检查把刚提交的任务误判为孤立任务
+            QualityJobService._futures[job.id] = None
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except Exception:
+            with QualityJobService._lock:
+                QualityJobService._futures.pop(job.id, None)
+            raise
+
+        app = current_app._get_current_object()
+        QualityJobService._ensure_heartbeat(app)
+        future = QualityJobService._get_executor().submit(
+            QualityJobService._run_job, app, job.id, job_type, dict(params)
+        )
+        with QualityJobService._lock:
+            # 任务可能已执行完毕并移除了占位
+            if job.id in QualityJobService._futures:
+                QualityJobService._futures[job.id] = future
+        print(f"质量检测任务已提交: {job.id} ({job_type})")
+        return job.to_dict()
+
+    @staticmethod
+    def get_job(job_id):
+        job = QualityJob.query.get(job_id)
+        if not job:
+            raise ValueError("任务不存在")
+        return job.to_dict()
+
+    @staticmethod
+    def list_jobs(status=None, limit=50):
+        QualityJobService._recover_interrupted()
+        query = QualityJob.query
+        if status:
+            query = query.filter_by(status=status)
+        return [job.to_dict() for job in query.order_by(QualityJob.created_at.desc()).limit(limit).all()]
+
+    @staticmethod
+    def cancel(job_id):
+        """取消任务：排队中的任务直接取消，运行中的任务在下一次进度回调时中止"""
+        job = QualityJob.query.get(job_id)
+        if not job:
+            raise ValueError("任务不存在")
+        if job.status not in ('pending', 'running'):
+            return job.to_dict()
+
+        with QualityJobService._lock:
+            QualityJobService._cancelled.add(job_id)
+            future = QualityJobService._futures.get(job_id)
+
+        job.cancel_requested = True
+        if future is not None and future.cancel():
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return job.to_dict()
+
+    @staticmethod
+    def _cancel_requested(job_id):
+        """是否已请求取消：以数据库中的 cancel_requested 为准（取消请求可能由其他进程处理）"""
+        if job_id in QualityJobService._cancelled:
+            return True
+        table = QualityJob.__table__
+        with db.engine.connect() as conn:
+            requested = conn.execute(select(table.c.cancel_requested).where(table.c.id == job_id)).scalar()
+        if requested:
+            with QualityJobService._lock:
+                QualityJobService._cancelled.add(job_id)
+        return bool(requested)
+
+    @staticmethod
+    def _update_job(job_id, **values):
+        """在独立事务中更新任务状态，不影响检测流程自身的会话"""
+        with db.engine.begin() as conn:
+            conn.execute(QualityJob.__table__.update().where(QualityJob.__table__.c.id == job_id).values(**values))
+
+    @staticmethod
+    def _make_progress(job_id, started, table_count=1):
+        """
+        构造进度回调：按阶段换算百分比，按间隔写库；
+        每进入新阶段或每隔 CANCEL_POLL_INTERVAL 读取一次取消标记，已取消时抛出异常中止检测
+
+        批量任务的各表并发执行，按表分别记录阶段与行数后汇总。
+
+        Returns:
+            tuple: (进度回调, 单表完成回调 table_done(table_index, result))
+        """
+        lock = threading.Lock()
+        state = {'last_write': 0.0, 'last_cancel_poll': 0.0, 'phases': set(), 'polled_phases': set(), 'tables': {}, 'results': {}}
+
+        def progress(phase, rows=None, table=None, table_index=None, **kwargs):
+            key = table_index if table_index is not None else 0
+            with lock:
+                now = time.time()
+                poll = (
+                    now - state['last_cancel_poll'] >= QualityJobService.CANCEL_POLL_INTERVAL
+                    or (key, phase) not in state['polled_phases']
+                )
+                if poll:
+                    state['last_cancel_poll'] = now
+                    state['polled_phases'].add((key, phase))
+            if job_id in QualityJobService._cancelled or (poll and QualityJobService._cancel_requested(job_id)):
+                raise QualityJobCancelled("任务已取消")
+
+            with lock:
+                previous = state['tables'].get(key, {})
+                state['tables'][key] = {
+                    'percent': QualityJobService.PHASE_RANGES.get(phase, (0, 100))[0],
+                    'rows': rows if rows is not None else previous.get('rows', 0)
+                }
+                percent = sum(item['percent'] for item in state['tables'].values()) / table_count
+                rows_total = sum(item['rows'] for item in state['tables'].values())
+
+                now = time.time()
+                phase_key = (key, phase)
+                if now - state['last_write'] < QualityJobService.PROGRESS_INTERVAL and phase_key in state['phases']:
+                    return
+                state['last_write'] = now
+                state['phases'].add(phase_key)
+
+            elapsed = max(now - started, 1e-6)
+            values = {
+                'phase': phase,
+                'progress': percent,
+                'rows_processed': rows_total,
+                'rows_per_second': rows_total / elapsed,
+                'heartbeat_at': datetime.utcnow()
+            }
+            if table is not None:
+                values['current_table'] = table
+            QualityJobService._update_job(job_id, **values)
+
+        def table_done(table_index, result):
+            """批量任务中某张表完成：计为 100%，结果立即写入任务"""
+            with lock:
+                state['tables'][table_index] = {
+                    'percent': 100,
+                    'rows': result.get('total_records', state['tables'].get(table_index, {}).get('rows', 0))
+                }
+                state['results'][table_index] = result
+                done = [state['results'][i] for i in sorted(state['results'])]
+                percent = sum(item['percent'] for item in state['tables'].values()) / table_count
+            QualityJobService._update_job(
+                job_id,
+                progress=percent,
+                result_ids=json.dumps([item['id'] for item in done if item.get('id')]),
+                result_data=json.dumps(done, ensure_ascii=False, default=str)
+            )
+
+        return progress, table_done
+
+    @staticmethod
+    def _run_job(app, job_id, job_type, params):
+        """在工作线程中执行任务"""
+        with app.app_context():
+            if QualityJobService._cancel_requested(job_id):
+                QualityJobService._finish(job_id, 'cancelled')
+                return
+
+            started = time.time()
+            QualityJobService._update_job(
+                job_id, status='running', phase='read', started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow()
+            )
+            table_count = max(len(params.get('tables') or []), 1) if job_type == 'batch' else 1
+            progress, table_done = QualityJobService._make_progress(job_id, started, table_count)
+
+            try:
+                if job_type == 'batch':
+                    results = QualityService.batch_quality_check(progress=progress, on_result=table_done, **params)
+                    result_ids = [item['id'] for item in results if item.get('id')]
+                    summary = results
+                else:
+                    result = QualityService.run_quality_check(progress=progress, **params)
+                    result_ids = [result['id']]
+                    summary = result
+            except Exception as e:
+                db.session.rollback()
+                if QualityJobService._cancel_requested(job_id):
+                    QualityJobService._finish(job_id, 'cancelled')
+                else:
+                    print(f"质量检测任务 {job_id} 失败: {str(e)}")
+                    QualityJobService._finish(job_id, 'failed', error=str(e))
+                return
+            finally:
+                db.session.remove()
+
+            if job_type == 'batch' and QualityJobService._cancel_requested(job_id):
+                # 批量任务取消后，剩余表会逐个失败返回；已完成的结果保留
+                status = 'cancelled'
+            else:
+                status = 'completed'
+
+            elapsed = max(time.time() - started, 1e-6)
+            rows = sum(item.get('total_records', 0) for item in (summary if isinstance(summary, list) else [summary]))
+            QualityJobService._finish(
+                job_id, status,
+                progress=100,
+                rows_processed=rows,
+                rows_per_second=rows / elapsed,
+                result_ids=json.dumps(result_ids),
+                result_data=json.dumps(summary, ensure_ascii=False, default=str)
+            )
+            print(f"质量检测任务 {job_id} 完成：{rows} 行，用时 {elapsed:.2f}s")
+
+    @staticmethod
+    def _finish(job_id, status, **values):
+        try:
+            QualityJobService._update_job(job_id, status=status, finished_at=datetime.utcnow(), **values)
+        finally:
+            with QualityJobService._lock:
+                QualityJobService._futures.pop(job_id, None)
+                QualityJobService._cancelled.discard(job_id)
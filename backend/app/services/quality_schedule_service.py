@@ -0,0 +1,456 @@
+"""
+定时质量检测调度
+
+后台线程按 cron 表达式触发 QualityService.run_quality_check：
+- 触发时间在允许的时间窗口（如夜间低峰）之外时顺延到窗口开始，并随机延后 jitter_seconds 以错开同时触发的计划
+- 同一数据源同时执行的计划数不超过 MAX_CONCURRENCY_PER_SOURCE，超出的计划留到下一轮
+- 开启 skip_if_unchanged 时先做新鲜度探测，源表自上次执行后没有变化则跳过本次
+- 每次触发通过条件更新 next_run_at 认领，多进程部署时同一次触发只执行一次
+- 执行中的计划记录执行进程（run_owner）并定期写入心跳，只有心跳超时的执行才会被其他进程判定为中断
+
+调度器不随 create_app 启动（CLI 命令、重载器父进程也会创建应用），
+由提供服务的入口在建表之后调用 QualityScheduleService.start(app)：
+开发环境见 app.py，WSGI 部署在工作进程初始化时（如 gunicorn 的 post_fork）调用。
+"""
+import json
+import os
+import random
+import re
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.data_source import DataSource
+from app.models.quality_schedule import QualitySchedule
+from app.models.rule_model import RuleLibrary
+from app.services.database_service import DatabaseService
+from app.services.quality_service import QualityService
+from app.services.snapshot_cache import SnapshotCache
+from app.services.watermark_service import WatermarkService
+from app.utils.cron import next_run
+
+
+class QualityScheduleService:
+    """定时质量检测服务"""
+
+    # 调度线程检查到期计划的间隔（秒）
+    TICK_SECONDS = 30
+    # 执行定时检测的线程数
+    MAX_WORKERS = 4
+    # 执行中的计划心跳超过该时间未更新视为中断（秒），需大于 TICK_SECONDS
+    HEARTBEAT_TIMEOUT = 120
+    # 同一数据源同时执行的定时检测数
+    MAX_CONCURRENCY_PER_SOURCE = 2
+    # 允许在计划中配置的检测选项
+    CHECK_OPTIONS = (
+        'streaming', 'chunk_size', 'pushdown', 'use_snapshot', 'report_format', 'report_failed_only',
+        'incremental', 'watermark_column', 'full_recheck_days'
+    )
+
+    _thread = None
+    _stop_event = threading.Event()
+    _executor = None
+    _source_slots = {}
+    _running = set()
+    _lock = threading.Lock()
+
+    # ---------------------------------------------------------------- 调度线程
+
+    @staticmethod
+    def start(app):
+        """启动调度线程（设置环境变量 QUALITY_SCHEDULER_ENABLED=0 可关闭）"""
+        if os.environ.get('QUALITY_SCHEDULER_ENABLED', '1') == '0' or app.config.get('TESTING'):
+            return
+        with QualityScheduleService._lock:
+            if QualityScheduleService._thread is not None:
+                return
+            QualityScheduleService._stop_event.clear()
+            QualityScheduleService._executor = ThreadPoolExecutor(
+                max_workers=QualityScheduleService.MAX_WORKERS, thread_name_prefix='quality-schedule'
+            )
+            thread = threading.Thread(
+                target=QualityScheduleService._loop, args=(app,), name='quality-scheduler', daemon=True
+            )
+            QualityScheduleService._thread = thread
+        thread.start()
+        print("定时质量检测调度器已启动")
+
+    @staticmethod
+    def owner_id():
+        """当前进程标识（主机名:pid）"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _heartbeat():
+        """刷新本进程正在执行的计划的 run_heartbeat_at"""
+        with QualityScheduleService._lock:
+            schedule_ids = list(QualityScheduleService._running)
+        if not schedule_ids:
+            return
+        QualitySchedule.query.filter(
+            QualitySchedule.id.in_(schedule_ids),
+            QualitySchedule.run_owner == QualityScheduleService.owner_id()
+        ).update({'run_heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def _reset_interrupted():
+        """
+        把执行进程已不存在的 running 计划标记为失败
+
+        只处理心跳超时（HEARTBEAT_TIMEOUT）的执行，或属于本进程但已不在执行中的执行（如进程号被复用）；
+        其他进程仍在执行的计划每轮调度都会刷新心跳，不受影响。
+        """
+        owner = QualityScheduleService.owner_id()
+        cutoff = datetime.utcnow() - timedelta(seconds=QualityScheduleService.HEARTBEAT_TIMEOUT)
+        with QualityScheduleService._lock:
+            local_running = set(QualityScheduleService._running)
+
+        count = 0
+        for schedule in QualitySchedule.query.filter_by(last_status='running').all():
+            stale = schedule.run_heartbeat_at is None or schedule.run_heartbeat_at < cutoff
+            orphaned = schedule.run_owner == owner and schedule.id not in local_running
+            if not (stale or orphaned):
+                continue
+            # 条件更新：期间被重新认领（run_owner / 心跳已变化）的计划不处理
+            count += QualitySchedule.query.filter_by(
+                id=schedule.id,
+                last_status='running',
+                run_owner=schedule.run_owner,
+                run_heartbeat_at=schedule.run_heartbeat_at
+            ).update({
+                'last_status': 'failed',
+                'last_error': '执行进程已退出，执行已中断'
+            }, synchronize_session=False)
+        db.session.commit()
+        if count:
+            print(f"定时质量检测：{count} 个计划的执行因进程退出中断，已标记为失败")
+
+    @staticmethod
+    def stop():
+        QualityScheduleService._stop_event.set()
+        with QualityScheduleService._lock:
+            thread, QualityScheduleService._thread = QualityScheduleService._thread, None
+            executor, QualityScheduleService._executor = QualityScheduleService._executor, None
+        if thread is not None:
+            thread.join(timeout=QualityScheduleService.TICK_SECONDS)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _loop(app):
+        while not QualityScheduleService._stop_event.wait(QualityScheduleService.TICK_SECONDS):
+            with app.app_context():
+                try:
+                    QualityScheduleService._heartbeat()
+                    QualityScheduleService._reset_interrupted()
+                    QualityScheduleService.tick(app)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"定时质量检测调度失败: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def _source_slot(data_source_id):
+        with QualityScheduleService._lock:
+            slot = QualityScheduleService._source_slots.get(data_source_id)
+            if slot is None:
+                slot = threading.BoundedSemaphore(QualityScheduleService.MAX_CONCURRENCY_PER_SOURCE)
+                QualityScheduleService._source_slots[data_source_id] = slot
+            return slot
+
+    @staticmethod
+    def tick(app, now=None):
+        """检查到期计划并提交执行，返回本轮提交的计划ID"""
+        now = now or datetime.now()
+        submitted = []
+
+        # 新建或刚启用、尚未计算触发时间的计划
+        for schedule in QualitySchedule.query.filter_by(enabled=True).filter(QualitySchedule.next_run_at.is_(None)).all():
+            schedule.next_run_at = QualityScheduleService.compute_next_run(schedule, now)
+        db.session.commit()
+
+        due = QualitySchedule.query.filter_by(enabled=True).filter(
+            QualitySchedule.next_run_at <= now
+        ).order_by(QualitySchedule.next_run_at).all()
+
+        for schedule in due:
+            with QualityScheduleService._lock:
+                if schedule.id in QualityScheduleService._running:
+                    continue
+            slot = QualityScheduleService._source_slot(schedule.data_source_id)
+            if not slot.acquire(blocking=False):
+                # 该数据源的并发已满，留到下一轮
+                print(f"定时质量检测：计划 {schedule.name} 的数据源并发已满，顺延执行")
+                continue
+            if not QualityScheduleService._claim(schedule, now):
+                slot.release()
+                continue
+
+            with QualityScheduleService._lock:
+                QualityScheduleService._running.add(schedule.id)
+            try:
+                QualityScheduleService._executor.submit(QualityScheduleService._execute, app, schedule.id, slot)
+            except Exception:
+                with QualityScheduleService._lock:
+                    QualityScheduleService._running.discard(schedule.id)
+                slot.release()
+                raise
+            submitted.append(schedule.id)
+        return submitted
+
+    @staticmethod
+    def _claim(schedule, now):
+        """条件更新 next_run_at 认领本次触发（其他进程已认领时返回 False）"""
+        next_run_at = QualityScheduleService.compute_next_run(schedule, now)
+        claimed = QualitySchedule.query.filter_by(
+            id=schedule.id, next_run_at=schedule.next_run_at
+        ).update({
+            'next_run_at': next_run_at,
+            'last_status': 'running',
+            'last_run_at': now,
+            'run_owner': QualityScheduleService.owner_id(),
+            'run_heartbeat_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    # ---------------------------------------------------------------- 触发时间
+
+    @staticmethod
+    def _parse_clock(value):
+        if not value:
+            return None
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})', value.strip())
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise ValueError(f"时间窗口格式应为 HH:MM: {value}")
+        return int(match.group(1)), int(match.group(2))
+
+    @staticmethod
+    def _in_window(moment, start, end):
+        current = (moment.hour, moment.minute)
+        if start <= end:
+            return start <= current < end
+        # 跨午夜的窗口（如 22:00-06:00）
+        return current >= start or current < end
+
+    @staticmethod
+    def _next_clock(moment, clock):
+        """moment 之后（含）第一次到达 clock 的时间"""
+        candidate = moment.replace(hour=clock[0], minute=clock[1], second=0, microsecond=0)
+        if candidate < moment:
+            candidate += timedelta(days=1)
+        return candidate
+
+    @staticmethod
+    def compute_next_run(schedule, after):
+        """
+        计算下一次执行时间：cron 触发时间 → 顺延到时间窗口内 → 加随机延后（不超出窗口）
+        """
+        run_at = next_run(schedule.cron_expression, after)
+        start = QualityScheduleService._parse_clock(schedule.window_start)
+        end = QualityScheduleService._parse_clock(schedule.window_end)
+
+        max_jitter = float(schedule.jitter_seconds or 0)
+        if start and end and start != end:
+            if not QualityScheduleService._in_window(run_at, start, end):
+                run_at = QualityScheduleService._next_clock(run_at, start)
+            remaining = (QualityScheduleService._next_clock(run_at, end) - run_at).total_seconds()
+            max_jitter = min(max_jitter, max(remaining - 60, 0))
+        if max_jitter > 0:
+            run_at += timedelta(seconds=random.uniform(0, max_jitter))
+        return run_at.replace(microsecond=0)
+
+    # ---------------------------------------------------------------- 执行
+
+    @staticmethod
+    def _build_db_config(schedule):
+        source = DataSource.query.get(schedule.data_source_id)
+        if not source:
+            raise ValueError(f"找不到ID为 {schedule.data_source_id} 的数据源")
+        db_config = source.to_dict(include_password=True)
+        if schedule.schema_name:
+            db_config['schema'] = schedule.schema_name
+        elif not db_config.get('schema'):
+            db_config['schema'] = 'public'
+        return db_config
+
+    @staticmethod
+    def _probe(schedule, db_config):
+        """新鲜度探测（增删改计数 + COUNT(*) + MAX(时间列)），失败时返回 None（照常执行检测）"""
+        schema = db_config.get('schema') or 'public'
+        full_table_name = (
+            f"{DatabaseService.quote_identifier(schema)}.{DatabaseService.quote_identifier(schedule.table_name)}"
+        )
+        try:
+            engine = DatabaseService.get_engine(db_config, 'utf8', schema)
+            date_column = (
+                schedule.freshness_column
+                or schedule.get_check_options().get('watermark_column')
+                or WatermarkService.DEFAULT_COLUMN
+            )
+            return SnapshotCache.probe_freshness(engine, full_table_name, date_column, exact=True)
+        except Exception as e:
+            print(f"定时质量检测：{schedule.table_name} 新鲜度探测失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def _mark(schedule_id, **values):
+        QualitySchedule.query.filter_by(id=schedule_id).update(values, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def _execute(app, schedule_id, slot):
+        """在工作线程中执行一次定时检测"""
+        with app.app_context():
+            try:
+                schedule = QualitySchedule.query.get(schedule_id)
+                if schedule is None:
+                    return
+                db_config = QualityScheduleService._build_db_config(schedule)
+
+                probe = None
+                if schedule.skip_if_unchanged:
+                    probe = QualityScheduleService._probe(schedule, db_config)
+                    if probe is not None and probe == schedule.get_last_probe():
+                        print(f"定时质量检测：{schedule.name} 源表自上次执行后没有变化，跳过")
+                        QualityScheduleService._mark(schedule_id, last_status='skipped', last_error=None)
+                        return
+
+                print(f"定时质量检测：开始执行 {schedule.name}（{schedule.table_name}）")
+                with QualityService._source_semaphore(db_config):
+                    result = QualityService.run_quality_check(
+                        schedule.rule_library_id, schedule.version_id, db_config, schedule.table_name,
+                        fields=schedule.get_fields(),
+                        created_by=schedule.created_by or f"schedule:{schedule.id}",
+                        **schedule.get_check_options()
+                    )
+                QualityScheduleService._mark(
+                    schedule_id,
+                    last_status='completed',
+                    last_result_id=result['id'],
+                    last_error=None,
+                    last_probe=json.dumps(probe, ensure_ascii=False) if probe is not None else None
+                )
+                print(f"定时质量检测：{schedule.name} 完成，结果ID {result['id']}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"定时质量检测：计划 {schedule_id} 执行失败: {str(e)}")
+                try:
+                    QualityScheduleService._mark(schedule_id, last_status='failed', last_error=str(e))
+                except Exception as mark_error:
+                    db.session.rollback()
+                    print(f"定时质量检测：记录计划 {schedule_id} 状态失败: {str(mark_error)}")
+            finally:
+                slot.release()
+                with QualityScheduleService._lock:
+                    QualityScheduleService._running.discard(schedule_id)
+                db.session.remove()
+
+    # ---------------------------------------------------------------- 管理
+
+    @staticmethod
+    def _apply(schedule, data):
+        """校验并写入计划配置"""
+        for key in ('name', 'table_name', 'cron_expression', 'freshness_column'):
+            if key in data:
+                setattr(schedule, key, data[key] or None)
+        for key in ('rule_library_id', 'version_id', 'data_source_id', 'jitter_seconds'):
+            if key in data:
+                setattr(schedule, key, int(data[key]) if data[key] not in (None, '') else None)
+        if 'schema' in data:
+            schedule.schema_name = data['schema'] or None
+        for key in ('window_start', 'window_end'):
+            if key in data:
+                QualityScheduleService._parse_clock(data[key])
+                setattr(schedule, key, data[key] or None)
+        for key in ('skip_if_unchanged', 'enabled'):
+            if key in data:
+                setattr(schedule, key, bool(data[key]))
+        if 'fields' in data:
+            schedule.set_fields(data['fields'])
+        if 'check_options' in data:
+            options = data['check_options'] or {}
+            unknown = set(options) - set(QualityScheduleService.CHECK_OPTIONS)
+            if unknown:
+                raise ValueError(f"不支持的检测选项: {', '.join(sorted(unknown))}")
+            if options.get('limit'):
+                raise ValueError("定时检测不支持限制行数")
+            schedule.set_check_options(options)
+
+        if not (schedule.name and schedule.table_name and schedule.cron_expression
+                and schedule.rule_library_id and schedule.data_source_id):
+            raise ValueError("缺少必要参数: name / rule_library_id / data_source_id / table_name / cron_expression")
+        if not RuleLibrary.query.get(schedule.rule_library_id):
+            raise ValueError("规则库不存在")
+        if not DataSource.query.get(schedule.data_source_id):
+            raise ValueError(f"找不到ID为 {schedule.data_source_id} 的数据源")
+        if bool(schedule.window_start) != bool(schedule.window_end):
+            raise ValueError("时间窗口需要同时设置开始和结束时间")
+        if (schedule.jitter_seconds or 0) < 0:
+            raise ValueError("jitter_seconds 不能为负数")
+        # 校验 cron 表达式并重新计算下一次执行时间
+        schedule.next_run_at = QualityScheduleService.compute_next_run(schedule, datetime.now()) if schedule.enabled else None
+
+    @staticmethod
+    def create_schedule(data, created_by=''):
+        schedule = QualitySchedule(
+            enabled=True,
+            skip_if_unchanged=True,
+            jitter_seconds=0,
+            created_by=created_by
+        )
+        QualityScheduleService._apply(schedule, data)
+        db.session.add(schedule)
+        db.session.commit()
+        return schedule.to_dict()
+
+    @staticmethod
+    def update_schedule(schedule_id, data):
+        schedule = QualitySchedule.query.get(schedule_id)
+        if not schedule:
+            raise ValueError("定时计划不存在")
+        QualityScheduleService._apply(schedule, data)
+        db.session.commit()
+        return schedule.to_dict()
+
+    @staticmethod
+    def delete_schedule(schedule_id):
+        schedule = QualitySchedule.query.get(schedule_id)
+        if not schedule:
+            raise ValueError("定时计划不存在")
+        db.session.delete(schedule)
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def get_schedule(schedule_id):
+        schedule = QualitySchedule.query.get(schedule_id)
+        if not schedule:
+            raise ValueError("定时计划不存在")
+        return schedule.to_dict()
+
+    @staticmethod
+    def list_schedules(rule_library_id=None, enabled=None):
+        query = QualitySchedule.query
+        if rule_library_id:
+            query = query.filter_by(rule_library_id=rule_library_id)
+        if enabled is not None:
+            query = query.filter_by(enabled=enabled)
+        return [schedule.to_dict() for schedule in query.order_by(QualitySchedule.next_run_at).all()]
+
+    @staticmethod
+    def run_now(schedule_id):
+        """立即触发（下一轮调度时执行，仍受数据源并发限制；不做新鲜度跳过）"""
+        schedule = QualitySchedule.query.get(schedule_id)
+        if not schedule:
+            raise ValueError("定时计划不存在")
+        if not schedule.enabled:
+            raise ValueError("定时计划已停用")
+        schedule.next_run_at = datetime.now().replace(microsecond=0)
+        schedule.last_probe = None
+        db.session.commit()
+        return schedule.to_dict()
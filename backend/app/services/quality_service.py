@@ -1,13 +1,22 @@
 import pandas as pd
+import numpy as np
 import time
 import os
-import psycopg2
+import threading
+import hashlib
+import json
 from sqlalchemy import text
-from app.models.quality_result import QualityResult, QualityReport
+from app.models.quality_result import QualityResult, QualityReport, QualityFailedRecord, QualityResultFingerprint
 from app.models.rule_model import RuleLibrary, RuleVersion
 from app.models.data_source import DataSource
 from app.services.database_service import DatabaseService
+from app.services.engine_registry import EngineRegistry
 from app.services.rule_service import RuleService
+from app.services.rule_engine import RuleEngine
+from app.services.rule_pushdown import RulePushdown
+from app.services.report_writer import QualityReportWriter
+from app.services.snapshot_cache import SnapshotCache
+from app.services.watermark_service import WatermarkService
 from app import db
 
 class QualityService:
@@ -23,9 +32,90 @@ class QualityService:
             os.makedirs(QualityService.REPORT_DIR)
 
     @staticmethod
-    def run_quality_check(rule_library_id, version_id, db_config, table_name, fields=None, created_by="", limit=None):
-        """运行质量检测（并自动保存全量报告）"""
+    def _no_progress(phase, rows=None):
+        """默认进度回调（不做任何事）"""
+        return None
+
+    # 指纹相同（规则、字段、检测选项与源表新鲜度均未变化）的检测结果在该时间内直接复用（秒）
+    RESULT_REUSE_TTL = 600
+
+    @staticmethod
+    def _result_fingerprint(conn_config, target_schema, full_table_name, table_name, rule_library_id, version_id, rules, fields, options, date_column=None):
+        """
+        计算检测指纹：数据源表 + 规则内容 + 字段 + 检测选项 + 源表新鲜度探测
+        （增删改计数 + COUNT(*) + MAX(date_column)；统计计数异步上报，刚提交的写入只能靠行数与时间列发现）
+
+        Returns:
+            tuple: (指纹, 探测结果)；探测失败时返回 (None, None)，本次不复用结果
+        """
+        try:
+            engine = DatabaseService.get_engine(conn_config, 'utf8', target_schema)
+            probe = SnapshotCache.probe_freshness(engine, full_table_name, date_column, exact=True)
+        except Exception as e:
+            print(f"检测结果复用：{full_table_name} 新鲜度探测失败: {str(e)}")
+            return None, None
+        rules_raw = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+        descriptor = {
+            'source': list(EngineRegistry.connection_identity(conn_config)),
+            'schema': target_schema,
+            'table': table_name,
+            'rule_library_id': rule_library_id,
+            'version_id': version_id,
+            'rules': hashlib.sha1(rules_raw.encode('utf-8')).hexdigest(),
+            'fields': list(fields) if fields else None,
+            'options': options,
+            'probe': probe
+        }
+        raw = json.dumps(descriptor, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest(), probe
+
+    @staticmethod
+    def _find_reusable_result(fingerprint):
+        """查找 RESULT_REUSE_TTL 内指纹相同的检测结果"""
+        from datetime import datetime, timedelta
+        
+        cutoff = datetime.utcnow() - timedelta(seconds=QualityService.RESULT_REUSE_TTL)
+        entry = QualityResultFingerprint.query.filter(
+            QualityResultFingerprint.fingerprint == fingerprint,
+            QualityResultFingerprint.created_at >= cutoff
+        ).order_by(QualityResultFingerprint.created_at.desc()).first()
+        if entry is None:
+            return None
+        return QualityResult.query.get(entry.result_id)
+
+    # 流式检测的默认分块大小（行）
+    STREAM_CHUNK_SIZE = 50000
+    # 流式检测时每条规则最多保留的错误详情条数（计数不受影响）
+    STREAM_MAX_ERROR_DETAILS = 10000
+
+    @staticmethod
+    def run_quality_check(rule_library_id, version_id, db_config, table_name, fields=None, created_by="", limit=None, streaming=False, chunk_size=None, use_snapshot=False, pushdown=False, progress=None, validation_pool=None, report_format='xlsx', report_failed_only=False, report_background=True, incremental=False, watermark_column=None, full_recheck_days=None, force_full=False, reuse_recent=True):
+        """
+        运行质量检测（并自动保存全量报告）
+
+        Args:
+            streaming: 为True时使用服务端命名游标分块读取并逐块验证，
+                       内存占用只与分块大小相关，适用于千万行级别的大表
+            chunk_size: 流式检测的分块大小，默认 STREAM_CHUNK_SIZE
+            use_snapshot: 非流式检测时优先使用本地数据快照（源表未变化时不再重新拉取）
+            pushdown: 为True时把规则编译为SQL在数据库端聚合统计，只拉取失败行主键，
+                      报告为失败主键清单（CSV）
+            progress: 可选进度回调 progress(phase, rows=None)，phase 依次为
+                      read / validate / report / persist；回调抛出的异常会中止检测（用于取消任务）
+            validation_pool: 可选进程池（批量检测时传入），用于在子进程中执行内存验证
+            report_format: 内存检测的全量报告格式 xlsx / csv / parquet
+            report_failed_only: 全量报告只输出失败行
+            report_background: 为True时在结果提交后由后台线程流式写出报告，检测接口不等待报告生成
+            incremental: 为True时按水位线列只检测上次检测之后变更的数据，计数累加到滚动汇总；
+                         本次 QualityResult 只记录增量部分
+            watermark_column: 水位线列，默认 update_date
+            full_recheck_days: 距上次全量检测超过该天数时自动执行全量检测
+            force_full: 增量模式下强制执行一次全量检测（重置水位线与滚动汇总）
+            reuse_recent: 规则、字段、检测选项与源表新鲜度探测都未变化时，直接返回 RESULT_REUSE_TTL 内的已有结果
+                          （不重新读取和验证；增量检测不复用）
+        """
         start_time = time.time()
+        progress = progress or QualityService._no_progress
         
         try:
             # 获取规则库和版本
@@ -65,131 +155,88 @@ class QualityService:
             else:
                 query = f"SELECT * FROM {full_table_name}"
             
-            if limit is not None and int(limit) > 0:
-                query += f" LIMIT {int(limit)}"
-            
-            # 3. 执行数据读取（多编码重试机制）
-            # 使用 psycopg2 直连，避开 SQLAlchemy 的复杂封装，确保编码设置生效
-            encodings = ['utf8', 'gbk', 'latin1']
-            df = None
-            used_encoding = None
-            last_error = None
+            conn_config = dict(db_config, password=real_password)
             
-            print(f"开始读取数据，表: {full_table_name}, 限制: {limit}")
+            watermark_plan = None
+            if incremental:
+                if limit is not None and int(limit) > 0:
+                    # 截断读取会让水位线越过未检测的行
+                    raise ValueError("增量检测不支持限制行数")
+                watermark_plan = WatermarkService.plan(
+                    conn_config, target_schema, full_table_name, rule_library_id, version_id, table_name,
+                    column=watermark_column, force_full=force_full, full_recheck_days=full_recheck_days
+                )
+                if watermark_plan['condition']:
+                    query += f" WHERE {watermark_plan['condition']}"
+                # 快照按整表缓存，不适用于区间读取
+                use_snapshot = False
             
-            for enc in encodings:
-                conn = None
-                try:
-                    # 映射 Postgres 编码名称
-                    pg_enc = 'LATIN1' if enc == 'latin1' else ('GBK' if enc.lower() == 'gbk' else 'UTF8')
-                    
-                    conn = psycopg2.connect(
-                        host=db_config['host'],
-                        port=int(db_config['port']),
-                        database=db_config['database'],
-                        user=db_config['username'],
-                        password=real_password,
-                        client_encoding=pg_enc
-                    )
-                    
-                    # 双重保险：执行 SET 命令
-                    with conn.cursor() as cursor:
-                        cursor.execute(f"SET client_encoding TO '{pg_enc}'")
-                    
-                    # 读取数据
-                    df = pd.read_sql(query, conn)
-                    
-                    print(f"检测阶段：成功使用编码 {enc} 读取到 {len(df)} 行数据")
-                    used_encoding = enc
-                    break
-                except Exception as e:
-                    print(f"检测阶段：编码 {enc} 读取失败: {str(e)}")
-                    last_error = e
-                    continue
-                finally:
-                    if conn:
-                        conn.close()
+            if limit is not None and int(limit) > 0:
+                query += f" LIMIT {int(limit)}"
             
-            if df is None:
-                raise Exception(f"无法读取数据，已尝试编码 {encodings}。错误: {str(last_error)}")
-
-            # 4. 数据清洗
-            # 如果使用了 latin1 兜底，尝试修复乱码
-            if used_encoding == 'latin1':
-                print("正在尝试修复 Latin1 乱码...")
-                for col in df.select_dtypes(include=['object']).columns:
-                    new_vals = []
-                    for val in df[col]:
-                        if isinstance(val, str):
-                            try:
-                                # 尝试还原为 UTF-8
-                                new_vals.append(val.encode('latin1').decode('utf-8'))
-                            except:
-                                try:
-                                    # 尝试还原为 GBK
-                                    new_vals.append(val.encode('latin1').decode('gbk'))
-                                except:
-                                    # 无法修复，保留原样或替换
-                                    new_vals.append(val.encode('latin1').decode('utf-8', errors='replace'))
-                        else:
-                            new_vals.append(val)
-                    df[col] = new_vals
-
-            # 填充空值，避免后续处理报错
-            df = df.fillna(0)
-            
-            total_records = len(df)
-            
-            # 5. 获取规则并执行验证
+            # 获取规则
             if version:
                 rules = version.get_rules()
             else:
                 rules = RuleService.get_latest_rules(rule_library_id)
             
-            all_failed_records = set()
-            reports = []
-            
-            # 记录每行的错误信息 {row_index: [errors]}
-            row_errors = {i: [] for i in range(total_records)}
+            fingerprint = probe = None
+            if reuse_recent and not incremental:
+                fingerprint, probe = QualityService._result_fingerprint(
+                    conn_config, target_schema, full_table_name, table_name, rule_library_id, version_id, rules, fields,
+                    options={
+                        'limit': int(limit) if limit is not None and int(limit) > 0 else None,
+                        'streaming': bool(streaming),
+                        'pushdown': bool(pushdown),
+                        'report_format': report_format,
+                        'report_failed_only': bool(report_failed_only)
+                    },
+                    date_column=watermark_column or WatermarkService.DEFAULT_COLUMN
+                )
+                reused = QualityService._find_reusable_result(fingerprint) if fingerprint else None
+                if reused is not None:
+                    print(f"质量检测：{full_table_name} 的数据与规则未变化，复用检测结果 {reused.id}")
+                    result_dict = reused.to_dict()
+                    result_dict['reused'] = True
+                    result_dict['report_pending'] = reused.id in QualityService._pending_reports
+                    return result_dict
             
-            for rule in rules:
-                validation_result = RuleService.validate_rule_detailed(rule, df)
-                
-                rule_passed = validation_result.get('passed_count', 0)
-                rule_failed = validation_result.get('failed_count', 0)
-                failed_indices = validation_result.get('failed_indices', [])
-                error_details = validation_result.get('error_details', [])
-                
-                # 记录总的失败行
-                all_failed_records.update(failed_indices)
-                
-                # 将详细错误填入对应行
-                rule_name = rule.get('name', rule.get('rule_type', '未知规则'))
-                for err in error_details:
-                    idx = err.get('row')
-                    msg = err.get('message', '验证失败')
-                    if idx is not None:
-                        try:
-                            idx = int(idx)
-                            if idx in row_errors:
-                                row_errors[idx].append(f"[{rule_name}] {msg}")
-                        except:
-                            pass
-                
-                # 创建详细报告对象
-                report = QualityReport(
-                    rule_name=rule.get('name', ''),
-                    rule_type=rule.get('rule_type', ''),
-                    field_name=rule.get('field', ''),
-                    passed_count=rule_passed,
-                    failed_count=rule_failed
+            progress('read')
+            if pushdown or streaming:
+                QualityService.ensure_report_dir()
+                temp_report_path = os.path.join(
+                    QualityService.REPORT_DIR, f"quality_report_stream_{int(time.time() * 1000)}.csv"
+                )
+                try:
+                    if pushdown:
+                        total_records, failed_records, reports = QualityService._validate_pushdown(
+                            conn_config, full_table_name, target_schema, rules, limit, fields, temp_report_path,
+                            progress=progress, row_filter=watermark_plan['condition'] if watermark_plan else None
+                        )
+                    else:
+                        # 流式检测：逐块读取、验证并写出报告，内存只与分块大小相关
+                        total_records, failed_records, reports = QualityService._validate_streaming(
+                            conn_config, query, target_schema, rules, chunk_size or QualityService.STREAM_CHUNK_SIZE, temp_report_path,
+                            progress=progress
+                        )
+                except Exception:
+                    if os.path.exists(temp_report_path):
+                        os.remove(temp_report_path)
+                    raise
+                df = None
+                all_failed_records = None
+                row_errors = None
+                read_info = {}
+            else:
+                read_info = {}
+                df, total_records, all_failed_records, row_errors, reports = QualityService._validate_in_memory(
+                    conn_config, query, full_table_name, target_schema, rules, limit,
+                    table_name=table_name, fields=fields, use_snapshot=use_snapshot, read_info=read_info,
+                    progress=progress, validation_pool=validation_pool
                 )
-                if rule_failed > 0:
-                    report.set_error_details(error_details)
-                reports.append(report)
+                failed_records = len(all_failed_records)
             
             # 6. 计算统计结果
-            failed_records = len(all_failed_records)
             passed_records = total_records - failed_records
             pass_rate = (passed_records / total_records) * 100 if total_records > 0 else 0
             execution_time = time.time() - start_time
@@ -210,46 +257,496 @@ class QualityService:
             db.session.add(result)
             db.session.flush()  # 获取 result.id
             
-            # 8. 生成全量 Excel 报告并保存到本地
-            try:
-                QualityService.ensure_report_dir()
-                
-                # 准备导出数据
-                export_df = df.copy()
-                
-                # 插入质检状态列
-                export_df.insert(0, '异常详情', export_df.index.map(lambda x: ' ; '.join(row_errors[x]) if row_errors[x] else ''))
-                export_df.insert(0, '质检状态', export_df.index.map(lambda x: '异常' if x in all_failed_records else '正常'))
-                
-                # 生成文件名
-                filename = f"quality_report_{result.id}_{int(time.time())}.xlsx"
-                file_path = os.path.join(QualityService.REPORT_DIR, filename)
-                
-                # 保存为 Excel
-                export_df.to_excel(file_path, index=False)
-                
-                # 更新数据库中的文件路径
-                result.report_file_path = file_path
-                print(f"全量报告已生成并保存: {file_path}")
-                
-            except Exception as file_error:
-                print(f"生成全量报告文件失败: {str(file_error)}")
-                # 不阻断主流程，仅打印错误
+            # 8. 生成全量报告并保存到本地
+            progress('report', rows=total_records)
+            if pushdown or streaming:
+                try:
+                    file_path = os.path.join(QualityService.REPORT_DIR, f"quality_report_{result.id}_{int(time.time())}.csv")
+                    os.replace(temp_report_path, file_path)
+                    result.report_file_path = file_path
+                    print(f"全量报告已生成并保存: {file_path}")
+                except Exception as file_error:
+                    print(f"保存全量报告文件失败: {str(file_error)}")
+            else:
+                # 失败行位置与 DataFrame 行位置对齐
+                failed_mask = np.zeros(total_records, dtype=bool)
+                if all_failed_records:
+                    failed_mask[list(all_failed_records)] = True
+                report_options = dict(report_format=report_format, failed_only=report_failed_only)
+                if not report_background:
+                    try:
+                        result.report_file_path = QualityService._write_full_report(
+                            result.id, df, failed_mask, row_errors, **report_options
+                        )
+                    except Exception as file_error:
+                        print(f"生成全量报告文件失败: {str(file_error)}")
+                        # 不阻断主流程，仅打印错误
             
             # 保存详细报告数据
-            for report in reports:
-                report.result_id = result.id
-                db.session.add(report)
+            progress('persist', rows=total_records)
+            QualityService.save_reports(result.id, reports)
+            
+            # 失败记录逐行写入索引表，供分页/筛选查询
+            QualityService._store_failed_records(result, reports)
+            
+            if fingerprint:
+                # 探测在读取数据之前完成，读取期间源表发生变化时下一次探测结果不同，不会误复用
+                db.session.add(QualityResultFingerprint(
+                    fingerprint=fingerprint,
+                    result_id=result.id,
+                    probe=json.dumps(probe, ensure_ascii=False, default=str)
+                ))
+            
+            watermark = None
+            if watermark_plan is not None:
+                # 水位线与检测结果同一事务提交，检测失败时不会推进
+                watermark = WatermarkService.record(
+                    watermark_plan, rule_library_id, version_id, db_config, target_schema, table_name, result, reports
+                )
             
             db.session.commit()
             
-            return result.to_dict()
+            result_dict = result.to_dict()
+            result_dict['cache_hit'] = read_info.get('cache_hit', False)
+            if watermark is not None:
+                result_dict['incremental'] = {
+                    'mode': 'full' if watermark_plan['full'] else 'incremental',
+                    'range': [watermark_plan['lower'], watermark_plan['upper']],
+                    'watermark': watermark.to_dict()
+                }
+            if not (pushdown or streaming) and report_background:
+                # 结果已提交，报告在后台写出，完成后回填 report_file_path
+                if QualityService._schedule_full_report(result.id, df, failed_mask, row_errors, **report_options):
+                    result_dict['report_pending'] = True
+                else:
+                    # 后台队列已满时同步写出，避免排队任务各自持有一份完整的 DataFrame
+                    try:
+                        result.report_file_path = QualityService._write_full_report(
+                            result.id, df, failed_mask, row_errors, **report_options
+                        )
+                        db.session.commit()
+                        result_dict['report_file_path'] = result.report_file_path
+                    except Exception as file_error:
+                        db.session.rollback()
+                        print(f"生成全量报告文件失败: {str(file_error)}")
+            return result_dict
             
         except Exception as e:
             db.session.rollback()
             import traceback
             traceback.print_exc()
             raise Exception(f"质量检测失败: {str(e)}")
+
+    # 后台写出全量报告的线程数
+    REPORT_WRITER_WORKERS = 1
+    # 后台报告任务上限（写出中 + 排队）；每个任务持有源数据 DataFrame，超出时由检测请求同步写出
+    MAX_PENDING_REPORTS = 2
+
+    _report_executor = None
+    _pending_reports = set()
+    _report_lock = threading.Lock()
+
+    @staticmethod
+    def _write_full_report(result_id, df, failed_mask, row_errors, report_format='xlsx', failed_only=False):
+        """流式写出全量报告，返回文件路径"""
+        QualityService.ensure_report_dir()
+        path_base = os.path.join(QualityService.REPORT_DIR, f"quality_report_{result_id}_{int(time.time())}")
+        file_path, rows = QualityReportWriter.write(
+            df, failed_mask, row_errors, path_base, report_format=report_format, failed_only=failed_only
+        )
+        print(f"全量报告已生成并保存: {file_path}（{rows} 行）")
+        return file_path
+
+    @staticmethod
+    def _schedule_full_report(result_id, df, failed_mask, row_errors, report_format='xlsx', failed_only=False):
+        """
+        提交后台报告写出任务，完成后更新 QualityResult.report_file_path
+
+        Returns:
+            bool: 是否已提交；后台任务数达到 MAX_PENDING_REPORTS 时返回 False，由调用方同步写出
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from flask import current_app
+        
+        app = current_app._get_current_object()
+        with QualityService._report_lock:
+            if len(QualityService._pending_reports) >= QualityService.MAX_PENDING_REPORTS:
+                return False
+            if QualityService._report_executor is None:
+                QualityService._report_executor = ThreadPoolExecutor(
+                    max_workers=QualityService.REPORT_WRITER_WORKERS, thread_name_prefix='quality-report'
+                )
+            QualityService._pending_reports.add(result_id)
+        
+        def write_report():
+            with app.app_context():
+                try:
+                    file_path = QualityService._write_full_report(
+                        result_id, df, failed_mask, row_errors, report_format=report_format, failed_only=failed_only
+                    )
+                    result = QualityResult.query.get(result_id)
+                    if result is not None:
+                        result.report_file_path = file_path
+                        db.session.commit()
+                    elif os.path.exists(file_path):
+                        # 报告生成期间结果已被删除
+                        os.remove(file_path)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"生成全量报告文件失败: {str(e)}")
+                finally:
+                    db.session.remove()
+                    with QualityService._report_lock:
+                        QualityService._pending_reports.discard(result_id)
+        
+        QualityService._report_executor.submit(write_report)
+        return True
+
+    @staticmethod
+    def _repair_latin1_value(val):
+        """修复单个 latin1 乱码字符串：依次尝试 UTF-8、GBK，都失败时按 UTF-8 替换无法解码的字节"""
+        raw = val.encode('latin1')
+        try:
+            # 尝试还原为 UTF-8
+            return raw.decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                # 尝试还原为 GBK
+                return raw.decode('gbk')
+            except UnicodeDecodeError:
+                # 无法修复，保留原样或替换
+                return raw.decode('utf-8', errors='replace')
+
+    @staticmethod
+    def _repair_latin1(df):
+        """
+        修复 latin1 兜底读取造成的乱码
+
+        只处理包含非 ASCII 字符的取值（纯 ASCII 在 latin1 与 UTF-8 下相同）；
+        每列先去重，对需要修复的取值整体做一次 UTF-8 解码，全部成功时直接拆分，
+        否则逐个修复，最后按分类编码映射回各行。
+        """
+        for col in df.select_dtypes(include=['object']).columns:
+            values = df[col]
+            # 先按取值去重，只在去重后的取值上判断是否含非 ASCII 字符
+            codes, uniques = pd.factorize(values)
+            needs_repair = np.fromiter(
+                (isinstance(val, str) and not val.isascii() for val in uniques), dtype=bool, count=len(uniques)
+            )
+            if not needs_repair.any():
+                continue
+            
+            targets = [val for val, flag in zip(uniques, needs_repair) if flag]
+            repaired = None
+            if not any('\x00' in val for val in targets):
+                # 快速路径：以 \x00 拼接后一次解码（UTF-8 自同步，整体合法等价于逐个合法）
+                try:
+                    repaired = '\x00'.join(targets).encode('latin1').decode('utf-8').split('\x00')
+                except UnicodeDecodeError:
+                    repaired = None
+            if repaired is None:
+                repaired = [QualityService._repair_latin1_value(val) for val in targets]
+            
+            # 按分类编码映射回各行（只替换需要修复的行）
+            repaired_uniques = np.empty(len(uniques), dtype=object)
+            repaired_uniques[needs_repair] = repaired
+            row_mask = np.zeros(len(codes), dtype=bool)
+            valid = codes >= 0
+            row_mask[valid] = needs_repair[codes[valid]]
+            new_values = values.to_numpy(dtype=object, copy=True)
+            new_values[row_mask] = repaired_uniques[codes[row_mask]]
+            df[col] = new_values
+        return df
+
+    @staticmethod
+    def _build_report(rule, passed_count, failed_count, error_details):
+        """创建单条规则的详细报告对象"""
+        report = QualityReport(
+            rule_name=rule.get('name', ''),
+            rule_type=rule.get('rule_type', ''),
+            field_name=rule.get('field', ''),
+            passed_count=passed_count,
+            failed_count=failed_count
+        )
+        if failed_count > 0:
+            report.set_error_details(error_details)
+        return report
+
+    @staticmethod
+    def _validate_in_memory(conn_config, query, full_table_name, target_schema, rules, limit, table_name=None, fields=None, use_snapshot=False, read_info=None, progress=None, validation_pool=None):
+        """
+        整表读入内存后逐条规则验证
+
+        Args:
+            validation_pool: 可选进程池，行数不少于 PROCESS_POOL_MIN_ROWS 时在子进程中验证
+        """
+        progress = progress or QualityService._no_progress
+        # 3. 执行数据读取（多编码重试机制）
+        # 使用 DBAPI 连接读取，避开 SQLAlchemy 的复杂封装，确保编码设置生效
+        encodings = ['utf8', 'gbk', 'latin1']
+        df = None
+        used_encoding = None
+        last_error = None
+        
+        print(f"开始读取数据，表: {full_table_name}, 限制: {limit}")
+        
+        if use_snapshot and table_name:
+            try:
+                df, snapshot_info = DatabaseService.read_table_snapshot(
+                    dict(conn_config, schema=target_schema), table_name, fields,
+                    max_rows=int(limit) if limit is not None and int(limit) > 0 else None
+                )
+                if read_info is not None:
+                    read_info.update(snapshot_info)
+                print(f"检测阶段：通过快照层读取到 {len(df)} 行数据（命中快照: {snapshot_info.get('cache_hit')}）")
+            except Exception as e:
+                print(f"检测阶段：快照读取失败，回退为直接读取: {str(e)}")
+                df = None
+        
+        for enc in ([] if df is not None else DatabaseService.encoding_candidates(conn_config, encodings, target_schema)):
+            conn = None
+            try:
+                # 映射 Postgres 编码名称
+                pg_enc = 'LATIN1' if enc == 'latin1' else ('GBK' if enc.lower() == 'gbk' else 'UTF8')
+                
+                # 借用池化连接（close 时归还连接池而非断开）
+                conn = DatabaseService.get_engine(conn_config, enc, target_schema).raw_connection()
+                
+                # 双重保险：执行 SET 命令
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SET client_encoding TO '{pg_enc}'")
+                
+                # 读取数据
+                df = pd.read_sql(query, conn)
+                
+                print(f"检测阶段：成功使用编码 {enc} 读取到 {len(df)} 行数据")
+                used_encoding = enc
+                DatabaseService.remember_encoding(conn_config, enc, target_schema)
+                break
+            except Exception as e:
+                print(f"检测阶段：编码 {enc} 读取失败: {str(e)}")
+                last_error = e
+                continue
+            finally:
+                if conn:
+                    conn.close()
+        
+        if df is None:
+            raise Exception(f"无法读取数据，已尝试编码 {encodings}。错误: {str(last_error)}")
+
+        # 4. 数据清洗
+        # 如果使用了 latin1 兜底，尝试修复乱码
+        if used_encoding == 'latin1':
+            print("正在尝试修复 Latin1 乱码...")
+            QualityService._repair_latin1(df)
+
+        # 填充空值，避免后续处理报错
+        df = df.fillna(0)
+        
+        total_records = len(df)
+        progress('validate', rows=total_records)
+        
+        # 5. 执行验证：整个规则集一次评估，得到 行 × 规则 的失败位图
+        #    提供进程池且数据量较大时，在子进程中完成 CPU 密集的验证
+        evaluation = None
+        if validation_pool is not None and total_records >= QualityService.PROCESS_POOL_MIN_ROWS:
+            try:
+                evaluation = validation_pool.submit(RuleEngine.evaluate_detached, rules, df).result()
+            except Exception as e:
+                print(f"检测阶段：进程池验证失败，改为在当前线程验证: {str(e)}")
+        if evaluation is None:
+            evaluation = RuleEngine.evaluate_detached(rules, df)
+        all_failed_records = set(evaluation['failed_rows'])
+        
+        # 记录每行的错误信息 {row_index: [errors]}（只包含有错误的行）
+        row_errors = evaluation['row_errors']
+        
+        reports = [
+            QualityService._build_report(rule, passed_count, failed_count, details)
+            for rule, (passed_count, failed_count, details) in zip(rules, evaluation['rule_results'])
+        ]
+        
+        return df, total_records, all_failed_records, row_errors, reports
+
+    @staticmethod
+    def _validate_pushdown(conn_config, full_table_name, target_schema, rules, limit, fields, report_path, progress=None, row_filter=None):
+        """
+        规则下推验证：一条聚合 SQL 统计各规则失败数，再按主键键集分页拉取失败行主键
+
+        报告为失败行清单（主键、异常详情）；表没有单列主键时只统计计数，不输出失败行。
+        row_filter 为可选的 WHERE 条件（增量检测的水位线区间）。
+
+        Returns:
+            tuple: (总行数, 失败行数, 报告对象列表)
+        """
+        import csv
+
+        engine = DatabaseService.get_engine(conn_config, 'utf8', target_schema)
+        with engine.connect() as conn:
+            column_types = DatabaseService._get_column_types(conn, full_table_name)
+            key_column = DatabaseService._get_primary_key(conn, full_table_name)
+
+        if fields:
+            # 只检测选中的字段，未选中的字段与内存检测一样视为不存在
+            column_types = {name: column_types[name] for name in fields if name in column_types}
+
+        where = f" WHERE {row_filter}" if row_filter else ""
+        if limit is not None and int(limit) > 0:
+            order_by = f" ORDER BY {DatabaseService.quote_identifier(key_column)}" if key_column else ""
+            source_sql = f"(SELECT * FROM {full_table_name}{where}{order_by} LIMIT {int(limit)})"
+        elif where:
+            source_sql = f"(SELECT * FROM {full_table_name}{where})"
+        else:
+            source_sql = full_table_name
+
+        progress = progress or QualityService._no_progress
+        conditions, params = RulePushdown.build_conditions(rules, column_types)
+        progress('validate')
+        counts = RulePushdown.count_failures(engine, source_sql, conditions, params)
+        total = counts['total']
+        print(f"规则下推：{full_table_name} 共 {total} 行，失败 {counts['failed_rows']} 行")
+
+        rule_details = [[] for _ in rules]
+        with open(report_path, 'w', encoding='utf-8-sig', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow([key_column or '主键', '质检状态', '异常详情'])
+            if key_column:
+                for page in RulePushdown.iter_failing_keys(engine, source_sql, key_column, conditions, params):
+                    progress('validate', rows=total)
+                    for key, failed_rules in page:
+                        if not isinstance(key, (int, str)):
+                            key = str(key)
+                        messages = []
+                        for j in failed_rules:
+                            rule = rules[j]
+                            message = f"字段 {rule.get('field')} 未通过规则检查"
+                            messages.append(f"[{rule.get('name', '未知规则')}] {message}")
+                            if len(rule_details[j]) < QualityService.STREAM_MAX_ERROR_DETAILS:
+                                rule_details[j].append({'row': key, 'message': message})
+                        writer.writerow([key, '异常', ' ; '.join(messages)])
+            else:
+                print(f"规则下推：{full_table_name} 没有单列主键，只输出统计结果")
+
+        reports = [
+            QualityService._build_report(rule, total - failed, failed, details)
+            for rule, failed, details in zip(rules, counts['rule_failed'], rule_details)
+        ]
+        return total, counts['failed_rows'], reports
+
+    @staticmethod
+    def _open_stream_cursor(conn_config, query, target_schema, chunk_size):
+        """
+        打开服务端命名游标并读取第一块数据（多编码重试）
+
+        Returns:
+            tuple: (编码, 分块生成器)
+        """
+        import uuid
+        
+        encodings = ['utf8', 'gbk', 'latin1']
+        last_error = None
+        
+        for enc in DatabaseService.encoding_candidates(conn_config, encodings, target_schema):
+            conn = None
+            try:
+                conn = DatabaseService.get_engine(conn_config, enc, target_schema).raw_connection()
+                cursor = conn.cursor(name=f"quality_stream_{uuid.uuid4().hex[:12]}")
+                cursor.itersize = chunk_size
+                cursor.execute(query)
+                first_rows = cursor.fetchmany(chunk_size)
+                columns = [desc[0] for desc in cursor.description]
+            except Exception as e:
+                print(f"流式检测：编码 {enc} 读取失败: {str(e)}")
+                last_error = e
+                if conn:
+                    conn.close()
+                continue
+            
+            print(f"流式检测：成功使用编码 {enc} 打开服务端游标")
+            DatabaseService.remember_encoding(conn_config, enc, target_schema)
+            
+            def iter_chunks():
+                try:
+                    rows = first_rows
+                    while rows:
+                        yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                        if len(rows) < chunk_size:
+                            break
+                        rows = cursor.fetchmany(chunk_size)
+                except Exception as e:
+                    if 'decode' in str(e).lower() or 'codec' in str(e).lower():
+                        DatabaseService.forget_encoding(conn_config, target_schema)
+                    raise
+                finally:
+                    try:
+                        cursor.close()
+                    finally:
+                        conn.close()
+            
+            return enc, iter_chunks()
+        
+        raise Exception(f"无法读取数据，已尝试编码 {encodings}。错误: {str(last_error)}")
+
+    @staticmethod
+    def _validate_streaming(conn_config, query, target_schema, rules, chunk_size, report_path, progress=None):
+        """
+        流式验证：逐块读取 → 验证 → 累加计数 → 追加写出报告
+
+        Returns:
+            tuple: (总行数, 失败行数, 报告对象列表)
+        """
+        progress = progress or QualityService._no_progress
+        used_encoding, chunks = QualityService._open_stream_cursor(conn_config, query, target_schema, chunk_size)
+        
+        compiled_rules = RuleEngine.compile(rules)
+        rule_totals = [{'passed': 0, 'failed': 0, 'details': []} for _ in rules]
+        failed_rows = set()
+        row_offset = 0
+        
+        with open(report_path, 'w', encoding='utf-8-sig', newline='') as report_file:
+            for chunk_no, chunk in enumerate(chunks):
+                if used_encoding == 'latin1':
+                    QualityService._repair_latin1(chunk)
+                chunk = chunk.fillna(0)
+                
+                evaluation = compiled_rules.evaluate(chunk)
+                chunk_failed = evaluation.bitmap.any(axis=1)
+                chunk_row_errors = evaluation.row_errors()
+                
+                for rule_evaluation, totals in zip(evaluation.evaluations, rule_totals):
+                    totals['passed'] += rule_evaluation.passed_count
+                    totals['failed'] += rule_evaluation.failed_count
+                    
+                    # 错误详情中的行号换算为全表行号；无行号的全局错误只保留一次
+                    remaining = QualityService.STREAM_MAX_ERROR_DETAILS - len(totals['details'])
+                    if remaining <= 0:
+                        continue
+                    for err in rule_evaluation.details(limit=remaining):
+                        if len(totals['details']) >= QualityService.STREAM_MAX_ERROR_DETAILS:
+                            break
+                        if err.get('row') is None:
+                            if chunk_no == 0:
+                                totals['details'].append(err)
+                            continue
+                        totals['details'].append(dict(err, row=int(err['row']) + row_offset))
+                
+                failed_rows.update((np.flatnonzero(chunk_failed) + row_offset).tolist())
+                
+                # 追加写出本块报告
+                export_chunk = chunk
+                export_chunk.insert(0, '异常详情', [' ; '.join(chunk_row_errors.get(i, [])) for i in range(len(chunk))])
+                export_chunk.insert(0, '质检状态', np.where(chunk_failed, '异常', '正常'))
+                export_chunk.to_csv(report_file, header=(chunk_no == 0), index=False)
+                
+                row_offset += len(chunk)
+                progress('validate', rows=row_offset)
+                print(f"流式检测：已处理 {row_offset} 行，失败 {len(failed_rows)} 行")
+        
+        reports = [
+            QualityService._build_report(rule, totals['passed'], totals['failed'], totals['details'])
+            for rule, totals in zip(rules, rule_totals)
+        ]
+        return row_offset, len(failed_rows), reports
     
     @staticmethod
     def get_quality_results(rule_library_id=None, limit=50):
@@ -262,9 +759,18 @@ class QualityService:
         results = query.order_by(QualityResult.created_at.desc()).limit(limit).all()
         return [result.to_dict() for result in results]
     
+    # 报告接口每条规则默认返回的错误详情条数（其余通过 detail_offset 分页获取）
+    REPORT_DETAIL_PAGE_SIZE = 1000
+
     @staticmethod
-    def get_quality_report(result_id):
-        """获取质量检测详细报告"""
+    def get_quality_report(result_id, detail_offset=0, detail_limit=None):
+        """
+        获取质量检测详细报告
+
+        Args:
+            detail_offset / detail_limit: 每条规则错误详情的分页区间，
+                                          detail_limit 默认 REPORT_DETAIL_PAGE_SIZE
+        """
         result = QualityResult.query.get(result_id)
         if not result:
             raise ValueError("质量检测结果不存在")
@@ -281,7 +787,10 @@ class QualityService:
                 'passed_count': report.passed_count,
                 'failed_count': report.failed_count,
                 'pass_rate': round((report.passed_count / (report.passed_count + report.failed_count)) * 100, 2) if (report.passed_count + report.failed_count) > 0 else 0,
-                'error_details': report.get_error_details(),
+                'error_details': report.get_error_details(
+                    detail_offset, detail_limit or QualityService.REPORT_DETAIL_PAGE_SIZE
+                ),
+                'error_details_total': report.get_error_count(),
                 'created_at': report.created_at.strftime('%Y-%m-%d %H:%M:%S') if report.created_at else '',
                 'status': 'failed' if report.failed_count > 0 else 'passed'
             }
@@ -337,15 +846,25 @@ class QualityService:
                 'failed_records_diff': result_2.failed_records - result_1.failed_records,
                 'execution_time_diff': result_2.execution_time - result_1.execution_time
             },
-            'reports_1': [report.to_dict() for report in reports_1],
-            'reports_2': [report.to_dict() for report in reports_2]
+            'reports_1': [report.to_dict(QualityService.REPORT_DETAIL_PAGE_SIZE) for report in reports_1],
+            'reports_2': [report.to_dict(QualityService.REPORT_DETAIL_PAGE_SIZE) for report in reports_2]
         }
         
         return comparison
     
+    # 失败明细接口的默认 / 最大分页大小（条）
+    FAILED_RECORDS_PAGE_SIZE = 1000
+    FAILED_RECORDS_MAX_PAGE_SIZE = 10000
+
     @staticmethod
-    def get_failed_records(result_id):
-        """获取质量检测失败记录的详细数据"""
+    def get_failed_records(result_id, offset=0, limit=None):
+        """
+        获取质量检测失败记录的详细数据
+
+        Args:
+            offset / limit: 按规则顺序拼接后的分页区间，只展开该区间内的明细；
+                            limit 默认 FAILED_RECORDS_PAGE_SIZE，最大 FAILED_RECORDS_MAX_PAGE_SIZE
+        """
         result = QualityResult.query.get(result_id)
         if not result:
             raise ValueError("质量检测结果不存在")
@@ -353,10 +872,20 @@ class QualityService:
         reports = QualityReport.query.filter_by(result_id=result_id).all()
         
         failed_records = []
+        total_failed_records = 0
+        offset = max(int(offset or 0), 0)
+        limit = min(max(int(limit or QualityService.FAILED_RECORDS_PAGE_SIZE), 1), QualityService.FAILED_RECORDS_MAX_PAGE_SIZE)
         for report in reports:
             if report.failed_count > 0:
-                error_details = report.get_error_details()
-                for error in error_details:
+                count = report.get_error_count()
+                start = max(offset - total_failed_records, 0)
+                total_failed_records += count
+                if start >= count:
+                    continue
+                remaining = limit - len(failed_records)
+                if remaining <= 0:
+                    continue
+                for error in report.get_error_details(start, remaining):
                     failed_record = {
                         'rule_name': report.rule_name,
                         'rule_type': report.rule_type,
@@ -372,7 +901,9 @@ class QualityService:
                     failed_records.append(failed_record)
         
         return {
-            'total_failed_records': len(failed_records),
+            'total_failed_records': total_failed_records,
+            'offset': offset,
+            'limit': limit,
             'records': failed_records,
             'summary': {
                 'result_id': result_id,
@@ -385,61 +916,239 @@ class QualityService:
             }
         }
     
+    # 报告批量写入的批大小
+    REPORT_INSERT_BATCH = 1000
+
     @staticmethod
-    def batch_quality_check(rule_library_id, version_id, db_config, tables, fields_map=None, created_by=""):
-        """批量质量检测"""
-        results = []
+    def save_reports(result_id, reports):
+        """
+        批量写入 QualityReport（多行 INSERT，按批提交），写入后回填各报告对象的 id
+
+        报告对象本身不加入会话，调用方负责提交事务。
+        """
+        if not reports:
+            return reports
+        columns = ['result_id', 'rule_name', 'rule_type', 'field_name', 'passed_count', 'failed_count', 'error_details']
+        for report in reports:
+            report.result_id = result_id
+        mappings = [{column: getattr(report, column) for column in columns} for report in reports]
+        for start in range(0, len(mappings), QualityService.REPORT_INSERT_BATCH):
+            db.session.bulk_insert_mappings(QualityReport, mappings[start:start + QualityService.REPORT_INSERT_BATCH])
         
-        for table_name in tables:
-            try:
-                fields = fields_map.get(table_name) if fields_map else None
-                result = QualityService.run_quality_check(
-                    rule_library_id, version_id, db_config, table_name, fields, created_by
-                )
-                results.append(result)
-            except Exception as e:
-                # 记录错误但继续处理其他表
-                results.append({
-                    'table_name': table_name,
-                    'error': str(e),
-                    'status': 'failed'
+        # 按插入顺序取回自增 ID
+        ids = [row[0] for row in db.session.query(QualityReport.id).filter(
+            QualityReport.result_id == result_id
+        ).order_by(QualityReport.id).all()]
+        for report, report_id in zip(reports, ids[-len(reports):]):
+            report.id = report_id
+        return reports
+
+    # 失败记录批量写入的批大小
+    FAILED_RECORD_INSERT_BATCH = 5000
+
+    @staticmethod
+    def _store_failed_records(result, reports):
+        """把各规则的逐行错误详情批量写入 quality_failed_records（全局错误不写入）"""
+        import math
+
+        batch = []
+        stored = 0
+        for report in reports:
+            if report.failed_count <= 0:
+                continue
+            for error in report.get_error_details():
+                row = error.get('row')
+                if row is None:
+                    continue
+                if error.get('status', '不合格') != '不合格':
+                    # 文本质检中“检查失败”（未能完成检查）的记录不是数据失败
+                    continue
+                is_int_row = isinstance(row, int) and not isinstance(row, bool)
+                value = error.get('value')
+                value_num = None
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                    value_num = float(value)
+                depth = error.get('depth')
+                if not isinstance(depth, (int, float)) or isinstance(depth, bool) or not math.isfinite(depth):
+                    depth = None
+                batch.append({
+                    'result_id': result.id,
+                    'report_id': report.id,
+                    'rule_name': report.rule_name,
+                    'rule_type': report.rule_type,
+                    'field_name': report.field_name,
+                    'row_number': row if is_int_row else None,
+                    'row_key': None if is_int_row else str(row)[:255],
+                    'value_num': value_num,
+                    'value_text': None if value is None else str(value)[:255],
+                    'depth': depth,
+                    'message': error.get('message', '')
                 })
+                if len(batch) >= QualityService.FAILED_RECORD_INSERT_BATCH:
+                    db.session.bulk_insert_mappings(QualityFailedRecord, batch)
+                    stored += len(batch)
+                    batch = []
+        if batch:
+            db.session.bulk_insert_mappings(QualityFailedRecord, batch)
+            stored += len(batch)
+        if stored:
+            print(f"失败记录已写入索引表: {stored} 条")
+        return stored
+
+    @staticmethod
+    def query_failed_records(result_id, page=1, page_size=10, rule_name=None, field_name=None, value_min=None, value_max=None):
+        """
+        分页查询失败记录
+
+        Args:
+            rule_name / field_name: 按规则、字段筛选
+            value_min / value_max: 按数值取值范围筛选（只匹配数值型取值）
+
+        Returns:
+            dict: {'records', 'total', 'page', 'page_size'}
+        """
+        result = QualityResult.query.get(result_id)
+        if not result:
+            raise ValueError("质量检测结果不存在")
         
-        return results
-    
+        query = QualityFailedRecord.query.filter(QualityFailedRecord.result_id == result_id)
+        if rule_name:
+            query = query.filter(QualityFailedRecord.rule_name == rule_name)
+        if field_name:
+            query = query.filter(QualityFailedRecord.field_name == field_name)
+        if value_min is not None:
+            query = query.filter(QualityFailedRecord.value_num >= value_min)
+        if value_max is not None:
+            query = query.filter(QualityFailedRecord.value_num <= value_max)
+        
+        total = query.order_by(None).count()
+        if rule_name:
+            ordered = query.order_by(QualityFailedRecord.row_number, QualityFailedRecord.row_key, QualityFailedRecord.id)
+        else:
+            ordered = query.order_by(
+                QualityFailedRecord.rule_name, QualityFailedRecord.row_number, QualityFailedRecord.row_key, QualityFailedRecord.id
+            )
+        records = ordered.offset((page - 1) * page_size).limit(page_size).all()
+        
+        check_date = result.created_at.strftime('%Y-%m-%d %H:%M:%S') if result.created_at else ''
+        return {
+            'records': [record.to_dict(check_date) for record in records],
+            'total': total,
+            'page': page,
+            'page_size': page_size
+        }
+
+    # 批量检测时同一数据源同时执行的表数（避免压垮生产库）
+    BATCH_MAX_CONCURRENCY_PER_SOURCE = 4
+    # 批量检测验证进程池大小
+    VALIDATION_POOL_SIZE = min(4, os.cpu_count() or 1)
+    # 行数达到该值时才把验证交给进程池（数据传输有开销）
+    PROCESS_POOL_MIN_ROWS = 100000
+
+    _source_slots = {}
+    _validation_pool = None
+    _batch_lock = threading.Lock()
+
     @staticmethod
-    def get_quality_statistics(rule_library_id=None, days=30):
-        """获取质量检测统计信息"""
-        from datetime import datetime, timedelta
+    def _source_semaphore(db_config):
+        """按数据源共享的并发槽位（跨批量任务生效）"""
+        key = EngineRegistry.connection_identity(db_config)
+        with QualityService._batch_lock:
+            semaphore = QualityService._source_slots.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(QualityService.BATCH_MAX_CONCURRENCY_PER_SOURCE)
+                QualityService._source_slots[key] = semaphore
+            return semaphore
+
+    @staticmethod
+    def _get_validation_pool():
+        """验证进程池（spawn 方式启动，避免在多线程进程中 fork）"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
         
-        start_date = datetime.utcnow() - timedelta(days=days)
+        with QualityService._batch_lock:
+            pool = QualityService._validation_pool
+            if pool is None or getattr(pool, '_broken', False):
+                pool = ProcessPoolExecutor(
+                    max_workers=QualityService.VALIDATION_POOL_SIZE,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                QualityService._validation_pool = pool
+            return pool
+
+    @staticmethod
+    def batch_quality_check(rule_library_id, version_id, db_config, tables, fields_map=None, created_by="", progress=None, on_result=None):
+        """
+        批量质量检测
+
+        各表并发执行，同一数据源同时执行的表数不超过 BATCH_MAX_CONCURRENCY_PER_SOURCE；
+        内存验证交给进程池执行。
+
+        Args:
+            progress: 可选进度回调 progress(phase, rows=None, table=None, table_index=None, table_count=None)，
+                      可能从多个线程调用
+            on_result: 可选回调 on_result(table_index, result)，每张表完成（成功或失败）时立即调用
+
+        Returns:
+            list: 与 tables 顺序一致的结果列表
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from flask import current_app
         
-        query = QualityResult.query.filter(QualityResult.created_at >= start_date)
+        if not tables:
+            return []
         
-        if rule_library_id:
-            query = query.filter_by(rule_library_id=rule_library_id)
+        app = current_app._get_current_object()
+        semaphore = QualityService._source_semaphore(db_config)
+        validation_pool = QualityService._get_validation_pool()
         
-        results = query.all()
+        def check_table(table_index, table_name):
+            with app.app_context():
+                try:
+                    fields = fields_map.get(table_name) if fields_map else None
+                    table_progress = None
+                    if progress:
+                        table_progress = lambda phase, rows=None: progress(
+                            phase, rows=rows, table=table_name, table_index=table_index, table_count=len(tables)
+                        )
+                    with semaphore:
+                        return QualityService.run_quality_check(
+                            rule_library_id, version_id, db_config, table_name, fields, created_by,
+                            progress=table_progress, validation_pool=validation_pool
+                        )
+                except Exception as e:
+                    # 记录错误但继续处理其他表
+                    return {
+                        'table_name': table_name,
+                        'error': str(e),
+                        'status': 'failed'
+                    }
+                finally:
+                    db.session.remove()
         
-        if not results:
-            return {
-                'total_checks': 0,
-                'avg_pass_rate': 0,
-                'avg_execution_time': 0,
-                'total_records_checked': 0
+        results = [None] * len(tables)
+        max_workers = min(len(tables), QualityService.BATCH_MAX_CONCURRENCY_PER_SOURCE)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quality-batch') as executor:
+            futures = {
+                executor.submit(check_table, table_index, table_name): table_index
+                for table_index, table_name in enumerate(tables)
             }
+            for future in as_completed(futures):
+                table_index = futures[future]
+                results[table_index] = future.result()
+                status = '失败' if results[table_index].get('status') == 'failed' else '完成'
+                print(f"批量质量检测：{tables[table_index]} {status}（{sum(r is not None for r in results)}/{len(tables)}）")
+                if on_result:
+                    on_result(table_index, results[table_index])
         
-        total_checks = len(results)
-        avg_pass_rate = sum(r.pass_rate for r in results) / total_checks
-        avg_execution_time = sum(r.execution_time for r in results) / total_checks
-        total_records_checked = sum(r.total_records for r in results)
+        return results
+    
+    @staticmethod
+    def get_quality_statistics(rule_library_id=None, days=30):
+        """获取质量检测统计信息（一条聚合 SQL，结果短时缓存，写入检测结果后失效）"""
+        from app.services.dashboard_service import DashboardService
         
-        return {
-            'total_checks': total_checks,
-            'avg_pass_rate': avg_pass_rate,
-            'avg_execution_time': avg_execution_time,
-            'total_records_checked': total_records_checked
-        }
+        return DashboardService.get_quality_statistics(rule_library_id, days)
     
     @staticmethod
     def get_anomaly_data(result_id=None, limit=100):
@@ -469,6 +1178,7 @@ class QualityService:
                     raise ValueError(f"找不到数据源配置: {result.data_source}")
                 
                 db_config = {
+                    'id': data_source.id,
                     'db_type': data_source.db_type,
                     'host': data_source.host,
                     'port': data_source.port,
@@ -478,7 +1188,7 @@ class QualityService:
                     'password': data_source.password
                 }
                 
-                engine = DatabaseService.get_connection_string(db_config, 'utf8')
+                engine = DatabaseService.get_engine(db_config, 'utf8')
                 
                 # 构建查询，获取包含异常的记录
                 fields = [report.field_name for report in failed_reports]
@@ -543,6 +1253,8 @@ class QualityService:
                 except Exception as e:
                     print(f"删除报告文件失败: {e}")
                     
+            QualityFailedRecord.query.filter_by(result_id=result_id).delete(synchronize_session=False)
+            QualityResultFingerprint.query.filter_by(result_id=result_id).delete(synchronize_session=False)
             QualityReport.query.filter_by(result_id=result_id).delete()
             db.session.delete(result)
             db.session.commit()
@@ -565,6 +1277,9 @@ class QualityService:
                 print(f"使用预生成的全量报告: {result.report_file_path}")
                 return result.report_file_path
             
+            if result_id in QualityService._pending_reports:
+                raise ValueError("全量报告正在后台生成，请稍后重试")
+            
             # 2. 如果没有文件，提示用户重新运行
             # 这是因为旧数据的实时查询极其不稳定（如前所述的编码问题）
             raise ValueError("该记录未生成全量报告文件（可能是旧版本数据），请点击界面上的“开始检测”按钮重新运行一次即可生成。")
@@ -0,0 +1,100 @@
+"""
+带后台刷新的进程内 TTL 缓存
+
+用于下拉框取值、元数据等“读多写少且允许短暂陈旧”的查询结果：
+- 未过期：直接返回缓存值
+- 已过期但未超过最大陈旧时间：立即返回旧值，同时在后台线程刷新
+- 超过最大陈旧时间或不存在：同步加载
+"""
+import threading
+import time
+
+
+class RefreshingCache:
+    """TTL 缓存（线程安全，过期后后台刷新）"""
+
+    def __init__(self, name, ttl=600, max_stale=3600, max_entries=2000):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.RLock()
+
+    def get(self, key, loader, info=None):
+        """
+        获取缓存值，必要时调用 loader() 加载
+
+        Args:
+            key: 缓存键（元组，第一个元素为数据源标识，便于按数据源失效）
+            loader: 无参加载函数
+            info: 可选 dict，写入 cache_hit / stale / age 等信息
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry['loaded_at']
+                if age <= max(self.ttl, self.max_stale):
+                    entry['last_access'] = now
+                    stale = age > self.ttl
+                    if stale:
+                        self._schedule_refresh(key, loader)
+                    if info is not None:
+                        info.update({'cache_hit': True, 'stale': stale, 'age': round(age, 1)})
+                    return entry['value']
+
+        value = loader()
+        self.put(key, value)
+        if info is not None:
+            info.update({'cache_hit': False, 'stale': False, 'age': 0})
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {'value': value, 'loaded_at': now, 'last_access': now}
+            if len(self._entries) > self.max_entries:
+                ordered = sorted(self._entries.items(), key=lambda item: item[1]['last_access'])
+                for old_key, _ in ordered[:len(self._entries) - self.max_entries]:
+                    self._entries.pop(old_key, None)
+
+    def _schedule_refresh(self, key, loader):
+        """启动后台刷新（同一键同时只刷新一次，调用方持有锁）"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.put(key, loader())
+            except Exception as e:
+                print(f"{self.name} 后台刷新失败: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"{self.name}-refresh", daemon=True).start()
+
+    def invalidate(self, predicate=None):
+        """失效缓存（不指定条件时清空全部）"""
+        with self._lock:
+            targets = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in targets:
+                self._entries.pop(key, None)
+        return len(targets)
+
+    def invalidate_source(self, source_id=None, identities=None):
+        """失效指定数据源的缓存项（键的第一个元素为 (数据源ID, 连接标识)）"""
+        identities = set(identities or [])
+        return self.invalidate(
+            lambda key: (source_id is not None and key[0][0] == str(source_id)) or key[0][1] in identities
+        )
+
+    @staticmethod
+    def source_key(db_config):
+        """数据源部分的缓存键"""
+        from app.services.engine_registry import EngineRegistry
+        source_id = db_config.get('id') or db_config.get('data_source_id')
+        return (str(source_id) if source_id else None, EngineRegistry.connection_identity(db_config))
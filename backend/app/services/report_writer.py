@@ -0,0 +1,186 @@
+"""
+质检全量报告的流式写出
+
+按块写出“质检状态 / 异常详情 + 原始数据”，不复制整个 DataFrame：
+- xlsx：xlsxwriter constant_memory 模式逐行写出，超过单表行数上限时自动换到新工作表
+- csv：逐块追加
+- parquet：pyarrow ParquetWriter 逐块写出
+
+xlsxwriter / pyarrow 未安装时回退为 csv。
+"""
+import datetime
+import decimal
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class QualityReportWriter:
+    """质检报告流式写出"""
+
+    FORMATS = ('xlsx', 'csv', 'parquet')
+    CHUNK_SIZE = 50000
+    # Excel 单个工作表最多 1048576 行（含表头）
+    EXCEL_MAX_ROWS = 1048575
+
+    STATUS_COLUMN = '质检状态'
+    DETAIL_COLUMN = '异常详情'
+
+    @staticmethod
+    def resolve_format(report_format):
+        """检查格式是否可用，依赖未安装时回退为 csv"""
+        report_format = (report_format or 'xlsx').lower()
+        if report_format not in QualityReportWriter.FORMATS:
+            raise ValueError(f"不支持的报告格式: {report_format}")
+        try:
+            if report_format == 'xlsx':
+                import xlsxwriter  # noqa: F401
+            elif report_format == 'parquet':
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            print(f"报告格式 {report_format} 的依赖未安装，改为输出 csv")
+            return 'csv'
+        return report_format
+
+    @staticmethod
+    def iter_chunks(df, failed_mask, row_errors, failed_only=False, chunk_size=None):
+        """
+        逐块生成带状态列的报告数据
+
+        Args:
+            failed_mask: 与 df 行位置对齐的布尔数组
+            row_errors: {行索引标签: [错误信息]}
+            failed_only: 只输出失败行
+        """
+        chunk_size = chunk_size or QualityReportWriter.CHUNK_SIZE
+        positions = np.flatnonzero(failed_mask) if failed_only else None
+        total = len(positions) if failed_only else len(df)
+
+        for start in range(0, total, chunk_size):
+            if failed_only:
+                chunk_positions = positions[start:start + chunk_size]
+                chunk = df.iloc[chunk_positions]
+                chunk_failed = np.ones(len(chunk_positions), dtype=bool)
+            else:
+                chunk = df.iloc[start:start + chunk_size]
+                chunk_failed = failed_mask[start:start + chunk_size]
+            details = [' ; '.join(row_errors.get(label, [])) for label in chunk.index]
+            chunk = chunk.reset_index(drop=True)
+            chunk.insert(0, QualityReportWriter.DETAIL_COLUMN, details)
+            chunk.insert(0, QualityReportWriter.STATUS_COLUMN, np.where(chunk_failed, '异常', '正常'))
+            yield chunk
+
+    @staticmethod
+    def write(df, failed_mask, row_errors, path_base, report_format='xlsx', failed_only=False, chunk_size=None):
+        """
+        写出报告
+
+        Args:
+            path_base: 不含扩展名的输出路径
+
+        Returns:
+            tuple: (文件路径, 写出行数)
+        """
+        report_format = QualityReportWriter.resolve_format(report_format)
+        file_path = f"{path_base}.{report_format}"
+        temp_path = f"{file_path}.part"
+        chunks = QualityReportWriter.iter_chunks(df, failed_mask, row_errors, failed_only, chunk_size)
+        columns = [QualityReportWriter.STATUS_COLUMN, QualityReportWriter.DETAIL_COLUMN] + [str(col) for col in df.columns]
+
+        try:
+            if report_format == 'xlsx':
+                rows = QualityReportWriter._write_xlsx(chunks, columns, temp_path)
+            elif report_format == 'parquet':
+                rows = QualityReportWriter._write_parquet(chunks, columns, temp_path)
+            else:
+                rows = QualityReportWriter._write_csv(chunks, columns, temp_path)
+            os.replace(temp_path, file_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path, rows
+
+    @staticmethod
+    def _write_csv(chunks, columns, path):
+        rows = 0
+        with open(path, 'w', encoding='utf-8-sig', newline='') as report_file:
+            report_file.write(pd.DataFrame(columns=columns).to_csv(index=False))
+            for chunk in chunks:
+                chunk.to_csv(report_file, header=False, index=False)
+                rows += len(chunk)
+        return rows
+
+    @staticmethod
+    def _write_parquet(chunks, columns, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = 0
+        writer = None
+        try:
+            for chunk in chunks:
+                chunk.columns = columns
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    # 后续块的类型推断可能与首块不同，按首块 schema 对齐
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+            if writer is None:
+                pq.write_table(pa.Table.from_pandas(pd.DataFrame(columns=columns), preserve_index=False), path)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    @staticmethod
+    def _excel_value(value):
+        """转换为 xlsxwriter 可写入的值（空值写空单元格）"""
+        if value is None or value is pd.NaT:
+            return None
+        if isinstance(value, float):
+            return None if (np.isnan(value) or np.isinf(value)) else value
+        if isinstance(value, pd.Timestamp):
+            return value.to_pydatetime().replace(tzinfo=None)
+        if isinstance(value, datetime.datetime):
+            return value.replace(tzinfo=None)
+        if isinstance(value, (str, int, bool, datetime.date)):
+            return value
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        return str(value)
+
+    @staticmethod
+    def _write_xlsx(chunks, columns, path):
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(path, {
+            'constant_memory': True,
+            'strings_to_numbers': False,
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss'
+        })
+        rows = 0
+        try:
+            worksheet = None
+            sheet_row = 0
+            for chunk in chunks:
+                for values in chunk.itertuples(index=False, name=None):
+                    if worksheet is None or sheet_row > QualityReportWriter.EXCEL_MAX_ROWS:
+                        worksheet = workbook.add_worksheet()
+                        worksheet.write_row(0, 0, columns)
+                        sheet_row = 1
+                    worksheet.write_row(sheet_row, 0, [QualityReportWriter._excel_value(v) for v in values])
+                    sheet_row += 1
+                    rows += 1
+            if worksheet is None:
+                workbook.add_worksheet().write_row(0, 0, columns)
+        finally:
+            workbook.close()
+        return rows
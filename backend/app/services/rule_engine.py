@@ -0,0 +1,595 @@
+"""
+向量化规则验证引擎
+
+每种规则类型都计算为 NumPy 布尔掩码，失败行以整数数组返回；
+可读的错误信息只在需要展示或导出时按失败行构建。
+验证结果与 RuleService 逐行验证的实现保持一致。
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class RuleEvaluation:
+    """单条规则的验证结果（失败行位置 + 按需构建的错误详情）"""
+
+    def __init__(self, total_count, failed_indices, detail_builder=None, global_details=None, failed_positions=None):
+        """
+        Args:
+            total_count: 参与验证的总行数
+            failed_indices: 失败行号（整数数组）
+            detail_builder: detail_builder(rows) -> 错误详情列表，rows 为 failed_indices 的前缀
+            global_details: 与具体行无关的错误详情（如字段不存在）
+            failed_positions: 失败行在数据中的位置，行号不是位置（沿用索引标签）时传入
+        """
+        self.total_count = total_count
+        self.failed_indices = np.asarray(failed_indices, dtype=np.int64)
+        self.failed_positions = (
+            self.failed_indices if failed_positions is None else np.asarray(failed_positions, dtype=np.int64)
+        )
+        self._detail_builder = detail_builder
+        self._global_details = global_details
+        self._all_details = None
+
+    @property
+    def failed_count(self):
+        return int(len(self.failed_indices))
+
+    @property
+    def passed_count(self):
+        return self.total_count - self.failed_count
+
+    def details(self, limit=None):
+        """构建前 limit 条失败行的错误详情（不指定时构建全部，构建结果会被缓存）"""
+        if self._global_details is not None:
+            return list(self._global_details[:limit] if limit is not None else self._global_details)
+        if self._detail_builder is None or self.failed_count == 0:
+            return []
+        if self._all_details is not None:
+            return list(self._all_details[:limit] if limit is not None else self._all_details)
+        if limit is not None and limit < self.failed_count:
+            return self._detail_builder(self.failed_indices[:limit])
+        self._all_details = self._detail_builder(self.failed_indices)
+        return list(self._all_details)
+
+    def row_messages(self, limit=None):
+        """返回 [(行位置, 错误信息)]，只包含有行号的错误"""
+        return [
+            (detail['row'], detail.get('message', '验证失败'))
+            for detail in self.details(limit)
+            if detail.get('row') is not None
+        ]
+
+    def to_result(self):
+        """转换为 validate_rule_detailed 的返回格式"""
+        return {
+            'passed_count': self.passed_count,
+            'failed_count': self.failed_count,
+            'failed_indices': self.failed_indices.tolist(),
+            'error_details': self.details()
+        }
+
+
+class ColumnCache:
+    """单次评估内的列数据缓存，同一列在多条规则间只提取一次"""
+
+    def __init__(self, data):
+        self.data = data
+        self._non_null = {}
+        self._row_values = {}
+        self._row_dtype = None
+
+    def non_null(self, field):
+        """返回 (非空位置, 非空值数组)"""
+        if field not in self._non_null:
+            values = self.data[field].to_numpy()
+            mask = ~pd.isna(values)
+            self._non_null[field] = (np.flatnonzero(mask), values[mask])
+        return self._non_null[field]
+
+    def row_values(self, field, scalar_boxing=True):
+        """
+        按整行取值时的字段值数组
+
+        逐行实现按整行取值，整行会被转换为所有列的公共类型，这里保持相同的取值类型，
+        保证比较结果与错误信息一致。混合类型（object）的整行中：
+        data.iloc[idx] 得到 NumPy 标量（scalar_boxing=True），
+        data.iterrows() 得到 Python 标量（scalar_boxing=False）。
+        """
+        key = (field, scalar_boxing)
+        if key in self._row_values:
+            return self._row_values[key]
+        if self._row_dtype is None:
+            self._row_dtype = self.data.iloc[:0].to_numpy().dtype
+        row_dtype = self._row_dtype
+        series = self.data[field]
+        if series.dtype == row_dtype:
+            values = series.to_numpy()
+        elif scalar_boxing and row_dtype == object and isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+            values = np.empty(len(series), dtype=object)
+            values[:] = list(series.to_numpy())
+        else:
+            values = series.astype(row_dtype).to_numpy()
+        self._row_values[key] = values
+        return values
+
+
+class RuleEngine:
+    """向量化规则验证"""
+
+    RANGE_RULE_TYPES = ['range', 'range_2sigma', 'range_percentile']
+    OUTLIER_RULE_TYPES = ['outlier', 'outlier_3sigma', 'outlier_iqr', 'outlier_zscore']
+
+    OPERATOR_DESC = {
+        '>': '大于',
+        '<': '小于',
+        '>=': '大于等于',
+        '<=': '小于等于',
+        '==': '等于',
+        '!=': '不等于'
+    }
+
+    @staticmethod
+    def evaluate(rule, data, columns=None, depth_index=None):
+        """
+        验证单条规则
+
+        Args:
+            columns: ColumnCache，规则集评估时在多条规则间共享列数据
+            depth_index: 预编译的 DepthIntervalIndex（深度区间规则）
+
+        Returns:
+            RuleEvaluation
+        """
+        field = rule['field']
+        rule_type = rule['rule_type']
+        total = len(data)
+        columns = columns or ColumnCache(data)
+
+        # 字段比较规则不需要检查field，因为它使用field1和field2
+        if rule_type != 'field_comparison' and field not in data.columns:
+            return RuleEngine._all_failed(total, f"字段 {field} 不存在")
+
+        if rule_type in RuleEngine.RANGE_RULE_TYPES:
+            return RuleEngine._evaluate_range(rule, data, columns)
+        if rule_type in RuleEngine.OUTLIER_RULE_TYPES:
+            return RuleEngine._evaluate_outlier(rule, data, columns)
+        if rule_type == 'depth_interval_stats':
+            return RuleEngine._evaluate_depth_interval(rule, data, columns, depth_index)
+        if rule_type == 'frequency_analysis':
+            return RuleEngine._evaluate_frequency(rule, data, columns)
+        if rule_type == 'field_comparison':
+            return RuleEngine._evaluate_field_comparison(rule, data, columns)
+
+        # 不支持的规则类型不产生失败
+        return RuleEvaluation(total, np.empty(0, dtype=np.int64))
+
+    @staticmethod
+    def compile(rules):
+        """编译规则集（按列分组、合并相同检查），返回 CompiledRuleSet"""
+        return CompiledRuleSet(rules)
+
+    @staticmethod
+    def evaluate_detached(rules, data):
+        """
+        评估规则集并展开为可序列化的结果（用于在进程池中执行）
+
+        Returns:
+            dict: {'failed_rows': [行号], 'row_errors': {行号: [...]}, 'rule_results': [(通过数, 失败数, 错误详情)]}
+        """
+        return RuleEngine.compile(rules).evaluate(data).detach()
+
+    @staticmethod
+    def _all_failed(total, message):
+        """全部行失败，错误详情只有一条全局信息"""
+        return RuleEvaluation(total, np.arange(total), global_details=[{'message': message}])
+
+    @staticmethod
+    def _all_failed_per_row(total, message):
+        """全部行失败，每行一条错误详情"""
+        return RuleEvaluation(
+            total, np.arange(total),
+            detail_builder=lambda positions: [{'row': int(pos), 'message': message} for pos in positions]
+        )
+
+    @staticmethod
+    def _evaluate_range(rule, data, columns):
+        """范围规则：小于下界或大于上界"""
+        field = rule['field']
+        params = rule['params']
+        lower_bound = params.get('lower_bound')
+        upper_bound = params.get('upper_bound')
+        series = data[field]
+
+        positions, values = columns.non_null(field)
+        below = np.asarray(values < lower_bound, dtype=bool) if lower_bound is not None else np.zeros(len(values), dtype=bool)
+        above = np.asarray(values > upper_bound, dtype=bool) if upper_bound is not None else np.zeros(len(values), dtype=bool)
+        failed = positions[below | above]
+
+        def build(failed_positions):
+            details = []
+            for pos, value in zip(failed_positions, series.iloc[failed_positions].tolist()):
+                if lower_bound is not None and value < lower_bound:
+                    message = f"值 {value} 小于下界 {lower_bound}"
+                else:
+                    message = f"值 {value} 大于上界 {upper_bound}"
+                details.append({'row': int(pos), 'value': value, 'message': message})
+            return details
+
+        return RuleEvaluation(len(data), failed, build)
+
+    @staticmethod
+    def _evaluate_outlier(rule, data, columns):
+        """异常值规则：超出 [lower_bound, upper_bound]"""
+        field = rule['field']
+        params = rule['params']
+        method = params.get('method')
+        lower_bound = params.get('lower_bound')
+        upper_bound = params.get('upper_bound')
+        series = data[field]
+
+        positions, values = columns.non_null(field)
+        if len(values) > 0:
+            # 与逐行的短路判断一致：低于下界的值不再与上界比较
+            outside = np.asarray(values < lower_bound, dtype=bool)
+            rest = ~outside
+            outside[rest] = np.asarray(values[rest] > upper_bound, dtype=bool)
+            failed = positions[outside]
+        else:
+            failed = positions
+
+        def build(failed_positions):
+            return [
+                {
+                    'row': int(pos),
+                    'value': value,
+                    'message': f"字段 {field} 值 {value} 为异常值（{method}方法）"
+                }
+                for pos, value in zip(failed_positions, series.iloc[failed_positions].tolist())
+            ]
+
+        return RuleEvaluation(len(data), failed, build)
+
+    @staticmethod
+    def compile_depth_intervals(rule):
+        """将深度区间规则编译为 DepthIntervalIndex（每个区间的上下界只计算一次）"""
+        return DepthIntervalIndex(rule['field'], rule['params'].get('intervals', []))
+
+    @staticmethod
+    def _evaluate_depth_interval(rule, data, columns, index=None):
+        """
+        深度区间规则：按深度把每行分配到区间，检查字段值是否在该区间的合理范围内
+
+        Args:
+            index: 预编译的 DepthIntervalIndex，不传时现场编译
+        """
+        field = rule['field']
+        params = rule['params']
+        depth_field = params.get('depth_field')
+        intervals = params.get('intervals', [])
+        total = len(data)
+
+        if not depth_field or depth_field not in data.columns:
+            # 如果深度字段不存在，所有记录都标记为失败
+            return RuleEngine._all_failed_per_row(total, f"深度字段 {depth_field} 不存在")
+        if not intervals:
+            # 如果没有区间信息，所有记录都标记为失败
+            return RuleEngine._all_failed_per_row(total, "深度区间统计信息为空")
+
+        index = index or RuleEngine.compile_depth_intervals(rule)
+
+        # 与逐行实现（iterrows）取值类型一致
+        values = columns.row_values(field, scalar_boxing=False)
+        depths = columns.row_values(depth_field, scalar_boxing=False)
+        valid = ~(pd.isna(values) | pd.isna(depths))
+        positions = np.flatnonzero(valid)
+
+        assigned = index.assign(depths[valid].astype(float))
+        matched = assigned >= 0
+        failed_mask = ~matched
+        if matched.any():
+            matched_intervals = assigned[matched]
+            index.check_bounds(matched_intervals)
+            field_values = values[valid][matched].astype(float)
+            in_range = (index.lowers[matched_intervals] <= field_values) & (field_values <= index.uppers[matched_intervals])
+            failed_mask[matched] = ~in_range
+
+        failed = positions[failed_mask]
+        failed_intervals = assigned[failed_mask]
+
+        # 失败行号沿用行索引标签（与 iterrows 一致）
+        if pd.api.types.is_integer_dtype(data.index.dtype):
+            failed_rows = data.index.to_numpy()[failed]
+        else:
+            failed_rows = failed
+
+        def build(failed_row_labels):
+            # details(limit) 总是取失败行的前缀，按位置对齐区间分配结果
+            count = len(failed_row_labels)
+            details = []
+            for row, pos, k in zip(failed_row_labels, failed[:count], failed_intervals[:count]):
+                depth_value = depths[pos]
+                field_value = values[pos]
+                if k < 0:
+                    message = f"深度值{depth_value}不在任何统计区间范围内"
+                else:
+                    start_depth, end_depth = index.raw_bounds[k]
+                    message = (
+                        f"在深度{start_depth}-{end_depth}m区间内，{field}值{field_value}超出合理范围"
+                        f"[{index.lowers[k]:.2f}, {index.uppers[k]:.2f}]（使用{index.methods[k]}方法）"
+                    )
+                details.append({'row': int(row), 'depth': depth_value, 'value': field_value, 'message': message})
+            return details
+
+        return RuleEvaluation(total, failed_rows, build, failed_positions=failed)
+
+    @staticmethod
+    def _evaluate_frequency(rule, data, columns):
+        """频率分析规则：取值（字符串形式）不在期望值列表中"""
+        field = rule['field']
+        value_distribution = rule['params'].get('value_distribution', [])
+
+        if not value_distribution:
+            return RuleEngine._all_failed_per_row(len(data), "频率分析信息为空")
+
+        expected_values = [item['value'] for item in value_distribution]
+        expected_set = set(expected_values)
+        series = data[field]
+
+        mask = series.notna().to_numpy()
+        positions = np.flatnonzero(mask)
+        as_text = series[mask].map(str)
+        failed = positions[~as_text.isin(expected_set).to_numpy()]
+
+        def build(failed_positions):
+            expected_text = str(expected_values)
+            return [
+                {
+                    'row': int(pos),
+                    'value': value,
+                    'message': f"值 '{value}' 不在期望的值列表中: {expected_text}"
+                }
+                for pos, value in zip(failed_positions, series.iloc[failed_positions].tolist())
+            ]
+
+        return RuleEvaluation(len(data), failed, build)
+
+    @staticmethod
+    def _compare(operator, left, right):
+        if operator == '>':
+            return left > right
+        if operator == '<':
+            return left < right
+        if operator == '>=':
+            return left >= right
+        if operator == '<=':
+            return left <= right
+        if operator == '==':
+            return left == right
+        if operator == '!=':
+            return left != right
+        return False
+
+    @staticmethod
+    def _evaluate_field_comparison(rule, data, columns):
+        """字段比较规则：field1 operator field2"""
+        params = rule['params']
+        field1 = params.get('field1')
+        field2 = params.get('field2')
+        operator = params.get('operator')  # '>', '<', '>=', '<=', '==', '!='
+        total = len(data)
+
+        # 检查字段是否存在
+        if field1 not in data.columns:
+            return RuleEngine._all_failed(total, f"字段 {field1} 不存在")
+        if field2 not in data.columns:
+            return RuleEngine._all_failed(total, f"字段 {field2} 不存在")
+
+        values1 = columns.row_values(field1)
+        values2 = columns.row_values(field2)
+        mask = ~(pd.isna(values1) | pd.isna(values2))
+        positions = np.flatnonzero(mask)
+        operator_desc = RuleEngine.OPERATOR_DESC.get(operator, operator)
+
+        def comparison_detail(pos):
+            value1 = values1[pos]
+            value2 = values2[pos]
+            return {
+                'row': int(pos),
+                'field1': field1,
+                'field2': field2,
+                'value1': value1,
+                'value2': value2,
+                'message': f"字段 {field1} ({value1}) 应{operator_desc}字段 {field2} ({value2})"
+            }
+
+        try:
+            if operator in RuleEngine.OPERATOR_DESC:
+                valid = np.asarray(RuleEngine._compare(operator, values1[mask], values2[mask]), dtype=bool)
+            else:
+                valid = np.zeros(len(positions), dtype=bool)
+        except TypeError:
+            # 类型无法整体比较时逐行比较，比较失败的行单独记录异常信息
+            failed, errors = [], {}
+            for pos in positions:
+                try:
+                    if not RuleEngine._compare(operator, values1[pos], values2[pos]):
+                        failed.append(pos)
+                except Exception as e:
+                    failed.append(pos)
+                    errors[int(pos)] = f"比较失败: {str(e)}"
+
+            def build_with_errors(failed_positions):
+                return [
+                    {'row': int(pos), 'message': errors[int(pos)]} if int(pos) in errors else comparison_detail(pos)
+                    for pos in failed_positions
+                ]
+
+            return RuleEvaluation(total, np.asarray(failed, dtype=np.int64), build_with_errors)
+
+        failed = positions[~valid]
+        return RuleEvaluation(total, failed, lambda failed_positions: [comparison_detail(pos) for pos in failed_positions])
+
+
+class DepthIntervalIndex:
+    """
+    编译后的深度区间
+
+    区间边界排序为数组，每个区间的合理范围预先计算；
+    区间互不重叠时用 searchsorted 一次完成所有行的区间分配，
+    存在重叠时按区间列表顺序取第一个匹配的区间。
+    """
+
+    def __init__(self, field, intervals):
+        from app.services.rule_service import RuleService
+
+        count = len(intervals)
+        self.raw_bounds = [(interval['start_depth'], interval['end_depth']) for interval in intervals]
+        self.starts = np.array([start for start, _ in self.raw_bounds], dtype=float)
+        self.ends = np.array([end for _, end in self.raw_bounds], dtype=float)
+        self.lowers = np.full(count, np.nan)
+        self.uppers = np.full(count, np.nan)
+        self.methods = [None] * count
+        self.errors = {}
+
+        for k, interval in enumerate(intervals):
+            try:
+                lower_bound, upper_bound, method = RuleService._get_geological_parameter_bounds(field, interval)
+                self.lowers[k] = lower_bound
+                self.uppers[k] = upper_bound
+                self.methods[k] = method
+            except Exception as e:
+                # 与逐行实现一致：只有当某行落入该区间时才抛出
+                self.errors[k] = e
+
+        # 空区间（start >= end）不会匹配任何深度
+        usable = np.flatnonzero(self.starts < self.ends)
+        self.order = usable[np.argsort(self.starts[usable], kind='stable')]
+        self.sorted_starts = self.starts[self.order]
+        self.sorted_ends = self.ends[self.order]
+        self.disjoint = bool(np.all(self.sorted_ends[:-1] <= self.sorted_starts[1:]))
+
+    def assign(self, depths):
+        """返回每个深度所属区间在原列表中的下标，不在任何区间时为 -1"""
+        assigned = np.full(len(depths), -1, dtype=np.int64)
+        if len(self.order) == 0 or len(depths) == 0:
+            return assigned
+
+        if self.disjoint:
+            slot = np.searchsorted(self.sorted_starts, depths, side='right') - 1
+            inside = slot >= 0
+            slot_clipped = np.where(inside, slot, 0)
+            inside &= depths < self.sorted_ends[slot_clipped]
+            assigned[inside] = self.order[slot_clipped[inside]]
+            return assigned
+
+        # 区间重叠：倒序覆盖，保证取列表中第一个匹配的区间
+        for k in sorted(self.order.tolist(), reverse=True):
+            assigned[(self.starts[k] <= depths) & (depths < self.ends[k])] = k
+        return assigned
+
+    def check_bounds(self, assigned):
+        """落入无法计算范围的区间时抛出原始异常"""
+        if self.errors:
+            for k in np.unique(assigned).tolist():
+                if k in self.errors:
+                    raise self.errors[k]
+
+
+class CompiledRuleSet:
+    """
+    编译后的规则集
+
+    相同的检查（同一字段、同类规则、相同参数）只计算一次；
+    同一列的数据通过 ColumnCache 在规则间共享，只提取一次；
+    深度区间规则的区间索引在编译时构建，分块评估时复用。
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.check_keys = [self._check_key(rule) for rule in self.rules]
+        self.unique_checks = {}
+        for rule, key in zip(self.rules, self.check_keys):
+            self.unique_checks.setdefault(key, rule)
+
+        self.depth_indexes = {}
+        for key, rule in self.unique_checks.items():
+            if rule.get('rule_type') == 'depth_interval_stats' and (rule.get('params') or {}).get('intervals'):
+                self.depth_indexes[key] = RuleEngine.compile_depth_intervals(rule)
+
+    @staticmethod
+    def _check_key(rule):
+        """检查的去重键：范围类/异常值类规则只比较边界，其余规则比较全部参数"""
+        rule_type = rule.get('rule_type')
+        params = rule.get('params') or {}
+        if rule_type in RuleEngine.RANGE_RULE_TYPES:
+            signature = ['range', params.get('lower_bound'), params.get('upper_bound')]
+        elif rule_type in RuleEngine.OUTLIER_RULE_TYPES:
+            signature = ['outlier', params.get('method'), params.get('lower_bound'), params.get('upper_bound')]
+        else:
+            signature = [rule_type, params]
+        return json.dumps([rule.get('field'), signature], sort_keys=True, ensure_ascii=False, default=str)
+
+    def evaluate(self, data):
+        """
+        一次评估全部规则
+
+        Returns:
+            RuleSetEvaluation
+        """
+        columns = ColumnCache(data)
+        results = {
+            key: RuleEngine.evaluate(rule, data, columns, self.depth_indexes.get(key))
+            for key, rule in self.unique_checks.items()
+        }
+        return RuleSetEvaluation(self.rules, [results[key] for key in self.check_keys], len(data))
+
+
+class RuleSetEvaluation:
+    """规则集评估结果：行 × 规则 的失败位图"""
+
+    def __init__(self, rules, evaluations, total_count):
+        self.rules = rules
+        self.evaluations = evaluations
+        self.total_count = total_count
+        self.bitmap = np.zeros((total_count, len(rules)), dtype=bool)
+        for j, evaluation in enumerate(evaluations):
+            self.bitmap[evaluation.failed_positions, j] = True
+
+    def failed_rows(self):
+        """至少一条规则失败的行位置"""
+        return np.flatnonzero(self.bitmap.any(axis=1))
+
+    def failed_counts(self):
+        """每条规则的失败行数"""
+        return self.bitmap.sum(axis=0)
+
+    def detach(self):
+        """展开为不含闭包的普通结构，可跨进程传递"""
+        return {
+            'failed_rows': self.failed_rows().tolist(),
+            'row_errors': self.row_errors(),
+            'rule_results': [
+                (evaluation.passed_count, evaluation.failed_count, evaluation.details())
+                for evaluation in self.evaluations
+            ]
+        }
+
+    def row_errors(self):
+        """
+        按行归并错误信息
+
+        Returns:
+            dict: {行号: ["[规则名] 错误信息", ...]}，只包含有错误的行
+        """
+        errors = {}
+        for j, (rule, evaluation) in enumerate(zip(self.rules, self.evaluations)):
+            if not self.bitmap[:, j].any():
+                continue
+            rule_name = rule.get('name', rule.get('rule_type', '未知规则'))
+            for row, message in evaluation.row_messages():
+                row = int(row)
+                if 0 <= row < self.total_count:
+                    errors.setdefault(row, []).append(f"[{rule_name}] {message}")
+        return errors
@@ -0,0 +1,238 @@
+"""
+规则检查下推到数据库执行
+
+把规则集编译为每条规则一个失败条件（SQL 布尔表达式），
+在数据库端用一条聚合语句 SUM(CASE WHEN ...) 统计各规则失败数，
+并可通过主键键集分页只拉取失败行的主键，数据扫描全部在数据库端完成。
+
+规则的 validation_sql 模板语义不统一（有的描述通过条件，有的描述失败条件，字段也未加引号），
+因此失败条件由规则的 params 生成，语义与 RuleEngine 的内存验证保持一致。
+"""
+import math
+
+from sqlalchemy import text
+
+from app.services.rule_engine import RuleEngine
+
+
+class RulePushdown:
+    """规则检查 SQL 下推"""
+
+    SUPPORTED_RULE_TYPES = (
+        RuleEngine.RANGE_RULE_TYPES
+        + RuleEngine.OUTLIER_RULE_TYPES
+        + ['field_comparison', 'frequency_analysis', 'depth_interval_stats']
+    )
+
+    SQL_OPERATORS = {'>': '>', '<': '<', '>=': '>=', '<=': '<=', '==': '=', '!=': '<>'}
+
+    # 失败主键分页大小
+    KEY_PAGE_SIZE = 10000
+
+    @staticmethod
+    def supports(rule):
+        return rule.get('rule_type') in RulePushdown.SUPPORTED_RULE_TYPES
+
+    @staticmethod
+    def _value_expr(field, kind, null_as_zero):
+        """
+        字段取值表达式
+
+        null_as_zero=True 时与内存检测前的 fillna(0) 一致，空值按 0 参与判断。
+        """
+        from app.services.database_service import DatabaseService
+
+        quoted = DatabaseService.quote_identifier(field)
+        if not null_as_zero:
+            return quoted
+        if kind in ('int', 'float'):
+            return f"COALESCE({quoted}, 0)"
+        if kind == 'bool':
+            return f"COALESCE({quoted}, false)"
+        if kind == 'string':
+            return f"COALESCE({quoted}::text, '0')"
+        return quoted
+
+    @staticmethod
+    def build_conditions(rules, column_types, null_as_zero=True):
+        """
+        为每条规则生成失败条件
+
+        Args:
+            rules: 规则列表
+            column_types: {字段名: PostgreSQL 类型}，只包含参与检测的字段
+            null_as_zero: 空值是否按 0 处理（与内存检测一致）
+
+        Returns:
+            tuple: (条件列表, 绑定参数)。条件为 None 表示该规则不产生失败（如聚类规则）
+        """
+        from app.services.database_service import DatabaseService
+
+        conditions = []
+        params = {}
+
+        def bind(j, name, value):
+            key = f"r{j}_{name}"
+            params[key] = value
+            return f":{key}"
+
+        def expr(field):
+            kind = DatabaseService._classify_pg_type(column_types.get(field))
+            return RulePushdown._value_expr(field, kind, null_as_zero), kind
+
+        for j, rule in enumerate(rules):
+            rule_type = rule.get('rule_type')
+            rule_params = rule.get('params') or {}
+            field = rule.get('field')
+
+            if not RulePushdown.supports(rule):
+                conditions.append(None)
+                continue
+
+            if rule_type != 'field_comparison' and field not in column_types:
+                # 字段不存在：所有行失败
+                conditions.append('TRUE')
+                continue
+
+            if rule_type in RuleEngine.RANGE_RULE_TYPES or rule_type in RuleEngine.OUTLIER_RULE_TYPES:
+                value, _ = expr(field)
+                checks = []
+                if rule_params.get('lower_bound') is not None:
+                    checks.append(f"{value} < {bind(j, 'lo', rule_params['lower_bound'])}")
+                if rule_params.get('upper_bound') is not None:
+                    checks.append(f"{value} > {bind(j, 'hi', rule_params['upper_bound'])}")
+                conditions.append(f"({value} IS NOT NULL AND ({' OR '.join(checks)}))" if checks else None)
+
+            elif rule_type == 'field_comparison':
+                field1 = rule_params.get('field1')
+                field2 = rule_params.get('field2')
+                if field1 not in column_types or field2 not in column_types:
+                    conditions.append('TRUE')
+                    continue
+                value1, _ = expr(field1)
+                value2, _ = expr(field2)
+                not_null = f"{value1} IS NOT NULL AND {value2} IS NOT NULL"
+                operator = RulePushdown.SQL_OPERATORS.get(rule_params.get('operator'))
+                if operator is None:
+                    # 不支持的比较符：所有非空行失败
+                    conditions.append(f"({not_null})")
+                else:
+                    conditions.append(f"({not_null} AND NOT ({value1} {operator} {value2}))")
+
+            elif rule_type == 'frequency_analysis':
+                distribution = rule_params.get('value_distribution') or []
+                if not distribution:
+                    conditions.append('TRUE')
+                    continue
+                value, kind = expr(field)
+                expected = [str(item['value']) for item in distribution]
+                if kind in ('int', 'float'):
+                    # 数值字段按数值比较，避免 1.0 与 '1' 的文本差异
+                    numbers = []
+                    for item in expected:
+                        try:
+                            numbers.append(float(item))
+                        except ValueError:
+                            continue
+                    check = f"{value}::float8 <> ALL(CAST({bind(j, 'vals', numbers)} AS float8[]))"
+                elif kind == 'bool':
+                    flags = [item == 'True' for item in expected if item in ('True', 'False')]
+                    check = f"{value} <> ALL(CAST({bind(j, 'vals', flags)} AS boolean[]))"
+                else:
+                    check = f"{value}::text <> ALL(CAST({bind(j, 'vals', expected)} AS text[]))"
+                conditions.append(f"({value} IS NOT NULL AND {check})")
+
+            elif rule_type == 'depth_interval_stats':
+                depth_field = rule_params.get('depth_field')
+                intervals = rule_params.get('intervals') or []
+                if not depth_field or depth_field not in column_types or not intervals:
+                    conditions.append('TRUE')
+                    continue
+                value, _ = expr(field)
+                depth, _ = expr(depth_field)
+                index = RuleEngine.compile_depth_intervals(rule)
+                branches = []
+                for k, (start_depth, end_depth) in enumerate(index.raw_bounds):
+                    lower, upper = index.lowers[k], index.uppers[k]
+                    in_interval = f"{depth} >= {bind(j, f's{k}', start_depth)} AND {depth} < {bind(j, f'e{k}', end_depth)}"
+                    if k in index.errors or math.isnan(lower) or math.isnan(upper):
+                        branches.append(f"WHEN {in_interval} THEN TRUE")
+                    else:
+                        out_of_range = f"NOT ({value} >= {bind(j, f'lo{k}', float(lower))} AND {value} <= {bind(j, f'hi{k}', float(upper))})"
+                        branches.append(f"WHEN {in_interval} THEN {out_of_range}")
+                # CASE 按区间列表顺序取第一个匹配的区间，不在任何区间内时失败
+                conditions.append(
+                    f"({value} IS NOT NULL AND {depth} IS NOT NULL AND CASE {' '.join(branches)} ELSE TRUE END)"
+                )
+
+        return conditions, params
+
+    @staticmethod
+    def count_failures(engine, source_sql, conditions, params):
+        """
+        一条聚合语句统计总行数、每条规则失败数以及失败行总数
+
+        Args:
+            source_sql: 数据源（表名或带 LIMIT 的子查询）
+
+        Returns:
+            dict: {'total': int, 'rule_failed': [int], 'failed_rows': int}
+        """
+        select_parts = ["COUNT(*)"]
+        for condition in conditions:
+            select_parts.append(f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)" if condition else "0")
+        active = [condition for condition in conditions if condition]
+        any_failed = ' OR '.join(f"COALESCE({condition}, FALSE)" for condition in active) if active else 'FALSE'
+        select_parts.append(f"SUM(CASE WHEN {any_failed} THEN 1 ELSE 0 END)")
+
+        query = f"SELECT {', '.join(select_parts)} FROM {source_sql} AS src"
+        with engine.connect() as conn:
+            row = conn.execute(text(query), params).fetchone()
+
+        return {
+            'total': int(row[0] or 0),
+            'rule_failed': [int(value or 0) for value in row[1:-1]],
+            'failed_rows': int(row[-1] or 0)
+        }
+
+    @staticmethod
+    def iter_failing_keys(engine, source_sql, key_column, conditions, params, page_size=None):
+        """
+        按主键键集分页返回失败行
+
+        Yields:
+            list: [(主键值, [失败规则下标])]
+        """
+        from app.services.database_service import DatabaseService
+
+        page_size = page_size or RulePushdown.KEY_PAGE_SIZE
+        quoted_key = DatabaseService.quote_identifier(key_column)
+        active = [(j, condition) for j, condition in enumerate(conditions) if condition]
+        if not active:
+            return
+
+        flags = ', '.join(f"COALESCE({condition}, FALSE)" for _, condition in active)
+        any_failed = ' OR '.join(f"COALESCE({condition}, FALSE)" for _, condition in active)
+        last_key = None
+
+        with engine.connect() as conn:
+            while True:
+                key_filter = f"AND {quoted_key} > :last_key" if last_key is not None else ""
+                query = f"""
+                    SELECT {quoted_key}, {flags}
+                    FROM {source_sql} AS src
+                    WHERE ({any_failed}) {key_filter}
+                    ORDER BY {quoted_key}
+                    LIMIT {int(page_size)}
+                """
+                page_params = dict(params, last_key=last_key) if last_key is not None else params
+                rows = conn.execute(text(query), page_params).fetchall()
+                if not rows:
+                    break
+                yield [
+                    (row[0], [j for (j, _), failed in zip(active, row[1:]) if failed])
+                    for row in rows
+                ]
+                last_key = rows[-1][0]
+                if len(rows) < page_size:
+                    break
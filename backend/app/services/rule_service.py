@@ -5,6 +5,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans, DBSCAN
 from app.models.rule_model import RuleLibrary, RuleVersion
 from app.services.database_service import DatabaseService
+from app.services.rule_engine import RuleEngine
 from app import db
 import json
 import warnings
@@ -23,7 +24,7 @@ class RuleService:
     """规则服务类 - 基于统计分析的规则生成"""
     
     @staticmethod
-    def generate_rules_from_data(db_config, table_name, fields, rule_type='range', depth_field=None, depth_interval=10, cluster_params=None, outlier_params=None, group_by_field=None, cluster_features=None, manual_ranges=None):
+    def generate_rules_from_data(db_config, table_name, fields, rule_type='range', depth_field=None, depth_interval=10, cluster_params=None, outlier_params=None, group_by_field=None, cluster_features=None, manual_ranges=None, use_snapshot=True, read_info=None):
         """从数据生成规则
         
         Args:
@@ -33,6 +34,8 @@ class RuleService:
             rule_type: 规则类型，默认为'range'
             depth_field: 深度字段名（用于回归型数据分析）
             depth_interval: 深度区间大小（米）
+            use_snapshot: 是否使用本地数据快照缓存
+            read_info: 可选的字典，用于回传数据读取信息（如 cache_hit）
         """
         
         # 如果是手工固定范围型，直接返回对应规则
@@ -85,29 +88,16 @@ class RuleService:
 
         # 获取完整数据用于高级分析
         try:
-            connection_string = DatabaseService.get_connection_string(db_config, 'utf8')
-            engine = DatabaseService.create_engine(connection_string)
-            
             # 构建查询字段列表
             query_fields = fields.copy()
             if depth_field and depth_field not in query_fields:
                 query_fields.append(depth_field)
             
-            # 使用引号包装表名和字段名
-            quoted_table_name = DatabaseService.quote_identifier(table_name)
-            
-            # 构建完整的表名（包含schema）
-            schema = db_config.get('schema', 'public')
-            if schema and schema != 'public':
-                quoted_schema = DatabaseService.quote_identifier(schema)
-                full_table_name = f"{quoted_schema}.{quoted_table_name}"
-            else:
-                full_table_name = quoted_table_name
-            
-            quoted_fields = [DatabaseService.quote_identifier(field) for field in query_fields]
-            field_list = ', '.join(quoted_fields)
-            query = f"SELECT {field_list} FROM {full_table_name}"
-            df = pd.read_sql(query, engine)
+            df, snapshot_info = DatabaseService.read_table_snapshot(
+                db_config, table_name, query_fields, use_cache=use_snapshot
+            )
+            if read_info is not None:
+                read_info.update(snapshot_info)
             
         except Exception as e:
             # 如果无法获取完整数据，回退到基础统计信息
@@ -941,8 +931,7 @@ class RuleService:
         """生成高级规则（基于机器学习模型和统计分析）"""
         try:
             # 获取数据
-            connection_string = DatabaseService.get_connection_string(db_config, 'utf8')
-            engine = DatabaseService.create_engine(connection_string)
+            engine = DatabaseService.get_engine(db_config, 'utf8')
             
             # 使用引号包装表名和字段名
             quoted_table_name = DatabaseService.quote_identifier(table_name)
@@ -1360,183 +1349,12 @@ class RuleService:
     
     @staticmethod
     def validate_rule_detailed(rule, data):
-        """详细验证单个规则，返回详细结果"""
-        field = rule['field']
-        rule_type = rule['rule_type']
-        params = rule['params']
-        
-        # 字段比较规则不需要检查field，因为它使用field1和field2
-        if rule_type != 'field_comparison':
-            if field not in data.columns:
-                return {
-                    'passed_count': 0,
-                    'failed_count': len(data),
-                    'failed_indices': list(range(len(data))),
-                    'error_details': [{'message': f"字段 {field} 不存在"}]
-                }
-        
-        failed_indices = []
-        error_details = []
-        
-        # 范围检查规则详细验证
-        if rule_type in ['range', 'range_2sigma', 'range_percentile']:
-            failed_indices, error_details = RuleService._validate_range_rule_detailed(rule, data)
-        
-        # 异常值检测规则详细验证
-        elif rule_type in ['outlier', 'outlier_3sigma', 'outlier_iqr', 'outlier_zscore']:
-            failed_indices, error_details = RuleService._validate_outlier_rule_detailed(rule, data)
-        
-        # 深度区间规则详细验证
-        elif rule_type == 'depth_interval_stats':
-            failed_indices, error_details = RuleService._validate_depth_interval_rule_detailed(rule, data)
-        
-        # 频率分析规则详细验证
-        elif rule_type == 'frequency_analysis':
-            failed_indices, error_details = RuleService._validate_frequency_rule_detailed(rule, data)
-        
-        # 字段比较规则详细验证
-        elif rule_type == 'field_comparison':
-            failed_indices, error_details = RuleService._validate_field_comparison_rule_detailed(rule, data)
-        
-        passed_count = len(data) - len(failed_indices)
-        failed_count = len(failed_indices)
-        
-        return {
-            'passed_count': passed_count,
-            'failed_count': failed_count,
-            'failed_indices': failed_indices,
-            'error_details': error_details
-        }
-    
-    @staticmethod
-    def _validate_range_rule_detailed(rule, data):
-        """详细验证范围规则"""
-        field = rule['field']
-        params = rule['params']
-        
-        lower_bound = params.get('lower_bound')
-        upper_bound = params.get('upper_bound')
-        
-        failed_indices = []
-        error_details = []
-        
-        for idx, value in enumerate(data[field]):
-            if pd.isna(value):
-                continue
-                
-            if lower_bound is not None and value < lower_bound:
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'value': value,
-                    'message': f"值 {value} 小于下界 {lower_bound}"
-                })
-            elif upper_bound is not None and value > upper_bound:
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'value': value,
-                    'message': f"值 {value} 大于上界 {upper_bound}"
-                })
-        
-        return failed_indices, error_details
-    
-    @staticmethod
-    def _validate_outlier_rule_detailed(rule, data):
-        """详细验证异常值规则"""
-        field = rule['field']
-        params = rule['params']
-        method = params.get('method')
-        
-        lower_bound = params.get('lower_bound')
-        upper_bound = params.get('upper_bound')
-        
-        failed_indices = []
-        error_details = []
-        
-        for idx, value in enumerate(data[field]):
-            if pd.isna(value):
-                continue
-                
-            if value < lower_bound or value > upper_bound:
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'value': value,
-                    'message': f"字段 {field} 值 {value} 为异常值（{method}方法）"
-                })
-        
-        return failed_indices, error_details
-    
-    @staticmethod
-    def _validate_field_comparison_rule_detailed(rule, data):
-        """详细验证字段比较规则"""
-        params = rule['params']
-        field1 = params.get('field1')
-        field2 = params.get('field2')
-        operator = params.get('operator')  # '>', '<', '>=', '<=', '==', '!='
-        
-        failed_indices = []
-        error_details = []
-        
-        # 检查字段是否存在
-        if field1 not in data.columns:
-            return list(range(len(data))), [{'message': f"字段 {field1} 不存在"}]
-        if field2 not in data.columns:
-            return list(range(len(data))), [{'message': f"字段 {field2} 不存在"}]
-        
-        # 遍历数据进行比较
-        for idx in range(len(data)):
-            value1 = data.iloc[idx][field1]
-            value2 = data.iloc[idx][field2]
-            
-            # 跳过空值
-            if pd.isna(value1) or pd.isna(value2):
-                continue
-            
-            # 执行比较
-            is_valid = False
-            try:
-                if operator == '>':
-                    is_valid = value1 > value2
-                elif operator == '<':
-                    is_valid = value1 < value2
-                elif operator == '>=':
-                    is_valid = value1 >= value2
-                elif operator == '<=':
-                    is_valid = value1 <= value2
-                elif operator == '==':
-                    is_valid = value1 == value2
-                elif operator == '!=':
-                    is_valid = value1 != value2
-                
-                if not is_valid:
-                    failed_indices.append(idx)
-                    operator_desc = {
-                        '>': '大于',
-                        '<': '小于',
-                        '>=': '大于等于',
-                        '<=': '小于等于',
-                        '==': '等于',
-                        '!=': '不等于'
-                    }.get(operator, operator)
-                    
-                    error_details.append({
-                        'row': idx,
-                        'field1': field1,
-                        'field2': field2,
-                        'value1': value1,
-                        'value2': value2,
-                        'message': f"字段 {field1} ({value1}) 应{operator_desc}字段 {field2} ({value2})"
-                    })
-            except Exception as e:
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'message': f"比较失败: {str(e)}"
-                })
-        
-        return failed_indices, error_details
+        """
+        详细验证单个规则，返回详细结果
+
+        由向量化规则引擎计算，需要只构建部分错误详情时直接使用 RuleEngine.evaluate。
+        """
+        return RuleEngine.evaluate(rule, data).to_result()
     
     @staticmethod
     def _get_geological_parameter_bounds(field_name, interval_stats):
@@ -1617,111 +1435,3 @@ class RuleService:
             lower_bound = 0.0
         
         return lower_bound, upper_bound, method
-
-    @staticmethod
-    def _validate_depth_interval_rule_detailed(rule, data):
-        """详细验证深度区间规则（改进的统计方法）"""
-        field = rule['field']
-        params = rule['params']
-        depth_field = params.get('depth_field')
-        intervals = params.get('intervals', [])
-        
-        failed_indices = []
-        error_details = []
-        
-        if not depth_field or depth_field not in data.columns:
-            # 如果深度字段不存在，所有记录都标记为失败
-            for idx in range(len(data)):
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'message': f"深度字段 {depth_field} 不存在"
-                })
-            return failed_indices, error_details
-        
-        if not intervals:
-            # 如果没有区间信息，所有记录都标记为失败
-            for idx in range(len(data)):
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'message': "深度区间统计信息为空"
-                })
-            return failed_indices, error_details
-        
-        for idx, row in data.iterrows():
-            if pd.isna(row[field]) or pd.isna(row[depth_field]):
-                continue
-                
-            depth_value = row[depth_field]
-            field_value = row[field]
-            found_valid_interval = False
-            
-            # 查找匹配的深度区间
-            for interval in intervals:
-                start_depth = interval['start_depth']
-                end_depth = interval['end_depth']
-                
-                if start_depth <= depth_value < end_depth:
-                    # 使用改进的统计方法确定边界
-                    lower_bound, upper_bound, method = RuleService._get_geological_parameter_bounds(field, interval)
-                    
-                    if lower_bound <= field_value <= upper_bound:
-                        found_valid_interval = True
-                    else:
-                        failed_indices.append(idx)
-                        error_details.append({
-                            'row': idx,
-                            'depth': depth_value,
-                            'value': field_value,
-                            'message': f"在深度{start_depth}-{end_depth}m区间内，{field}值{field_value}超出合理范围[{lower_bound:.2f}, {upper_bound:.2f}]（使用{method}方法）"
-                        })
-                    break
-            
-            if not found_valid_interval and not any(start <= depth_value < end for start, end in [(i['start_depth'], i['end_depth']) for i in intervals]):
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'depth': depth_value,
-                    'value': field_value,
-                    'message': f"深度值{depth_value}不在任何统计区间范围内"
-                })
-        
-        return failed_indices, error_details
-    
-    @staticmethod
-    def _validate_frequency_rule_detailed(rule, data):
-        """详细验证频率分析规则"""
-        field = rule['field']
-        params = rule['params']
-        value_distribution = params.get('value_distribution', [])
-        
-        failed_indices = []
-        error_details = []
-        
-        if not value_distribution:
-            # 如果没有频率分布信息，所有记录都标记为失败
-            for idx in range(len(data)):
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'message': "频率分析信息为空"
-                })
-            return failed_indices, error_details
-        
-        # 获取期望的值列表
-        expected_values = [item['value'] for item in value_distribution]
-        
-        for idx, value in enumerate(data[field]):
-            if pd.isna(value):
-                continue
-            
-            if str(value) not in expected_values:
-                failed_indices.append(idx)
-                error_details.append({
-                    'row': idx,
-                    'value': value,
-                    'message': f"值 '{value}' 不在期望的值列表中: {expected_values}"
-                })
-        
-        return failed_indices, error_details
\ No newline at end of file
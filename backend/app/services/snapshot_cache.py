@@ -0,0 +1,226 @@
+"""
+源表数据快照缓存
+
+将拉取过的 (数据源, schema, 表, 字段, 过滤条件) 数据切片写入本地 Parquet 文件，
+后续相同切片的读取直接内存映射该文件，避免重复从生产库拉取。
+快照带 TTL 与磁盘容量上限（LRU 淘汰），并通过廉价的新鲜度探测
+（pg_stat_user_tables 增删改计数 + 时间列最大值，备库上为行数 + 时间列最大值）判断源表是否变化。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+
+class SnapshotCache:
+    """本地列式快照缓存"""
+
+    CACHE_DIR = os.path.join(os.getcwd(), 'cache', 'snapshots')
+    # 快照有效期（秒）
+    TTL = 1800
+    # 磁盘容量上限（字节）
+    MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+    _index = None
+    _lock = threading.RLock()
+
+    @staticmethod
+    def is_available():
+        """是否安装了 pyarrow（未安装时快照缓存不生效）"""
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def make_key(db_config, table_name, fields=None, filters=None, start_date=None, end_date=None, date_column=None, max_rows=None):
+        """生成快照键（切片描述的摘要）"""
+        source_id = db_config.get('id') or db_config.get('data_source_id')
+        descriptor = {
+            'source': str(source_id) if source_id else None,
+            'host': str(db_config.get('host', '')),
+            'port': str(db_config.get('port', '')),
+            'database': str(db_config.get('database', '')),
+            'schema': db_config.get('schema') or 'public',
+            'table': table_name,
+            'fields': list(fields) if fields else None,
+            'filters': sorted((str(k), str(v)) for k, v in (filters or {}).items() if v is not None),
+            'start_date': str(start_date) if start_date else None,
+            'end_date': str(end_date) if end_date else None,
+            'date_column': date_column if (start_date or end_date) else None,
+            'max_rows': int(max_rows) if max_rows else None
+        }
+        raw = json.dumps(descriptor, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest(), descriptor
+
+    @staticmethod
+    def probe_freshness(engine, full_table_name, date_column=None, exact=False):
+        """
+        廉价的新鲜度探测
+
+        pg_stat_user_tables 的增删改计数由各会话异步上报：提交后通常 1 秒内可见，
+        锁竞争时最长约 60 秒（PostgreSQL 15+），在此窗口内基于计数的探测可能判断为未变化。
+        因此已知时间列时总是附带 MAX(时间列)；备库（pg_is_in_recovery()）上计数不会随主库写入变化，
+        此时与统计行缺失时一样使用 COUNT(*)；exact=True 时总是附带 COUNT(*)。
+
+        Returns:
+            dict: {'n_tup_ins', 'n_tup_upd', 'n_tup_del', 'n_live_tup', 'row_count', 'max_date'} 中可用的部分
+        """
+        probe = {}
+        with engine.connect() as conn:
+            in_recovery = bool(conn.execute(text("SELECT pg_is_in_recovery()")).scalar())
+            row = None
+            if not in_recovery:
+                row = conn.execute(text("""
+                    SELECT n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+                    FROM pg_stat_user_tables
+                    WHERE relid = CAST(:rel AS regclass)
+                """), {'rel': full_table_name}).fetchone()
+            if row is not None:
+                probe.update({
+                    'n_tup_ins': int(row[0] or 0),
+                    'n_tup_upd': int(row[1] or 0),
+                    'n_tup_del': int(row[2] or 0),
+                    'n_live_tup': int(row[3] or 0)
+                })
+            if exact or row is None:
+                # 备库或统计视图不可用时退化为精确计数
+                probe['row_count'] = int(conn.execute(text(f"SELECT COUNT(*) FROM {full_table_name}")).scalar() or 0)
+
+            if date_column:
+                from app.services.database_service import DatabaseService
+                quoted_date_column = DatabaseService.quote_identifier(date_column)
+                try:
+                    max_date = conn.execute(text(f"SELECT MAX({quoted_date_column}) FROM {full_table_name}")).scalar()
+                    probe['max_date'] = str(max_date) if max_date is not None else None
+                except Exception as e:
+                    print(f"快照新鲜度探测：读取时间列 {date_column} 失败: {str(e)}")
+        return probe
+
+    @classmethod
+    def _load_index(cls):
+        """加载快照索引（从磁盘上的元数据文件恢复，调用方持有锁）"""
+        if cls._index is not None:
+            return cls._index
+        cls._index = {}
+        if os.path.isdir(cls.CACHE_DIR):
+            for name in os.listdir(cls.CACHE_DIR):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(cls.CACHE_DIR, name), 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    if os.path.exists(meta['path']):
+                        cls._index[meta['key']] = meta
+                except Exception as e:
+                    print(f"加载快照元数据 {name} 失败: {str(e)}")
+        return cls._index
+
+    @classmethod
+    def _meta_path(cls, key):
+        return os.path.join(cls.CACHE_DIR, f"{key}.json")
+
+    @classmethod
+    def _remove(cls, key):
+        """删除快照文件及元数据（调用方持有锁）"""
+        meta = cls._load_index().pop(key, None)
+        for path in [meta['path'] if meta else None, cls._meta_path(key)]:
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    print(f"删除快照文件失败: {str(e)}")
+
+    @classmethod
+    def _enforce_budget(cls):
+        """超过磁盘容量上限时按最近访问时间淘汰（调用方持有锁）"""
+        index = cls._load_index()
+        total = sum(meta.get('size', 0) for meta in index.values())
+        for key, meta in sorted(index.items(), key=lambda item: item[1].get('last_access', 0)):
+            if total <= cls.MAX_BYTES:
+                break
+            total -= meta.get('size', 0)
+            cls._remove(key)
+
+    @classmethod
+    def get(cls, key, probe):
+        """
+        命中且仍新鲜时返回 DataFrame，否则返回 None
+
+        通过内存映射读取 Parquet 文件。
+        """
+        import pyarrow.parquet as pq
+
+        with cls._lock:
+            meta = cls._load_index().get(key)
+            if meta is None:
+                return None, None
+            if time.time() - meta['created_at'] > cls.TTL or meta.get('probe') != probe:
+                print(f"快照已过期或源表已变化，丢弃: {key}")
+                cls._remove(key)
+                return None, None
+            meta['last_access'] = time.time()
+            path = meta['path']
+
+        try:
+            table = pq.read_table(path, memory_map=True)
+            return table.to_pandas(), meta
+        except Exception as e:
+            print(f"读取快照失败，将重新拉取: {str(e)}")
+            with cls._lock:
+                cls._remove(key)
+            return None, None
+
+    @classmethod
+    def put(cls, key, descriptor, probe, df):
+        """写入快照（写入失败时仅记录日志）"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            os.makedirs(cls.CACHE_DIR, exist_ok=True)
+            path = os.path.join(cls.CACHE_DIR, f"{key}.parquet")
+            tmp_path = f"{path}.tmp"
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+            os.replace(tmp_path, path)
+
+            now = time.time()
+            meta = {
+                'key': key,
+                'path': path,
+                'descriptor': descriptor,
+                'probe': probe,
+                'rows': len(df),
+                'size': os.path.getsize(path),
+                'created_at': now,
+                'last_access': now
+            }
+            with open(cls._meta_path(key), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            with cls._lock:
+                cls._load_index()[key] = meta
+                cls._enforce_budget()
+            print(f"快照已写入: 表={descriptor.get('table')}, 行数={len(df)}, 大小={meta['size']} 字节")
+            return meta
+        except Exception as e:
+            print(f"写入快照失败（不影响本次读取）: {str(e)}")
+            return None
+
+    @classmethod
+    def invalidate(cls, table_name=None):
+        """失效快照（不指定表名时清空全部）"""
+        with cls._lock:
+            index = cls._load_index()
+            targets = [
+                key for key, meta in index.items()
+                if table_name is None or meta.get('descriptor', {}).get('table') == table_name
+            ]
+            for key in targets:
+                cls._remove(key)
+        return len(targets)
@@ -7,6 +7,7 @@ import re
 from app.services.llm_client import LLMClient
 from app.services.database_service import DatabaseService
 from app.models.quality_result import QualityResult, QualityReport
+from app.services.quality_service import QualityService
 from app import db
 
 class TextQualityService:
@@ -859,27 +860,38 @@ class TextQualityService:
             db.session.add(result)
             db.session.flush()
             
-            # 保存详细报告
+            # 保存详细报告：每个字段一条报告，未通过的记录合并为紧凑的错误详情
+            field_reports = {}
             for item in results:
+                field_report = field_reports.setdefault(item['变量'], {'passed': 0, 'failed': 0, 'details': []})
+                if item['结果'] == '合格':
+                    field_report['passed'] += 1
+                else:
+                    if item['结果'] == '不合格':
+                        field_report['failed'] += 1
+                    field_report['details'].append({
+                        'row': item['记录编号'],
+                        'value': item['值'],
+                        'message': item['说明'],
+                        'standard': item['规范'],
+                        'status': item['结果']
+                    })
+            
+            reports = []
+            for field_name, field_report in field_reports.items():
                 report = QualityReport(
-                    result_id=result.id,
-                    rule_name=f"文本质检-{item['变量']}",
+                    rule_name=f"文本质检-{field_name}",
                     rule_type='text_quality_check',
-                    field_name=item['变量'],
-                    passed_count=1 if item['结果'] == '合格' else 0,
-                    failed_count=1 if item['结果'] == '不合格' else 0
+                    field_name=field_name,
+                    passed_count=field_report['passed'],
+                    failed_count=field_report['failed']
                 )
-                
-                if item['结果'] != '合格':
-                    error_details = [{
-                        'record': item['记录编号'],
-                        'value': item['值'],
-                        'message': item['说明'],
-                        'standard': item['规范']
-                    }]
-                    report.set_error_details(error_details)
-                
-                db.session.add(report)
+                if field_report['details']:
+                    report.set_error_details(field_report['details'])
+                reports.append(report)
+            QualityService.save_reports(result.id, reports)
+            # 未通过的记录写入失败记录索引表，供 /results/<id>/failed-data 分页查询
+            QualityService._store_failed_records(result, reports)
             
             db.session.commit()
             print(f"质检结果已保存到数据库，结果ID: {result.id}")
@@ -0,0 +1,167 @@
+"""
+增量质量检测的水位线管理
+
+按 (规则库, 版本, 数据源, schema, 表) 记录已检测到的水位线（如 update_date 的最大值），
+增量检测只验证水位线之后的数据，并把计数累加到滚动汇总中；
+首次检测、强制全量或距上次全量超过 full_recheck_days 时执行全量检测并重置汇总。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import db
+from app.models.quality_watermark import QualityWatermark
+from app.services.database_service import DatabaseService
+from app.services.engine_registry import EngineRegistry
+
+
+class WatermarkService:
+    """增量检测水位线服务"""
+
+    DEFAULT_COLUMN = 'update_date'
+
+    @staticmethod
+    def source_key(db_config):
+        """数据源标识：优先使用数据源ID，否则使用连接标识"""
+        source_id = db_config.get('id') or db_config.get('data_source_id')
+        if source_id:
+            return f"id:{source_id}"
+        return 'conn:' + '|'.join(EngineRegistry.connection_identity(db_config))
+
+    @staticmethod
+    def _find(rule_library_id, version_id, db_config, schema, table_name):
+        return QualityWatermark.query.filter_by(
+            rule_library_id=rule_library_id,
+            version_id=version_id or 0,
+            source_key=WatermarkService.source_key(db_config),
+            schema_name=schema,
+            table_name=table_name
+        ).first()
+
+    @staticmethod
+    def _literal(value):
+        """水位线值转为 SQL 字面量（由数据库按列类型转换）"""
+        return "'" + str(value).replace("'", "''") + "'"
+
+    @staticmethod
+    def plan(conn_config, schema, full_table_name, rule_library_id, version_id, table_name,
+             column=None, force_full=False, full_recheck_days=None):
+        """
+        确定本次检测范围
+
+        先取当前水位线列的最大值作为本次上界，检测 (上次水位线, 上界] 区间的数据，
+        检测期间新写入的数据留给下一次。水位线列为空的行只在全量检测时验证。
+
+        Returns:
+            dict: {'full': 是否全量, 'column', 'lower', 'upper', 'condition': WHERE 条件或 None, 'state': 当前水位线记录}
+        """
+        column = column or WatermarkService.DEFAULT_COLUMN
+        state = WatermarkService._find(rule_library_id, version_id, conn_config, schema, table_name)
+
+        full = (
+            force_full
+            or state is None
+            or state.watermark_value is None
+            or state.watermark_column != column
+        )
+        if not full and full_recheck_days and state.last_full_check_at:
+            full = datetime.utcnow() - state.last_full_check_at >= timedelta(days=float(full_recheck_days))
+
+        quoted_column = DatabaseService.quote_identifier(column)
+        engine = DatabaseService.get_engine(conn_config, 'utf8', schema)
+        with engine.connect() as conn:
+            upper = conn.execute(text(f"SELECT MAX({quoted_column}) FROM {full_table_name}")).scalar()
+
+        lower = None if full else state.watermark_value
+        if upper is None:
+            # 水位线列没有任何非空值
+            condition = None if full else 'FALSE'
+            upper_text = None if full else lower
+        else:
+            upper_text = upper.isoformat(sep=' ') if hasattr(upper, 'isoformat') else str(upper)
+            if full:
+                condition = f"({quoted_column} <= {WatermarkService._literal(upper_text)} OR {quoted_column} IS NULL)"
+            else:
+                condition = (
+                    f"{quoted_column} > {WatermarkService._literal(lower)} "
+                    f"AND {quoted_column} <= {WatermarkService._literal(upper_text)}"
+                )
+
+        print(f"增量检测：{full_table_name} {'全量' if full else '增量'}，水位线 {lower} -> {upper_text}")
+        return {
+            'full': full,
+            'column': column,
+            'lower': lower,
+            'upper': upper_text,
+            'condition': condition,
+            'state': state
+        }
+
+    @staticmethod
+    def record(plan, rule_library_id, version_id, db_config, schema, table_name, result, reports):
+        """
+        检测完成后推进水位线并合并滚动汇总（与检测结果在同一事务中提交）
+
+        Returns:
+            QualityWatermark
+        """
+        now = datetime.utcnow()
+        state = plan['state']
+        if state is None:
+            state = QualityWatermark(
+                rule_library_id=rule_library_id,
+                version_id=version_id or 0,
+                source_key=WatermarkService.source_key(db_config),
+                schema_name=schema,
+                table_name=table_name
+            )
+            db.session.add(state)
+
+        if plan['full']:
+            totals = {'total': 0, 'passed': 0, 'failed': 0}
+            rule_summary = {}
+            state.incremental_runs = 0
+            state.last_full_check_at = now
+        else:
+            totals = {
+                'total': state.total_records or 0,
+                'passed': state.passed_records or 0,
+                'failed': state.failed_records or 0
+            }
+            rule_summary = state.get_rule_summary()
+            state.incremental_runs = (state.incremental_runs or 0) + 1
+
+        state.total_records = totals['total'] + result.total_records
+        state.passed_records = totals['passed'] + result.passed_records
+        state.failed_records = totals['failed'] + result.failed_records
+        for report in reports:
+            summary = rule_summary.setdefault(report.rule_name, {'passed': 0, 'failed': 0})
+            summary['passed'] += report.passed_count
+            summary['failed'] += report.failed_count
+        state.set_rule_summary(rule_summary)
+
+        state.watermark_column = plan['column']
+        if plan['upper'] is not None:
+            state.watermark_value = plan['upper']
+        state.last_result_id = result.id
+        state.last_check_at = now
+        return state
+
+    @staticmethod
+    def list_watermarks(rule_library_id=None, table_name=None):
+        query = QualityWatermark.query
+        if rule_library_id:
+            query = query.filter_by(rule_library_id=rule_library_id)
+        if table_name:
+            query = query.filter_by(table_name=table_name)
+        return [state.to_dict() for state in query.order_by(QualityWatermark.last_check_at.desc()).all()]
+
+    @staticmethod
+    def reset(watermark_id):
+        """删除水位线，下一次增量检测将执行全量检测"""
+        state = QualityWatermark.query.get(watermark_id)
+        if not state:
+            return False
+        db.session.delete(state)
+        db.session.commit()
+        return True
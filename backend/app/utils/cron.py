@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+五段式 cron 表达式解析（分 时 日 月 周）
+
+支持 *、数字、区间 a-b、步长 */n 与 a-b/n、逗号列表；周 0 和 7 都表示周日。
+与标准 cron 一致：日与周都被限定时，满足其一即可。
+"""
+
+from datetime import datetime, timedelta
+
+# (最小值, 最大值)
+FIELD_RANGES = (
+    (0, 59),   # 分
+    (0, 23),   # 时
+    (1, 31),   # 日
+    (1, 12),   # 月
+    (0, 7),    # 周（0/7 = 周日）
+)
+
+FIELD_NAMES = ('分', '时', '日', '月', '周')
+
+# 向后查找的最大天数（如 2月30日 这类永远不会触发的表达式）
+MAX_LOOKAHEAD_DAYS = 366 * 5
+
+
+def _parse_field(text, index):
+    low, high = FIELD_RANGES[index]
+    values = set()
+    for part in text.split(','):
+        if not part:
+            raise ValueError(f"cron {FIELD_NAMES[index]}字段为空: {text}")
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"cron 步长必须大于0: {text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            # 单值带步长（如 5/15）表示从该值开始到最大值
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"cron {FIELD_NAMES[index]}字段超出范围 {low}-{high}: {text}")
+        values.update(range(start, end + 1, step))
+    if index == 4 and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronExpression:
+    """cron 表达式"""
+
+    def __init__(self, expression):
+        parts = (expression or '').split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式应为5段（分 时 日 月 周）: {expression}")
+        try:
+            self.minutes, self.hours, self.days, self.months, self.weekdays = (
+                _parse_field(part, index) for index, part in enumerate(parts)
+            )
+        except ValueError as e:
+            if str(e).startswith('cron'):
+                raise
+            raise ValueError(f"无效的 cron 表达式 {expression}: {str(e)}")
+        self.expression = expression
+        self.day_restricted = parts[2] != '*'
+        self.weekday_restricted = parts[4] != '*'
+
+    def _day_matches(self, moment):
+        # Python weekday(): 周一=0；cron: 周日=0
+        cron_weekday = (moment.weekday() + 1) % 7
+        day_ok = moment.day in self.days
+        weekday_ok = cron_weekday in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment):
+        """返回严格晚于 moment 的下一次触发时间（精确到分钟）"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=MAX_LOOKAHEAD_DAYS)
+        while candidate <= limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"cron 表达式在 {MAX_LOOKAHEAD_DAYS} 天内不会触发: {self.expression}")
+
+
+def next_run(expression, after=None):
+    """计算 cron 表达式在 after（默认当前本地时间）之后的下一次触发时间"""
+    return CronExpression(expression).next_after(after or datetime.now())
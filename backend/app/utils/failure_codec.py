@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+规则失败明细的紧凑编码
+
+逐行 JSON 字典（{'row', 'value', 'message', ...}）在失败行很多时体积巨大，
+这里改为列式存储：
+- 行号：差分后的 int64 数组，zlib 压缩 + base64
+- 数值列（value / depth 等）：float64 / int64 数组，zlib 压缩 + base64；重复较多的文本列按字典编码；其他保留 JSON 列表
+- 消息：把消息中的取值替换为占位符得到模板，模板去重后按编号存储
+
+解码时只展开需要的区间，便于接口分页。
+"""
+
+import base64
+import json
+import re
+import zlib
+
+import numpy as np
+
+COMPACT_FORMAT = 'compact-v1'
+
+# 明细条数少于该值时仍按原 JSON 列表存储
+COMPACT_MIN_DETAILS = 64
+
+# 可以替换为占位符的字段（按顺序尝试）
+PLACEHOLDER_KEYS = ('value', 'depth')
+
+
+def _pack_array(array):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes(), 6)).decode('ascii')
+
+
+def _unpack_array(payload, dtype):
+    return np.frombuffer(zlib.decompress(base64.b64decode(payload)), dtype=dtype)
+
+
+def _encode_column(values):
+    """按取值类型选择数组编码"""
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+        try:
+            return {'dtype': 'int64', 'data': _pack_array(np.asarray(values, dtype=np.int64))}
+        except OverflowError:
+            pass
+    if all(isinstance(v, float) for v in values):
+        return {'dtype': 'float64', 'data': _pack_array(np.asarray(values, dtype=np.float64))}
+    if all(isinstance(v, str) for v in values):
+        # 重复较多的文本（如规范说明）按字典编码
+        categories = {}
+        codes = np.fromiter((categories.setdefault(v, len(categories)) for v in values), dtype=np.int32, count=len(values))
+        if len(categories) * 2 <= len(values):
+            return {'dtype': 'category', 'categories': list(categories), 'data': _pack_array(codes)}
+    return {'dtype': 'json', 'data': values}
+
+
+def _decode_column(column, start, stop):
+    if column['dtype'] == 'json':
+        return column['data'][start:stop]
+    if column['dtype'] == 'category':
+        categories = column['categories']
+        return [categories[code] for code in _unpack_array(column['data'], np.int32)[start:stop].tolist()]
+    return _unpack_array(column['data'], column['dtype'])[start:stop].tolist()
+
+
+def _placeholder(key):
+    return '{' + key + '}'
+
+
+def _to_template(message, detail):
+    """把消息中的取值替换为占位符（只替换第一个独立出现的位置）"""
+    template = message
+    for key in PLACEHOLDER_KEYS:
+        if key not in detail:
+            continue
+        text = str(detail[key])
+        if not text:
+            continue
+        match = re.search(r'(?<![\w.\-])' + re.escape(text) + r'(?![\w.])', template)
+        if match:
+            template = template[:match.start()] + _placeholder(key) + template[match.end():]
+    return template
+
+
+def _from_template(template, detail):
+    message = template
+    for key in PLACEHOLDER_KEYS:
+        if key in detail:
+            message = message.replace(_placeholder(key), str(detail[key]), 1)
+    return message
+
+
+def encode_details(details):
+    """
+    编码失败明细
+
+    明细较少或各条字段不一致（如全局错误）时返回原 JSON，否则返回紧凑格式的 JSON 字符串
+    """
+    if len(details) < COMPACT_MIN_DETAILS:
+        return json.dumps(details, ensure_ascii=False)
+
+    keys = list(details[0].keys())
+    if 'row' not in keys or any(list(d.keys()) != keys for d in details):
+        return json.dumps(details, ensure_ascii=False)
+    rows = [d['row'] for d in details]
+    if not all(type(r) is int for r in rows):
+        return json.dumps(details, ensure_ascii=False)
+
+    templates = []
+    literal = []
+    template_codes = {}
+    codes = np.empty(len(details), dtype=np.int32)
+    has_message = 'message' in keys
+    if has_message:
+        for i, detail in enumerate(details):
+            message = detail['message']
+            is_literal = any(_placeholder(key) in message for key in PLACEHOLDER_KEYS)
+            template = message if is_literal else _to_template(message, detail)
+            if not is_literal and _from_template(template, detail) != message:
+                # 无法无损还原时保留原消息
+                template, is_literal = message, True
+            code = template_codes.get((template, is_literal))
+            if code is None:
+                code = template_codes[(template, is_literal)] = len(templates)
+                templates.append(template)
+                if is_literal:
+                    literal.append(code)
+            codes[i] = code
+
+    rows_array = np.asarray(rows, dtype=np.int64)
+    payload = {
+        'format': COMPACT_FORMAT,
+        'count': len(details),
+        'keys': keys,
+        'rows': _pack_array(np.diff(rows_array, prepend=0)),
+        'columns': {
+            key: _encode_column([d[key] for d in details])
+            for key in keys if key not in ('row', 'message')
+        }
+    }
+    if has_message:
+        # literal 中的模板按原文输出，不做占位符替换
+        payload['templates'] = templates
+        payload['literal'] = literal
+        payload['codes'] = _pack_array(codes)
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def is_compact(payload):
+    return isinstance(payload, dict) and payload.get('format') == COMPACT_FORMAT
+
+
+def parse(raw):
+    """解析存储的文本，返回紧凑格式 dict 或明细列表"""
+    if not raw:
+        return []
+    return json.loads(raw)
+
+
+def detail_count(parsed):
+    return parsed['count'] if is_compact(parsed) else len(parsed)
+
+
+def expand_details(parsed, offset=0, limit=None):
+    """展开 [offset, offset+limit) 区间的明细"""
+    count = detail_count(parsed)
+    start = max(int(offset or 0), 0)
+    stop = count if limit is None else min(count, start + int(limit))
+    if start >= stop:
+        return []
+    if not is_compact(parsed):
+        return parsed[start:stop]
+
+    rows = np.cumsum(_unpack_array(parsed['rows'], np.int64))[start:stop].tolist()
+    columns = {key: _decode_column(column, start, stop) for key, column in parsed['columns'].items()}
+    templates = parsed.get('templates')
+    codes = _unpack_array(parsed['codes'], np.int32)[start:stop].tolist() if templates is not None else None
+    literal = set(parsed.get('literal', []))
+
+    details = []
+    for i in range(stop - start):
+        detail = {}
+        for key in parsed['keys']:
+            if key == 'row':
+                detail[key] = rows[i]
+            elif key != 'message':
+                detail[key] = columns[key][i]
+        if codes is not None:
+            code = codes[i]
+            template = templates[code]
+            detail['message'] = template if code in literal else _from_template(template, detail)
+        # 保持原字段顺序
+        details.append({key: detail[key] for key in parsed['keys']})
+    return details